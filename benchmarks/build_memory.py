@@ -0,0 +1,83 @@
+import resource
+import subprocess
+import sys
+
+from encrypted_search.index import EncryptedIndex
+
+from .synthetic import generate_events, iter_events
+
+SIZES = (10000, 100000)  # Numbers of events in the synthetic rooms
+MODES = ("strings", "ids", "stream", "spill")
+MEMORY_BUDGET = 2**20  # Bytes of posting lists held in memory in "spill" mode
+
+
+def build_with_strings(events):
+    """Builds an index from string sets, like `EncryptedIndex` did before the integer vocabularies."""
+
+    encrypted_index = EncryptedIndex([])
+    documents, keywords = EncryptedIndex.parse(events)
+    inverted_index = EncryptedIndex.invert(documents, keywords)
+    del documents
+    encrypted_index.keywords = keywords
+    encrypted_index._EncryptedIndex__levels = encrypted_index.calc_params(
+        inverted_index)
+    encrypted_index.distribute(inverted_index)
+    return encrypted_index
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, in MB."""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode: str, n: int):
+    """Builds an index of `n` synthetic events and prints the peak RSS before and after building, in MB.
+
+    In "stream" mode the events are generated while the index is built, instead of beforehand, and in "spill" mode posting lists are also spilled to disk under a memory budget.
+    """
+
+    if mode in ("stream", "spill"):
+        before = peak_rss_mb()
+        memory_budget = MEMORY_BUDGET if mode == "spill" else None
+        EncryptedIndex(iter_events(n), memory_budget=memory_budget)
+        print(before, peak_rss_mb())
+        return
+
+    events = generate_events(n)
+    before = peak_rss_mb()
+    if mode == "strings":
+        build_with_strings(events)
+    else:
+        EncryptedIndex(events)
+    print(before, peak_rss_mb())
+
+
+def main():
+    """Reports the peak RSS of building a synthetic room with string sets, with integer ids, with integer ids from a stream of events, and out of core from a stream of events.
+
+    Each build runs in a fresh interpreter, so that the peaks don't influence each other.
+    """
+
+    print(
+        f"{'events':>8} {'mode':>8} {'room MB':>8} {'peak MB':>8} {'build MB':>9}"
+    )
+    for n in SIZES:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", __spec__.name, mode,
+                 str(n)],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            before, after = map(float, output.split())
+            print(f"{n:8} {mode:>8} {before:8.1f} {after:8.1f}"
+                  f" {after - before:9.1f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
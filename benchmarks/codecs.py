@@ -0,0 +1,56 @@
+import time
+from statistics import mean
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.search import EncryptedSearch
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.codecs import CODECS
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .suite import CUTOFF_SIZE
+from .synthetic import iter_events, sample_queries
+
+N = 100000  # Number of events in the synthetic room
+QUERIES = 200  # Number of queries per codec
+
+
+def main():
+    """Reports the total size of the files of a synthetic room, the time taken to encode them, and the time taken by `locate` to decode fetched files and read chunks from them, with each codec."""
+
+    encrypted_index = EncryptedIndex(iter_events(N), rng=KeyedRandom(0))
+    queries = list(sample_queries(QUERIES))
+
+    print(f"{N} events, {encrypted_index.size} postings")
+    print(f"{'codec':>6} {'files':>6} {'MB':>8} {'encode s':>9}"
+          f" {'fetched KB':>11} {'locate ms':>10}")
+    for name, codec in CODECS.items():
+        files = {}
+        start = time.perf_counter()
+        storage = IndexStorage(encrypted_index,
+                               CUTOFF_SIZE,
+                               streaming=True,
+                               codec=codec)
+        for file_bytes, callback in storage:
+            mxc_uri = f"mxc://benchmark/{len(files)}"
+            files[mxc_uri] = file_bytes
+            callback(mxc_uri)
+        encode_time = time.perf_counter() - start
+        storage.update_lookup_table()
+
+        search = EncryptedSearch((storage.lookup_table, ), codec=codec)
+        fetched, latencies = [], []
+        for query in queries:
+            fetched_files = {uri: files[uri] for uri in search.lookup(query)}
+            fetched.append(sum(map(len, fetched_files.values())))
+            start = time.perf_counter()
+            search.locate(fetched_files)
+            latencies.append(time.perf_counter() - start)
+
+        size = sum(map(len, files.values()))
+        print(
+            f"{name:>6} {len(files):6} {size / 2**20:8.1f} {encode_time:9.2f}"
+            f" {mean(fetched) / 1024:11.1f} {mean(latencies) * 1000:10.2f}")
+
+
+if __name__ == '__main__':
+    main()
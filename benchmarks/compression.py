@@ -0,0 +1,42 @@
+import time
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.codecs import CODECS, COMPRESSIONS
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .synthetic import iter_events
+
+N = 100000  # Number of events in the synthetic room
+CUTOFF_SIZE = 2**20  # File size limit, in bytes
+
+
+def main():
+    """Reports the number and total size of the files of a synthetic room, and the time taken to pack and encode them, with each codec and compression, against uncompressed JSON."""
+
+    encrypted_index = EncryptedIndex(iter_events(N), rng=KeyedRandom(0))
+
+    print(f"{N} events, {CUTOFF_SIZE} byte files")
+    print(f"{'codec':>6} {'compression':>12} {'files':>6} {'MB':>8}"
+          f" {'files %':>8} {'bytes %':>8} {'seconds':>8}")
+    baseline = None
+    for name, codec in CODECS.items():
+        for compression in (None, *COMPRESSIONS):
+            start = time.perf_counter()
+            storage = IndexStorage(encrypted_index,
+                                   CUTOFF_SIZE,
+                                   streaming=True,
+                                   codec=codec,
+                                   compression=compression)
+            sizes = [len(file_bytes) for file_bytes, _ in storage]
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = len(sizes), sum(sizes)
+            print(f"{name:>6} {compression or '-':>12} {len(sizes):6}"
+                  f" {sum(sizes) / 2**20:8.1f}"
+                  f" {100 * len(sizes) / baseline[0]:8.1f}"
+                  f" {100 * sum(sizes) / baseline[1]:8.1f} {elapsed:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import gc
+import tracemalloc
+from array import array
+from typing import Callable
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.models.compact_level import CompactLevel
+from encrypted_search.models.string_table import StringTable
+from encrypted_search.types import Datastore
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .synthetic import iter_events
+
+SIZES = (10000, 100000, 1000000)  # Numbers of events in the synthetic rooms
+
+
+def to_lists(datastore: Datastore) -> Datastore:
+    """Converts a compact datastore into lists of buckets, like `EncryptedIndex` built before `CompactLevel`.
+
+    Each event id is decoded once and shared by all buckets that contain it, as it was then.
+    """
+
+    documents = next(iter(datastore.values())).documents
+    strings = list(documents)
+    return {
+        level_index: [[strings[i] for i in level.ordinals[start:end]]
+                      for start, end in zip(level.offsets, level.offsets[1:])]
+        for level_index, level in datastore.items()
+    }
+
+
+def to_compact(datastore: Datastore) -> Datastore:
+    """Copies a compact datastore, so that all of its memory is allocated while it's traced."""
+
+    documents = StringTable(next(iter(datastore.values())).documents)
+    return {
+        level_index:
+        CompactLevel(array(level.ordinals.typecode, level.ordinals),
+                     array(level.offsets.typecode, level.offsets), documents)
+        for level_index, level in datastore.items()
+    }
+
+
+def traced_size(convert: Callable[[Datastore], Datastore],
+                datastore: Datastore) -> int:
+    """Returns the number of bytes still allocated by `convert(datastore)` once it returns."""
+
+    gc.collect()
+    tracemalloc.start()
+    converted = convert(datastore)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del converted
+    return size
+
+
+def main():
+    """Reports the memory held by the datastore of a synthetic room, as lists of event id strings and as compact levels."""
+
+    print(f"{'events':>8} {'postings':>9} {'lists MB':>9}"
+          f" {'compact MB':>11} {'ratio':>6}")
+    for n in SIZES:
+        encrypted_index = EncryptedIndex(iter_events(n), rng=KeyedRandom(0))
+        lists = traced_size(to_lists, encrypted_index.datastore)
+        compact = traced_size(to_compact, encrypted_index.datastore)
+        print(f"{n:8} {encrypted_index.size:9} {lists / 2**20:9.1f}"
+              f" {compact / 2**20:11.1f} {lists / compact:6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from collections import Counter
+from itertools import product
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.search import EncryptedSearch
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.keyed_random import KeyedRandom
+from encrypted_search.utils.normalizer import Normalizer
+
+from .suite import percentile
+from .synthetic import iter_events, sample_queries
+
+SIZES = (10000, 100000)  # Numbers of events in the synthetic rooms
+L_VALUES = (
+    1, 4)  # Locality, from one chunk per keyword to chunks in several buckets
+CUTOFF_SIZES = (2**16, 2**14)  # File size limits, from few files to many
+QUERIES = 2000  # Number of queries that the profile is counted from, and of queries evaluated
+
+
+def files_per_query(encrypted_index, cutoff_size, queries, **kwargs):
+    """Stores an index in memory, and counts the files fetched by every query.
+
+    Returns:
+        A tuple of the form (F, Q), where — F is the number of files and Q is the number of files fetched by every query.
+    """
+
+    storage = IndexStorage(encrypted_index, cutoff_size, **kwargs)
+    files = 0
+    for _, callback in storage:
+        files += 1
+        callback(f"mxc://benchmark/{files}")
+    storage.update_lookup_table()
+
+    search = EncryptedSearch((storage.lookup_table, ))
+    return files, [len(search.lookup(query)) for query in queries]
+
+
+def main():
+    """Reports the mean and 99th percentile of the files fetched per query with buckets laid out in order, grouped by keyword, and grouped by keyword with a query profile counted from other queries of the same distribution."""
+
+    normalizer = Normalizer()
+    print(f"{'events':>8} {'L':>2} {'cutoff':>8} {'layout':>10} {'files':>7}"
+          f" {'mean':>7} {'p99':>5}")
+    for n, L in product(SIZES, L_VALUES):
+        encrypted_index = EncryptedIndex(iter_events(n),
+                                         L=L,
+                                         rng=KeyedRandom(0))
+        queries = sample_queries(2 * QUERIES)
+        profile = Counter(keyword for query in queries[:QUERIES]
+                          for keyword in normalizer.normalize_surface(query))
+        layouts = {
+            "in order": {},
+            "keyword": dict(optimize_layout=True),
+            "profile": dict(optimize_layout=True, query_profile=profile),
+        }
+        for cutoff_size in CUTOFF_SIZES:
+            for name, kwargs in layouts.items():
+                files, fetched = files_per_query(encrypted_index, cutoff_size,
+                                                 queries[QUERIES:], **kwargs)
+                print(f"{n:8} {L:2} {cutoff_size:8} {name:>10} {files:7}"
+                      f" {sum(fetched) / len(fetched):7.2f}"
+                      f" {percentile(fetched, 99):5}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+REPEATS = 5  # Number of cold starts per scenario; the fastest is reported
+
+SCENARIOS: Dict[str, str] = {
+    "builtin normalizer":
+    ("import encrypted_search.index, encrypted_search.search\n"
+     "from encrypted_search.utils.normalizer import Normalizer\n"
+     "Normalizer()"),
+    "nltk normalizer":
+    ("import encrypted_search.index, encrypted_search.search\n"
+     "from encrypted_search.utils.normalizer import Normalizer\n"
+     "Normalizer('nltk')"),
+}
+
+
+def import_time(code: str) -> Tuple[int, int]:
+    """Runs `code` in a fresh interpreter with `-X importtime`.
+
+    Args:
+        code: Python source to be executed
+
+    Returns:
+        A tuple of the form (T, N), where — T is the total import time in microseconds and N is the number of modules imported.
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total, modules = 0, 0
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:  <self> | <cumulative> | <module>"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time = line.split(":", 1)[1].split("|")[0]
+        total += int(self_time)
+        modules += 1
+    return total, modules
+
+
+def main():
+    """Reports the cold-start import time of the package for each normalizer backend."""
+
+    for name, code in SCENARIOS.items():
+        try:
+            total, modules = min(import_time(code) for _ in range(REPEATS))
+        except subprocess.CalledProcessError as error:
+            reason = next(line for line in reversed(error.stderr.splitlines())
+                          if "Error" in line)
+            print(f"{name:20} failed: {reason.strip()}")
+            continue
+        print(f"{name:20} {total / 1000:8.1f} ms  {modules:5} modules")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Iterable
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.ingest import read_ndjson
+
+from .synthetic import iter_events
+
+N = 200000  # Number of message events in the export
+OTHER_EVENTS = 0.6  # Probability of each further non-message event after a message
+SEED = 0
+
+
+def write_export(path: str):
+    """Writes a synthetic room export, in NDJSON, with message events interleaved with other events."""
+
+    rng = random.Random(SEED)
+    with open(path, "w", encoding="utf-8") as file:
+        for i, event in enumerate(iter_events(N, SEED)):
+            event.update(sender=f"@user{rng.randint(0, 99)}:example.org",
+                         room_id="!room:example.org",
+                         origin_server_ts=1650000000000 + i * 1000)
+            file.write(json.dumps(event) + "\n")
+            while rng.random() < OTHER_EVENTS:
+                file.write(
+                    json.dumps({
+                        "type": "m.reaction",
+                        "event_id": event["event_id"][::-1],
+                        "sender": event["sender"],
+                        "content": {
+                            "m.relates_to": {
+                                "rel_type": "m.annotation",
+                                "event_id": event["event_id"],
+                                "key": "👍",
+                            }
+                        },
+                    }) + "\n")
+
+
+def read_naively(path: str) -> Iterable:
+    """Decodes every line of the export, like loading it with `json` would."""
+
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            event = json.loads(line)
+            if event["type"] == "m.room.message":
+                yield event
+
+
+def measure(name: str, consume: Callable[[], None], size: int):
+    """Prints the throughput of `consume`, in MB/s of the export."""
+
+    start = time.perf_counter()
+    consume()
+    elapsed = time.perf_counter() - start
+    print(f"{name:24} {elapsed:8.2f} s {size / elapsed / 2**20:10.1f} MB/s")
+
+
+def main():
+    """Compares reading a room export line by line with `json` against `read_ndjson`, and reports the throughput of building an index from the export."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.ndjson")
+        write_export(path)
+        size = os.path.getsize(path)
+        print(f"{N} messages, {size / 2**20:.1f} MB")
+
+        measure("json per line", lambda: all(read_naively(path)), size)
+        measure("read_ndjson", lambda: all(read_ndjson(path)), size)
+        measure("read_ndjson + index",
+                lambda: EncryptedIndex(read_ndjson(path)), size)
+
+
+if __name__ == '__main__':
+    main()
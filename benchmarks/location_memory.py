@@ -0,0 +1,131 @@
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.models.location import Location, pack_lookup_table
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .suite import CUTOFF_SIZE, MemoryHomeserver, upload
+from .synthetic import iter_events
+
+N = 100000  # Number of events in the synthetic room
+
+SerializedLookupTable = Dict[str, List[Dict[str, Any]]]
+
+
+class DictLocation:
+    """`Location` as it was before slots: a regular class whose attributes exist only sometimes, built from kwargs."""
+
+    def __init__(self, is_remote: bool, **kwargs):
+        if is_remote:
+            self.mxc_uri = kwargs.get("mxc_uri")
+        else:
+            self.level_index = kwargs.get("level_index")
+        if "bucket_index" in kwargs and kwargs["bucket_index"] is not None:
+            self.bucket_index = int(kwargs["bucket_index"])
+        self.is_remote = is_remote
+        self.start_of_chunk = int(kwargs["start_of_chunk"])
+        self.chunk_length = int(kwargs["chunk_length"])
+
+    @classmethod
+    def from_json(cls, json: Dict[str, Any]) -> "DictLocation":
+        return cls(
+            is_remote="mxc_uri" in json,
+            mxc_uri=json.get("mxc_uri"),
+            level_index=json.get("level_index"),
+            bucket_index=json.get("bucket_index"),
+            start_of_chunk=json.get("start_of_chunk"),
+            chunk_length=json.get("chunk_length"),
+        )
+
+
+def dict_locations(table: SerializedLookupTable) -> Dict[str, List[Any]]:
+    return {
+        keyword: [DictLocation.from_json(location) for location in locations]
+        for keyword, locations in table.items()
+    }
+
+
+def slotted_locations(table: SerializedLookupTable) -> Dict[str, List[Any]]:
+    return {
+        keyword: [Location.from_json(location) for location in locations]
+        for keyword, locations in table.items()
+    }
+
+
+def packed_locations(table: SerializedLookupTable) -> Dict[str, Any]:
+    return pack_lookup_table(slotted_locations(table))
+
+
+def flatten(table: SerializedLookupTable) -> SerializedLookupTable:
+    """Puts all locations of a table under a single keyword, so that only the cost of the locations themselves is measured."""
+
+    return {
+        "":
+        [location for locations in table.values() for location in locations]
+    }
+
+
+def measure(
+    convert: Callable[[SerializedLookupTable], Any],
+    table: SerializedLookupTable,
+) -> Tuple[float, int]:
+    """Converts a serialized lookup table, measuring the time taken and the bytes still allocated once it returns.
+
+    Returns:
+        A tuple of the form (T, B), where — T is the time taken in seconds and B is the number of bytes allocated.
+    """
+
+    gc.collect()
+    start = time.perf_counter()
+    convert(table)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    converted = convert(table)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del converted
+    return elapsed, size
+
+
+def main():
+    """Reports the memory held by the lookup table of a synthetic room and the time taken to deserialize it, with locations as regular objects, slotted objects and packed buffers.
+
+    The "flat" table holds the remote locations under a single keyword, which leaves out the cost of the keywords and their containers.
+    """
+
+    encrypted_index = EncryptedIndex(iter_events(N), rng=KeyedRandom(0))
+    local_table = {
+        keyword: [location.to_json() for location in locations]
+        for keyword, locations in encrypted_index.lookup_table.items()
+    }
+    remote_lookup_table, _ = upload(encrypted_index, MemoryHomeserver(),
+                                    CUTOFF_SIZE)
+    remote_table = {
+        keyword: [location.to_json() for location in locations]
+        for keyword, locations in remote_lookup_table.items()
+    }
+
+    print(f"{N} events, {sum(map(len, local_table.values()))} locations")
+    print(f"{'table':>7} {'as':>9} {'MB':>7} {'bytes each':>11}"
+          f" {'seconds':>8}")
+    for name, table in (
+        ("local", local_table),
+        ("remote", remote_table),
+        ("flat", flatten(remote_table)),
+    ):
+        count = sum(map(len, table.values()))
+        for kind, convert in (("dict", dict_locations), ("slotted",
+                                                         slotted_locations),
+                              ("packed", packed_locations)):
+            elapsed, size = measure(convert, table)
+            print(f"{name:>7} {kind:>9} {size / 2**20:7.1f}"
+                  f" {size / count:11.1f} {elapsed:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
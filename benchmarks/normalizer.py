@@ -0,0 +1,110 @@
+import random
+import time
+from typing import Callable, Iterable, List, Optional, Set
+
+from encrypted_search.utils.normalizer import PUNCTUATION, Normalizer
+
+N = 20000  # Number of messages to normalize
+SEED = 0  # Seed for the message generator
+
+WORDS = ("matrix", "encrypted", "search", "the", "is", "an", "open", "network",
+         "for", "secure", "decentralized", "communication", "room", "event",
+         "server", "media", "real-time", "e2ee", "keys", "sync", "it's",
+         "federation", "element", "bridge", "(hello)", "world!", "v1.2.3")
+
+
+def generate_messages(n: int) -> List[str]:
+    """Generates `n` messages of random words.
+
+    Args:
+        n: Number of messages to generate
+
+    Returns:
+        List of message bodies.
+    """
+
+    rng = random.Random(SEED)
+    return [
+        " ".join(rng.choices(WORDS, k=rng.randint(3, 30))) for _ in range(n)
+    ]
+
+
+def nltk_normalize_per_call() -> Callable[[str], Set[str]]:
+    """Imports NLTK, and checks that its stopwords corpus is installed.
+
+    Returns:
+        Function that normalizes a string while setting up the tokenizers and stopwords on every call, like the old `normalize`.
+
+    Raises:
+        ImportError: If NLTK isn't installed.
+        LookupError: If the NLTK stopwords corpus isn't installed.
+    """
+
+    from nltk.corpus import stopwords
+    from nltk.tokenize.regexp import RegexpTokenizer, WhitespaceTokenizer
+
+    stopwords.words("english")
+
+    def normalize_per_call(string: str) -> Set[str]:
+        split_by_whitespaces = WhitespaceTokenizer().tokenize
+        get_letter_sequences = RegexpTokenizer(pattern=r"\w+").tokenize
+
+        tokens: Set[str] = set()
+        for token in set(split_by_whitespaces(string.lower())):
+            stripped_token = token.strip(PUNCTUATION)
+            tokens.add(stripped_token)
+            tokens |= set(get_letter_sequences(stripped_token))
+        tokens -= set(stopwords.words("english"))
+        return tokens - {''}
+
+    return normalize_per_call
+
+
+def measure(normalize_all: Callable[[Iterable[str]], Iterable[Set[str]]],
+            messages: List[str]) -> float:
+    """Measures the throughput of a normalization method.
+
+    Args:
+        normalize_all: Method that normalizes a batch of messages
+        messages: Messages to be normalized
+
+    Returns:
+        Number of messages normalized per second.
+    """
+
+    start = time.perf_counter()
+    for _ in normalize_all(messages):
+        pass
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    """Compares the per-call setup of the old `normalize` with reusable `Normalizer`s of both backends.
+
+    The old `normalize` and the NLTK backend are skipped if NLTK or its stopwords corpus isn't installed.
+    """
+
+    messages = generate_messages(N)
+
+    before: Optional[float] = None
+    backends = ["builtin"]
+    try:
+        normalize_per_call = nltk_normalize_per_call()
+    except (ImportError, LookupError):
+        print(
+            "NLTK or its stopwords corpus isn't installed, skipping the NLTK rows"
+            " (install it with `python -m nltk.downloader stopwords`)")
+    else:
+        before = measure(lambda batch: map(normalize_per_call, batch),
+                         messages)
+        print(f"per-call setup:         {before:12.0f} events/s")
+        backends.insert(0, "nltk")
+    for backend in backends:
+        after = measure(Normalizer(backend).normalize_many, messages)
+        speedup = "" if before is None else f" ({after / before:.1f}x)"
+        print(f"Normalizer({backend + '):':9} {after:12.0f} events/s"
+              f"{speedup}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import os
+import time
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.models.vocabulary import Vocabulary
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .synthetic import iter_events
+
+N = 500000  # Number of events in the synthetic room
+S = 4  # Number of populated levels
+WORKERS = sorted({2, 4, os.cpu_count() or 1} -
+                 {1})  # Sizes of the process pools
+
+
+def distribute(postings, keyword_ids, document_ids, workers):
+    """Distributes posting lists into a fresh index with a fixed seed and measures the time taken.
+
+    Returns:
+        A tuple of the form (T, R), where — T is the time taken in seconds and R is the resulting index.
+    """
+
+    encrypted_index = EncryptedIndex([], s=S, rng=KeyedRandom(0))
+    encrypted_index._EncryptedIndex__levels = encrypted_index.calc_params(
+        postings)
+    start = time.perf_counter()
+    encrypted_index.distribute(postings,
+                               keyword_ids,
+                               document_ids,
+                               workers=workers)
+    return time.perf_counter() - start, encrypted_index
+
+
+def main():
+    """Compares distributing levels with process pools of different sizes against the serial path."""
+
+    keyword_ids, document_ids = Vocabulary(), Vocabulary()
+    postings = EncryptedIndex.build_postings(iter_events(N), keyword_ids,
+                                             document_ids)
+    serial_time, serial_index = distribute(postings, keyword_ids, document_ids,
+                                           1)
+    print(f"{os.cpu_count()} CPUs, {N} events, {serial_index.size} postings,"
+          f" {len(serial_index.datastore)} levels")
+    print(f"{'workers':>8} {'seconds':>8} {'speedup':>8}")
+    print(f"{1:8} {serial_time:8.2f} {1:8.2f}")
+
+    for workers in WORKERS:
+        elapsed, encrypted_index = distribute(postings, keyword_ids,
+                                              document_ids, workers)
+        assert all(
+            list(encrypted_index.datastore[l]) == list(level) for l, level in
+            serial_index.datastore.items()), "Parallel distribution differs"
+        print(f"{workers:8} {elapsed:8.2f} {serial_time / elapsed:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
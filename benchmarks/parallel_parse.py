@@ -0,0 +1,52 @@
+import os
+import time
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.models.vocabulary import Vocabulary
+
+from .synthetic import generate_events
+
+N = 200000  # Number of events in the synthetic room
+WORKERS = sorted({2, 4, os.cpu_count() or 1} -
+                 {1})  # Sizes of the process pools
+CHUNK_SIZES = (1000, 10000, 50000)  # Numbers of messages per chunk
+
+
+def parse(events, **kwargs):
+    """Builds posting lists of `events` and measures the time taken.
+
+    Returns:
+        A tuple of the form (T, R), where — T is the time taken in seconds and R is the result of the parsing.
+    """
+
+    keyword_ids, document_ids = Vocabulary(), Vocabulary()
+    start = time.perf_counter()
+    postings = EncryptedIndex.build_postings(events, keyword_ids, document_ids,
+                                             **kwargs)
+    elapsed = time.perf_counter() - start
+    return elapsed, (list(keyword_ids), list(document_ids), postings)
+
+
+def main():
+    """Compares parallel parsing with different pool and chunk sizes against the serial path."""
+
+    events = generate_events(N)
+    serial_time, serial_result = parse(events)
+    print(f"{os.cpu_count()} CPUs, {N} events")
+    print(f"{'workers':>8} {'chunk':>8} {'seconds':>8} {'events/s':>10}"
+          f" {'speedup':>8}")
+    print(f"{1:8} {'-':>8} {serial_time:8.2f} {N / serial_time:10.0f}"
+          f" {1:8.2f}")
+
+    for workers in WORKERS:
+        for chunk_size in CHUNK_SIZES:
+            elapsed, result = parse(events,
+                                    workers=workers,
+                                    chunk_size=chunk_size)
+            assert result == serial_result, "Parallel parse differs"
+            print(f"{workers:8} {chunk_size:8} {elapsed:8.2f}"
+                  f" {N / elapsed:10.0f} {serial_time / elapsed:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
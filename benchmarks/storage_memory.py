@@ -0,0 +1,67 @@
+import json
+import resource
+import subprocess
+import sys
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .synthetic import iter_events
+
+SIZES = (10000, 100000)  # Numbers of events in the synthetic rooms
+MODES = ("eager", "streaming")
+CUTOFF_SIZE = 2**20  # File size limit, in bytes
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, in MB."""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode: str, n: int):
+    """Builds an index of `n` synthetic events, "uploads" its files by serializing them, and prints the peak RSS before and after uploading, in MB."""
+
+    encrypted_index = EncryptedIndex(iter_events(n), rng=KeyedRandom(0))
+    before = peak_rss_mb()
+    storage = IndexStorage(encrypted_index,
+                           CUTOFF_SIZE,
+                           streaming=mode == "streaming")
+    uploaded = 0
+    for file_data, callback in storage:
+        if mode == "eager":
+            file_data = json.dumps(file_data).encode()
+        uploaded += len(file_data)
+        callback(f"mxc://benchmark/{uploaded}")
+    storage.update_lookup_table()
+    print(before, peak_rss_mb())
+
+
+def main():
+    """Reports the peak RSS of uploading the files of a synthetic room, with every file prepared up front and with files read and serialized one at a time.
+
+    Each upload runs in a fresh interpreter, so that the peaks don't influence each other.
+    """
+
+    print(f"{'events':>8} {'mode':>10} {'index MB':>9} {'peak MB':>8}"
+          f" {'upload MB':>10}")
+    for n in SIZES:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", __spec__.name, mode,
+                 str(n)],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            before, after = map(float, output.split())
+            print(f"{n:8} {mode:>10} {before:9.1f} {after:8.1f}"
+                  f" {after - before:10.1f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
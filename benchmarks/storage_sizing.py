@@ -0,0 +1,33 @@
+import time
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .synthetic import iter_events
+
+SIZES = (10000, 100000)  # Numbers of events in the synthetic rooms
+CUTOFF_SIZES = (2**18, 2**20)  # File size limits
+
+
+def main():
+    """Reports the time taken to prepare the files of a synthetic room, with sizes computed analytically and with every size also checked against the actual serialization, which costs about as much as serializing to measure did."""
+
+    print(f"{'events':>8} {'cutoff':>8} {'files':>6} {'computed ms':>12}"
+          f" {'verified ms':>12}")
+    for n in SIZES:
+        encrypted_index = EncryptedIndex(iter_events(n), rng=KeyedRandom(0))
+        for cutoff_size in CUTOFF_SIZES:
+            timings = []
+            for verify_sizes in (False, True):
+                start = time.perf_counter()
+                storage = IndexStorage(encrypted_index, cutoff_size,
+                                       verify_sizes)
+                timings.append(time.perf_counter() - start)
+            files = len(storage._IndexStorage__files)
+            print(f"{n:8} {cutoff_size:8} {files:6}"
+                  f" {timings[0] * 1000:12.1f} {timings[1] * 1000:12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from statistics import mean
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.merge import IndexMerge
+from encrypted_search.models.build_stats import BuildStats
+from encrypted_search.search import EncryptedSearch
+from encrypted_search.storage import IndexStorage
+from encrypted_search.types import FileData, LookupTable
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .synthetic import iter_events, sample_queries
+
+SIZES = (10000, 100000, 1000000, 10000000)  # Numbers of events per room
+CUTOFF_SIZE = 5 * 2**20  # File size limit of the storage stage, in bytes
+QUERIES = 200  # Number of queries in the search stage
+MERGED_FRACTION = 10  # The merge stage merges a room with one 1/10th its size
+SEED = 0  # Seed of chunk placement, so that runs produce equal layouts
+OUTPUT = "benchmark-results.json"
+
+Results = Dict[str, Any]
+
+
+class MemoryHomeserver:
+    """In-memory stand-in for a content repository, storing files as serialized JSON."""
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+
+    def upload(self, file_data: FileData) -> str:
+        uri = f"mxc://benchmark/{len(self.files)}"
+        self.files[uri] = json.dumps(file_data).encode()
+        return uri
+
+    def fetch(self, uri: str) -> Tuple[FileData, int]:
+        """Fetches a file, returning its data and its size in bytes."""
+
+        data = self.files[uri]
+        return json.loads(data), len(data)
+
+
+def rss_mb() -> Dict[str, Any]:
+    """Current (where available) and peak resident set size of this process, in MB."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    current = None
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        current = round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    return {"rss_mb": current, "peak_rss_mb": round(peak / 1024, 1)}
+
+
+@contextmanager
+def stage(results: Results, name: str) -> Iterator[Results]:
+    """Measures the wall time and memory of a stage, recording them along with the metrics that the stage adds to the yielded dict.
+
+    Peak RSS is the high-water mark of the process when the stage ends, so it includes earlier stages.
+    """
+
+    metrics: Results = {}
+    start = time.perf_counter()
+    yield metrics
+    metrics["seconds"] = round(time.perf_counter() - start, 3)
+    metrics.update(rss_mb())
+    results["stages"][name] = metrics
+
+
+def upload(
+    encrypted_index: EncryptedIndex,
+    homeserver: MemoryHomeserver,
+    cutoff_size: int,
+) -> Tuple[LookupTable, List[str]]:
+    """Stores an index on the homeserver.
+
+    Returns:
+        A tuple of the form (T, U), where — T is the updated lookup table and U are the MXC URIs of the uploaded files.
+    """
+
+    storage = IndexStorage(encrypted_index, cutoff_size)
+    uris = []
+    for file_data, callback in storage:
+        uri = homeserver.upload(file_data)
+        uris.append(uri)
+        callback(uri)
+    storage.update_lookup_table()
+    return storage.lookup_table, uris
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def run(n: int, cutoff_size: int, queries: int) -> Results:
+    """Runs every stage on a synthetic room of `n` events."""
+
+    results: Results = {"events": n, "stages": {}}
+    homeserver = MemoryHomeserver()
+
+    with stage(results, "build") as metrics:
+        build_stats = BuildStats()
+        encrypted_index = EncryptedIndex(iter_events(n),
+                                         stats=build_stats,
+                                         rng=KeyedRandom(SEED))
+        metrics.update(keywords=len(encrypted_index.keywords),
+                       postings=encrypted_index.size,
+                       levels=len(encrypted_index.datastore))
+    results["build_stats"] = build_stats.to_json()
+
+    with stage(results, "storage") as metrics:
+        lookup_table, uris = upload(encrypted_index, homeserver, cutoff_size)
+        metrics.update(files=len(uris),
+                       bytes=sum(len(homeserver.files[uri]) for uri in uris))
+    del encrypted_index
+
+    recent_lookup_table, _ = upload(
+        EncryptedIndex(iter_events(max(n // MERGED_FRACTION, 1), seed=1),
+                       rng=KeyedRandom(SEED)),
+        homeserver,
+        cutoff_size,
+    )
+    with stage(results, "merge") as metrics:
+        index_merge = IndexMerge((lookup_table, recent_lookup_table),
+                                 rng=KeyedRandom(SEED))
+        # Files are requested once per keyword, so cache them like a client would
+        cache: Dict[str, FileData] = {}
+        fetches, fetched_bytes = 0, 0
+        for mxc_uris, callback in index_merge:
+            for mxc_uri in mxc_uris:
+                fetches += 1
+                if mxc_uri not in cache:
+                    cache[mxc_uri], size = homeserver.fetch(mxc_uri)
+                    fetched_bytes += size
+                callback(mxc_uri, cache[mxc_uri])
+        index_merge.distribute_new_index()
+        metrics.update(fetches=fetches,
+                       downloads=len(cache),
+                       fetched_bytes=fetched_bytes,
+                       postings=index_merge.encrypted_index.size)
+    del index_merge, cache
+
+    with stage(results, "search") as metrics:
+        search = EncryptedSearch((lookup_table, ))
+        latencies, files, sizes = [], [], []
+        for query in sample_queries(queries):
+            start = time.perf_counter()
+            mxc_uris = search.lookup(query)
+            fetched = {uri: homeserver.fetch(uri) for uri in mxc_uris}
+            search.locate({uri: data for uri, (data, _) in fetched.items()})
+            latencies.append(time.perf_counter() - start)
+            files.append(len(mxc_uris))
+            sizes.append(sum(size for _, size in fetched.values()))
+        metrics.update(
+            queries=queries,
+            mean_ms=round(mean(latencies) * 1000, 3),
+            p99_ms=round(percentile(latencies, 99) * 1000, 3),
+            mean_files=round(mean(files), 2),
+            p99_files=percentile(files, 99),
+            mean_bytes=round(mean(sizes)),
+        )
+
+    return results
+
+
+def main():
+    """Runs the suite for each room size in a fresh interpreter, so that memory measurements don't influence each other, and writes the results as JSON."""
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--cutoff-size", type=int, default=CUTOFF_SIZE)
+    parser.add_argument("--queries", type=int, default=QUERIES)
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        print(json.dumps(run(args.run_size, args.cutoff_size, args.queries)))
+        return
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "cutoff_size": args.cutoff_size,
+        "runs": [],
+    }
+    for n in args.sizes:
+        output = subprocess.run(
+            [
+                sys.executable, "-m", __spec__.name, "--run-size",
+                str(n), "--cutoff-size",
+                str(args.cutoff_size), "--queries",
+                str(args.queries)
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results = json.loads(output)
+        report["runs"].append(results)
+
+        for name, metrics in results["stages"].items():
+            print(f"{n:>10} {name:8} {metrics['seconds']:9.2f} s"
+                  f" {metrics['peak_rss_mb']:9.1f} MB  " +
+                  ", ".join(f"{k}={v}" for k, v in metrics.items()
+                            if k not in ("seconds", "rss_mb", "peak_rss_mb")))
+
+        # Save after every size, so that long runs leave partial results
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
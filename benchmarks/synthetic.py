@@ -0,0 +1,117 @@
+import base64
+import random
+import string
+from itertools import accumulate
+from math import exp, log
+from typing import Iterator, List
+
+from encrypted_search.types import Event
+
+ZIPF_EXPONENT = 1.07  # Exponent of the word frequency distribution
+MEDIAN_LENGTH = 8  # Median number of words in a message
+LENGTH_SIGMA = 0.9  # Spread of the log-normal distribution of message lengths
+MAX_LENGTH = 300  # Maximum number of words in a message
+
+
+def generate_vocabulary(size: int, rng: random.Random) -> List[str]:
+    """Generates `size` distinct words, shorter words first, like in natural languages."""
+
+    words: List[str] = []
+    seen = set()
+    while len(words) < size:
+        length = min(2 + int(rng.expovariate(1 / 4)), 16)
+        word = "".join(rng.choices(string.ascii_lowercase, k=length))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    words.sort(key=len)
+    return words
+
+
+def generate_event_id(rng: random.Random) -> str:
+    """Generates an event id shaped like those of room versions 4 and later, i.e. an unpadded URL-safe base64 SHA-256 hash."""
+
+    digest = rng.getrandbits(256).to_bytes(32, "big")
+    return "$" + base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def iter_events(n: int,
+                seed: int = 0,
+                vocabulary_size: int = 50000) -> Iterator[Event]:
+    """Lazily generates a synthetic room history of `n` message events.
+
+    Words are drawn from a Zipfian distribution over the vocabulary and message lengths from a log-normal distribution, which approximates chat rooms.
+
+    Args:
+        n: Number of events to generate
+        seed: Seed of the generator; equal seeds produce equal rooms
+        vocabulary_size: Number of distinct words used in messages
+
+    Returns:
+        Iterator over "m.room.message" events.
+    """
+
+    rng = random.Random(seed)
+    vocabulary = generate_vocabulary(vocabulary_size, rng)
+    cum_weights = list(
+        accumulate(rank**-ZIPF_EXPONENT
+                   for rank in range(1, vocabulary_size + 1)))
+    mu = log(MEDIAN_LENGTH)
+
+    for _ in range(n):
+        length = min(max(1, round(exp(rng.gauss(mu, LENGTH_SIGMA)))),
+                     MAX_LENGTH)
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=length)
+        yield {
+            "type": "m.room.message",
+            "event_id": generate_event_id(rng),
+            "content": {
+                "msgtype": "m.text",
+                "body": " ".join(words),
+            },
+        }
+
+
+def generate_events(n: int,
+                    seed: int = 0,
+                    vocabulary_size: int = 50000) -> List[Event]:
+    """Generates a synthetic room history of `n` message events.
+
+    Args:
+        n: Number of events to generate
+        seed: Seed of the generator; equal seeds produce equal rooms
+        vocabulary_size: Number of distinct words used in messages
+
+    Returns:
+        List of "m.room.message" events.
+    """
+
+    return list(iter_events(n, seed, vocabulary_size))
+
+
+def sample_queries(n: int,
+                   seed: int = 0,
+                   vocabulary_size: int = 50000) -> List[str]:
+    """Samples `n` search queries of one or two words from the vocabulary of the room of the same seed.
+
+    Queries favour rarer words than messages do, since people search for specific terms.
+
+    Args:
+        n: Number of queries to sample
+        seed: Seed of the room whose vocabulary is used
+        vocabulary_size: Number of distinct words used in messages
+
+    Returns:
+        List of queries.
+    """
+
+    vocabulary = generate_vocabulary(vocabulary_size, random.Random(seed))
+    cum_weights = list(
+        accumulate(rank**-0.5 for rank in range(1, vocabulary_size + 1)))
+    rng = random.Random(seed + 1)
+    return [
+        " ".join(
+            rng.choices(vocabulary,
+                        cum_weights=cum_weights,
+                        k=rng.choice((1, 1, 2)))) for _ in range(n)
+    ]
@@ -0,0 +1,64 @@
+import random
+import time
+from statistics import mean
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.models.tombstones import Tombstones
+from encrypted_search.search import EncryptedSearch
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .suite import CUTOFF_SIZE, MemoryHomeserver, upload
+from .synthetic import iter_events, sample_queries
+
+N = 100000  # Number of events in the synthetic room
+QUERIES = 200  # Number of queries per fraction of deleted events
+FRACTIONS = (0, 0.01, 0.1)  # Fractions of deleted events
+
+
+def main():
+    """Reports the latency of `locate` with tombstones of different sizes, and the time taken to delete events."""
+
+    encrypted_index = EncryptedIndex(iter_events(N), rng=KeyedRandom(0))
+    homeserver = MemoryHomeserver()
+    lookup_table, _ = upload(encrypted_index, homeserver, CUTOFF_SIZE)
+    event_ids = [event["event_id"] for event in iter_events(N)]
+
+    # Fetch files beforehand, so that only `locate` is timed
+    queries = []
+    search = EncryptedSearch((lookup_table, ))
+    for query in sample_queries(QUERIES):
+        mxc_uris = search.lookup(query)
+        queries.append(
+            (query, {uri: homeserver.fetch(uri)[0]
+                     for uri in mxc_uris}))
+
+    print(f"{N} events, {encrypted_index.size} postings")
+    print(f"{'deleted':>8} {'bytes':>8} {'delete ms':>10} {'compacted':>10}"
+          f" {'locate ms':>10} {'added ms':>9}")
+    baseline = 0.0
+    for fraction in FRACTIONS:
+        deleted = random.Random(0).sample(event_ids, int(fraction * N))
+        tombstones = Tombstones(deleted)
+        fresh_index = EncryptedIndex(iter_events(N), rng=KeyedRandom(0))
+        start = time.perf_counter()
+        update = fresh_index.delete_events(deleted)
+        delete_time = time.perf_counter() - start
+        del fresh_index
+
+        search = EncryptedSearch((lookup_table, ), tombstones=(tombstones, ))
+        latencies = []
+        for query, fetched_files in queries:
+            search.lookup(query)
+            start = time.perf_counter()
+            search.locate(fetched_files)
+            latencies.append(time.perf_counter() - start)
+        latency = mean(latencies)
+        if fraction == 0:
+            baseline = latency
+        print(f"{len(deleted):8} {len(tombstones.to_bytes()):8}"
+              f" {delete_time * 1000:10.1f} {len(update.levels):10}"
+              f" {latency * 1000:10.3f} {(latency - baseline) * 1000:9.3f}")
+
+
+if __name__ == '__main__':
+    main()
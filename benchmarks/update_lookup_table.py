@@ -0,0 +1,37 @@
+import time
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .synthetic import iter_events
+
+SIZES = (10000, 100000)  # Numbers of events in the synthetic rooms
+CUTOFF_SIZES = (2**20, 2**16, 2**12)  # File size limits, few files to many
+
+
+def main():
+    """Reports the time taken by `update_lookup_table` as the numbers of files and locations grow, which should be about linear in the number of locations."""
+
+    print(f"{'events':>8} {'cutoff':>8} {'files':>7} {'locations':>10}"
+          f" {'update ms':>10} {'us/location':>12}")
+    for n in SIZES:
+        encrypted_index = EncryptedIndex(iter_events(n), rng=KeyedRandom(0))
+        locations = sum(map(len, encrypted_index.lookup_table.values()))
+        for cutoff_size in CUTOFF_SIZES:
+            storage = IndexStorage(encrypted_index, cutoff_size)
+            files = 0
+            for _, callback in storage:
+                files += 1
+                callback(f"mxc://benchmark/{files}")
+
+            start = time.perf_counter()
+            storage.update_lookup_table()
+            elapsed = time.perf_counter() - start
+            print(f"{n:8} {cutoff_size:8} {files:7} {locations:10}"
+                  f" {elapsed * 1000:10.1f}"
+                  f" {elapsed / locations * 10**6:12.2f}")
+
+
+if __name__ == '__main__':
+    main()
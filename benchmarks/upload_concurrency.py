@@ -0,0 +1,52 @@
+import asyncio
+from statistics import median
+from typing import Dict
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+from .suite import percentile
+from .synthetic import iter_events
+
+N = 100000  # Number of events in the synthetic room
+CUTOFF_SIZE = 2**16  # File size limit, in bytes, small enough for many files
+LATENCY = 0.02  # Round trip of an upload to the simulated homeserver, in seconds
+CONCURRENCIES = (1, 4, 16, 64)  # Uploads in flight at a time
+
+
+class LatentHomeserver:
+    """In-memory stand-in for a content repository, that takes a fixed round trip per upload."""
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+
+    async def upload(self, file_bytes: bytes) -> str:
+        await asyncio.sleep(LATENCY)
+        uri = f"mxc://benchmark/{len(self.files)}"
+        self.files[uri] = file_bytes
+        return uri
+
+
+def main():
+    """Reports the wall time, throughput and per-file latency of `upload_all` with different numbers of uploads in flight, against a homeserver with a fixed round trip."""
+
+    encrypted_index = EncryptedIndex(iter_events(N), rng=KeyedRandom(0))
+
+    print(f"{N} events, {LATENCY * 1000:.0f} ms round trip")
+    print(f"{'in flight':>9} {'files':>6} {'seconds':>8} {'files/s':>8}"
+          f" {'MB/s':>6} {'p50 ms':>7} {'p95 ms':>7}")
+    for concurrency in CONCURRENCIES:
+        storage = IndexStorage(encrypted_index, CUTOFF_SIZE, streaming=True)
+        stats = asyncio.run(
+            storage.upload_all(LatentHomeserver().upload,
+                               concurrency=concurrency))
+        print(f"{concurrency:9} {stats.files:6} {stats.seconds:8.2f}"
+              f" {stats.files_per_second:8.1f}"
+              f" {stats.bytes_per_second / 2**20:6.1f}"
+              f" {median(stats.latencies) * 1000:7.1f}"
+              f" {percentile(stats.latencies, 95) * 1000:7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import json
+import time
+from itertools import product
+from math import floor, log2
+from statistics import mean
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .index import EncryptedIndex, _level_indices
+from .models.level_info import LevelInfo
+from .models.parameter_estimate import ParameterEstimate
+from .search import EncryptedSearch
+from .storage import IndexStorage
+from .types import Event, InvertedIndex
+from .utils.keyed_random import KeyedRandom
+from .utils.normalizer import Normalizer
+
+S_VALUES = (1, 2, 3, 4)  # Candidate values of s
+L_VALUES = (1, 2, 4)  # Candidate values of L
+CUTOFF_SIZES = (2**18, 2**20, 5 * 2**20)  # Candidate file size limits
+TARGETS = ("latency", "storage")
+
+
+class ParameterAdvisor:
+    """Evaluates candidate values of s, L and cutoff_size on a room, and recommends a setting for a latency or storage target.
+
+    Every candidate is evaluated by building it rather than from a formula: the index is laid out by `calc_params` and `distribute` with the candidate s and L, split into files by `IndexStorage` with the candidate cutoff_size, and every query is looked up with `EncryptedSearch` in the resulting lookup table. Files are "uploaded" to memory, so nothing leaves the process.
+
+    Costs of a sample are extrapolated to the whole room by its scale. The sample is laid out as a scale model of the room: its levels are those that `calc_params` gives the room, from the extrapolated number of postings, with chunks and buckets shrunk by the largest power of two up to the scale, so that keywords fall on the same levels, in about as many chunks and buckets, as they would in the room. The model is split into files with cutoff_size divided by the scale, which gives about as many files, and files per query, as the room with cutoff_size, and its storage, bytes per query and build time are multiplied by the scale.
+
+    This is an approximation: it assumes that every posting list of the room is the scale times longer than in the sample. A sample of a Zipfian room misses many of the room's rare keywords, so files and storage of the lowest levels are underestimated, and levels of the room too low to hold any keyword of the sample are merged into level 0. Where the scale isn't a power of two, a keyword of the model can have up to twice as many chunks as in the room. Estimates are exact for a scale of 1, and should be taken as a ranking of candidates otherwise.
+
+    Args:
+        inverted_index: Mapping from keywords to documents that contain them, e.g. of a sample of the room
+        queries: Queries that the costs are averaged over. Defaults to every keyword once
+        normalizer: `Normalizer` used to tokenize queries. Defaults to a shared English normalizer
+        seed: Seed of the placement of chunks, so that evaluations are reproducible
+        scale: Ratio of the size of the room to that of the sample that the inverted index is of. Defaults to 1, i.e. costs of the inverted index itself
+        parse_seconds: Time taken to parse the events of the inverted index, which is part of the build time of every candidate
+
+    Examples:
+        >>> advisor = ParameterAdvisor.from_events(sample_of_events, room_size=number_of_events)
+        >>> estimate = advisor.recommend("latency", max_storage=50 * 2**20)
+        >>> encrypted_index = EncryptedIndex(events, s=estimate.s, L=estimate.L)
+        >>> storage = IndexStorage(encrypted_index, estimate.cutoff_size)
+    """
+
+    __inverted_index: InvertedIndex
+    __queries: List[str]
+    __normalizer: Optional[Normalizer]
+    __seed: int
+    __scale: float
+    __parse_seconds: float
+
+    def __init__(
+        self,
+        inverted_index: InvertedIndex,
+        queries: Optional[Iterable[str]] = None,
+        normalizer: Optional[Normalizer] = None,
+        seed: int = 0,
+        scale: float = 1.0,
+        parse_seconds: float = 0.0,
+    ):
+        self.__inverted_index = inverted_index
+        self.__queries = sorted(inverted_index) if queries is None else list(
+            queries)
+        self.__normalizer = normalizer
+        self.__seed = seed
+        self.__scale = scale
+        self.__parse_seconds = parse_seconds
+
+    @classmethod
+    def from_events(
+        cls,
+        events: Iterable[Event],
+        queries: Optional[Iterable[str]] = None,
+        normalizer: Optional[Normalizer] = None,
+        seed: int = 0,
+        room_size: Optional[int] = None,
+    ) -> "ParameterAdvisor":
+        """Creates an advisor for a room, or a sample of its events.
+
+        Args:
+            events: Matrix room events, e.g. a representative sample of the room
+            queries: Queries that the costs are averaged over. Defaults to every keyword once
+            normalizer: `Normalizer` used to tokenize messages and queries. Defaults to a shared English normalizer
+            seed: Seed of the placement of chunks, so that evaluations are reproducible
+            room_size: Number of events in the room, if the events are a sample of it. Defaults to the number of events, i.e. costs of the events themselves
+
+        Returns:
+            A `ParameterAdvisor` for the inverted index of the events.
+        """
+
+        events = list(events)
+        start = time.perf_counter()
+        documents, keywords = EncryptedIndex.parse(events, normalizer)
+        inverted_index = EncryptedIndex.invert(documents, keywords)
+        parse_seconds = time.perf_counter() - start
+        scale = 1.0 if room_size is None or not events else room_size / len(
+            events)
+        return cls(inverted_index, queries, normalizer, seed, scale,
+                   parse_seconds)
+
+    def evaluate(self, s: int, L: int, cutoff_size: int) -> ParameterEstimate:
+        """Evaluates one setting of the parameters.
+
+        Args:
+            s: Int parameter that determines the space/read efficiency tradeoff
+            L: Int parameter that determines the locality
+            cutoff_size: File size limit, in bytes
+
+        Returns:
+            The expected costs of the setting.
+        """
+
+        encrypted_index, build_seconds = self.__build(s, L)
+        return self.__estimate(encrypted_index, build_seconds, cutoff_size)
+
+    def evaluate_all(
+        self,
+        s_values: Sequence[int] = S_VALUES,
+        L_values: Sequence[int] = L_VALUES,
+        cutoff_sizes: Sequence[int] = CUTOFF_SIZES,
+    ) -> List[ParameterEstimate]:
+        """Evaluates every combination of candidate values, building the index once per s and L.
+
+        Args:
+            s_values: Candidate values of s
+            L_values: Candidate values of L
+            cutoff_sizes: Candidate file size limits, in bytes
+
+        Returns:
+            List of the expected costs of every combination.
+        """
+
+        estimates = []
+        for s, L in product(s_values, L_values):
+            encrypted_index, build_seconds = self.__build(s, L)
+            for cutoff_size in cutoff_sizes:
+                estimates.append(
+                    self.__estimate(encrypted_index, build_seconds,
+                                    cutoff_size))
+        return estimates
+
+    def recommend(
+        self,
+        target: str = "latency",
+        max_storage: Optional[int] = None,
+        max_files_per_query: Optional[float] = None,
+        max_bytes_per_query: Optional[float] = None,
+        estimates: Optional[Iterable[ParameterEstimate]] = None,
+    ) -> ParameterEstimate:
+        """Recommends the best setting for a target, among those within the given limits.
+
+        The "latency" target minimizes the files fetched per query, since every file is a round trip to the homeserver, then the bytes downloaded per query. The "storage" target minimizes the total size of the files, then the files fetched per query.
+
+        Files and bytes depend on the size of the room relative to cutoff_size, so recommendations are only valid for a room of the size that the advisor was given, e.g. with `room_size`. Recommendations for a sample of unknown scale hold for the sample, not the room.
+
+        Args:
+            target: Either "latency" or "storage"
+            max_storage: Limit on the total size of the files, in bytes
+            max_files_per_query: Limit on the mean number of files fetched per query
+            max_bytes_per_query: Limit on the mean number of bytes downloaded per query
+            estimates: Candidates to choose from, e.g. from `evaluate_all` with other values. Defaults to evaluating every combination of the default values
+
+        Returns:
+            The expected costs of the recommended setting.
+
+        Raises:
+            ValueError: If the target is unknown, or no candidate is within the limits.
+        """
+
+        if target not in TARGETS:
+            raise ValueError(f"Unknown target {target!r}, expected one of "
+                             f"{', '.join(TARGETS)}")
+
+        def within_limits(estimate: ParameterEstimate) -> bool:
+            return all(limit is None or value <= limit for value, limit in (
+                (estimate.storage, max_storage),
+                (estimate.files_per_query, max_files_per_query),
+                (estimate.bytes_per_query, max_bytes_per_query),
+            ))
+
+        if estimates is None:
+            estimates = self.evaluate_all()
+        estimates = list(filter(within_limits, estimates))
+        if not estimates:
+            raise ValueError("No candidate parameters are within the limits")
+
+        if target == "latency":
+            return min(estimates,
+                       key=lambda e:
+                       (e.files_per_query, e.bytes_per_query, e.storage))
+        return min(estimates,
+                   key=lambda e:
+                   (e.storage, e.files_per_query, e.bytes_per_query))
+
+    def __build(self, s: int, L: int) -> Tuple[EncryptedIndex, float]:
+        """Lays the inverted index out with the given s and L, on the levels of the room if the inverted index is of a sample.
+
+        Returns:
+            A tuple of the form (I, T), where — I is the index and T is the time taken to lay it out, in seconds.
+        """
+
+        encrypted_index = EncryptedIndex([],
+                                         s=s,
+                                         L=L,
+                                         rng=KeyedRandom(self.__seed))
+        start = time.perf_counter()
+        encrypted_index.keywords = set(self.__inverted_index)
+        levels = encrypted_index.calc_params(self.__inverted_index)
+        if self.__scale > 1 and levels:
+            # Lay the sample out on the levels of the room, shrunk by the scale
+            shift = floor(log2(self.__scale))
+            room_size = round(encrypted_index.size * self.__scale)
+            levels = {
+                l: LevelInfo(l, encrypted_index.size)
+                for l in
+                {max(l - shift, 0)
+                 for l in _level_indices(room_size, s, L)}
+            }
+        encrypted_index._EncryptedIndex__levels = levels
+        encrypted_index.distribute(self.__inverted_index)
+        return encrypted_index, time.perf_counter() - start
+
+    def __estimate(
+        self,
+        encrypted_index: EncryptedIndex,
+        build_seconds: float,
+        cutoff_size: int,
+    ) -> ParameterEstimate:
+        """Stores an index in memory with the given cutoff_size, scaled to the sample, and looks every query up."""
+
+        scale = self.__scale
+        estimate = ParameterEstimate(encrypted_index.s, encrypted_index.L,
+                                     cutoff_size)
+        estimate.levels = len(encrypted_index.datastore)
+        estimate.build_seconds = (self.__parse_seconds + build_seconds) * scale
+
+        # Store the index, keeping only the sizes of the files
+        storage = IndexStorage(encrypted_index,
+                               max(round(cutoff_size / scale), 1))
+        sizes: Dict[str, int] = {}
+        for file_data, callback in storage:
+            mxc_uri = f"mxc://advisor/{len(sizes)}"
+            sizes[mxc_uri] = len(json.dumps(file_data))
+            callback(mxc_uri)
+        storage.update_lookup_table()
+        estimate.files = len(sizes)
+        estimate.storage = round(sum(sizes.values()) * scale)
+
+        # Look every query up
+        search = EncryptedSearch((storage.lookup_table, ), self.__normalizer)
+        files, downloads = [], []
+        for query in self.__queries:
+            mxc_uris = search.lookup(query)
+            files.append(len(mxc_uris))
+            downloads.append(sum(sizes[mxc_uri] for mxc_uri in mxc_uris))
+        if files:
+            estimate.files_per_query = mean(files)
+            estimate.max_files_per_query = max(files)
+            estimate.bytes_per_query = mean(downloads) * scale
+        return estimate
@@ -1,2 +1,14 @@
 class LocationFormatError(Exception):
     pass
+
+
+class IndexCapacityError(Exception):
+    pass
+
+
+class FileFormatError(Exception):
+    pass
+
+
+class TransientUploadError(Exception):
+    pass
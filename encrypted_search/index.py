@@ -1,11 +1,58 @@
-import secrets
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from itertools import starmap
 from math import ceil, log
-from typing import List, Set, Tuple
-
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ContextManager,
+    DefaultDict,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .exceptions import IndexCapacityError
+from .models.build_stats import BuildStats
+from .models.compact_level import CompactLevel, compact_slots
+from .models.index_update import IndexUpdate
 from .models.level_info import LevelInfo
 from .models.location import Location
-from .types import Corpus, Datastore, Event, InvertedIndex, LevelInfos, LookupTable
-from .utils.normalizer import normalize
+from .models.string_table import StringTable
+from .models.tombstones import Tombstones
+from .models.vocabulary import ID_TYPECODE, Vocabulary
+from .types import (
+    Corpus,
+    Datastore,
+    Event,
+    InvertedIndex,
+    LevelInfos,
+    LookupTable,
+    Postings,
+)
+from .utils.bucket_capacities import BucketCapacities
+from .utils.keyed_random import SEED_SIZE, KeyedRandom
+from .utils.normalizer import Normalizer, get_default_normalizer
+from .utils.posting_runs import PostingRuns, read_posting_lists, write_posting_list
+
+if TYPE_CHECKING:
+    from multiprocessing.pool import AsyncResult
+
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_COMPACTION_RATIO = 0.25
+ID_SIZE = array(ID_TYPECODE).itemsize
+PLACEMENT_TYPECODE = "Q"  # Typecode of the arrays of chunk placements
 
 
 class EncryptedIndex:
@@ -13,12 +60,21 @@ class EncryptedIndex:
 
     To prevent data leakage, we transform a simple inverted index into two structures: a collection of arrays and a lookup table. This class sets up this scheme and exposes the data to be searched upon.
 
+    While the index is built, keywords and event ids are replaced by dense integer ids and posting lists are stored as integer arrays. Event ids are translated back into strings only when they're written to the datastore. Events are consumed in a single streaming pass, so they can be fed from a generator, e.g. while paging through room history.
+
     Args:
-        events: List of Matrix room events to be indexed
+        events: Iterable of Matrix room events to be indexed
 
     Keyword Args:
         s: Int parameter that determines the space/read efficiency tradeoff
         L: Int parameter that determines the locality
+        normalizer: `Normalizer` used to tokenize the messages. Defaults to a shared English normalizer
+        workers: Number of processes that parse the events and fill levels. Defaults to 1, i.e. building in this process
+        chunk_size: Number of messages normalized at a time
+        stats: `BuildStats` to be filled with measurements of the build. Nothing is measured without it
+        rng: Source of randomness for the placement of chunks, with a `randbelow(n)` method. Defaults to a `KeyedRandom` seeded from `secrets`; pass `KeyedRandom(seed)` for a reproducible datastore
+        memory_budget: Approximate number of bytes that posting lists may take in memory. If given, the index is built out of core: posting lists are spilled to temporary files as sorted runs, merged, and placed one level at a time. The result is exactly the same as building in memory
+        temp_dir: Directory for the temporary files of an out-of-core build. Defaults to the system's temporary directory
 
     Attributes:
         datastore: Three dimensional array-like structure containing document ids according to the structuring scheme
@@ -28,6 +84,9 @@ class EncryptedIndex:
         size: sum(len(inverted_index[w]): w∈keywords)
         s: Int parameter that determines the space/read efficiency tradeoff
         L: Int parameter that determines the locality
+        stats: `BuildStats` filled with measurements of the build, if any
+        rng: Source of randomness for the placement of chunks
+        tombstones: Ids of deleted events that the datastore still holds
     """
 
     datastore: Datastore
@@ -37,45 +96,90 @@ class EncryptedIndex:
     s: int
     L: int
     size: int
+    stats: Optional[BuildStats]
+    rng: KeyedRandom
+    tombstones: Tombstones
 
     __levels: LevelInfos
+    __documents: StringTable
+    __document_ordinals: Optional[Dict[str, int]]
+    __deleted: Set[int]
 
-    def __init__(self, events: List[Event], **kwargs):
-        # Pre-setup
-        documents, keywords = self.parse(events)
-        inverted_index = self.invert(documents, keywords)
+    def __init__(self, events: Iterable[Event], **kwargs):
+        self.stats = kwargs.get('stats')
+        self.rng = kwargs.get('rng') or KeyedRandom()
 
         # Set parameters
         self.s = kwargs.get('s', 2)
         self.L = kwargs.get('L', 1)
-        self.keywords = keywords
-        self.__levels = self.calc_params(inverted_index)
-
-        # Setup
-        self.distribute(inverted_index)
+        workers = kwargs.get('workers', 1)
+        memory_budget = kwargs.get('memory_budget')
+
+        with ExitStack() as stack:
+            # Pre-setup
+            keyword_ids, document_ids = Vocabulary(), Vocabulary()
+            if self.stats is not None:
+                events = self.stats.count_events(events)
+            parse_kwargs = dict(
+                normalizer=kwargs.get('normalizer'),
+                workers=workers,
+                chunk_size=kwargs.get('chunk_size', DEFAULT_CHUNK_SIZE),
+            )
+            with self.__phase("parse"):
+                if memory_budget is None:
+                    postings = self.build_postings(events, keyword_ids,
+                                                   document_ids,
+                                                   **parse_kwargs)
+                else:
+                    runs = stack.enter_context(
+                        PostingRuns(memory_budget, kwargs.get('temp_dir')))
+                    self.spill_postings(events, keyword_ids, document_ids,
+                                        runs, **parse_kwargs)
+            if self.stats is not None:
+                self.stats.documents = len(document_ids)
+
+            # Setup
+            self.keywords = set(keyword_ids)
+            if memory_budget is None:
+                self.__levels = self.calc_params(postings)
+                self.distribute(postings,
+                                keyword_ids,
+                                document_ids,
+                                workers=workers)
+            else:
+                self.__levels = self.__calc_levels(runs.lengths)
+                self.distribute_runs(runs,
+                                     keyword_ids,
+                                     document_ids,
+                                     workers=workers)
 
     @staticmethod
-    def parse(events: List[Event]) -> Tuple[Corpus, Set[str]]:
+    def parse(
+        events: List[Event],
+        normalizer: Optional[Normalizer] = None,
+    ) -> Tuple[Corpus, Set[str]]:
         """Transforms raw Matrix room events into normalized and simplified documents.
 
         Args:
             events: List of Matrix room events to be indexed
+            normalizer: `Normalizer` used to tokenize the messages. Defaults to a shared English normalizer
 
         Returns:
             A tuple of the form (D, K), where — D is a mapping from document ids to the set of keywords present in each document and K is a set of all the normalized tokens present in the corpus.
         """
 
+        if normalizer is None:
+            normalizer = get_default_normalizer()
+
+        messages = list(_messages(events))
+
         documents: Corpus = {}
         keywords: Set[str] = set()
-        for event in events:
-            if event["type"] == "m.room.message" \
-                    and "content" in event \
-                    and "body" in event["content"]:
-                event_id: str = event["event_id"]
-                content: str = event["content"]["body"]
-                tokens = normalize(content)
-                keywords |= tokens
-                documents[event_id] = tokens
+        all_tokens = normalizer.normalize_many(content
+                                               for _, content in messages)
+        for (event_id, _), tokens in zip(messages, all_tokens):
+            keywords |= tokens
+            documents[event_id] = tokens
         return documents, keywords
 
     @staticmethod
@@ -99,84 +203,799 @@ class EncryptedIndex:
                 inverted_index[token].add(doc_id)
         return inverted_index
 
-    def calc_params(self, inverted_index: InvertedIndex) -> LevelInfos:
+    @staticmethod
+    def build_postings(
+        events: Iterable[Event],
+        keyword_ids: Vocabulary,
+        document_ids: Vocabulary,
+        normalizer: Optional[Normalizer] = None,
+        workers: int = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Postings:
+        """Transforms raw Matrix room events into posting lists of integer ids, in a single streaming pass.
+
+        Events are consumed lazily, in chunks of `chunk_size` messages, so neither the raw events nor a corpus of documents are held in memory. Only the posting lists and the two vocabularies grow with the size of the room. Events whose id was already seen are skipped.
+
+        Keywords of each document are added to `keyword_ids` in sorted order, so that the ids only depend on the order of the events. With several workers, chunks are normalized by a pool of processes. Each chunk comes back with its own keyword vocabulary and posting lists, which are merged in the order of the chunks, so the result is exactly the same as parsing in this process.
+
+        Args:
+            events: Iterable of Matrix room events to be indexed, e.g. a generator
+            keyword_ids: Vocabulary that the keywords are added to
+            document_ids: Vocabulary that the event ids are added to
+            normalizer: `Normalizer` used to tokenize the messages. Defaults to a shared English normalizer
+            workers: Number of processes that parse the events
+            chunk_size: Number of messages normalized at a time
+
+        Returns:
+            A mapping from keyword ids to arrays of the ids of documents that contain them, in increasing order.
+        """
+
+        postings: Postings = {}
+        for chunk_keywords, chunk_postings in _encode_events(
+                events, document_ids, normalizer, workers, chunk_size):
+            # Translate ids of the chunk's vocabulary into global ids
+            global_ids = keyword_ids.add_all(chunk_keywords)
+            for keyword_id, docs in chunk_postings.items():
+                global_id = global_ids[keyword_id]
+                if global_id in postings:
+                    postings[global_id].extend(docs)
+                else:
+                    postings[global_id] = docs
+        return postings
+
+    @staticmethod
+    def spill_postings(
+        events: Iterable[Event],
+        keyword_ids: Vocabulary,
+        document_ids: Vocabulary,
+        runs: PostingRuns,
+        normalizer: Optional[Normalizer] = None,
+        workers: int = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """Transforms raw Matrix room events into posting lists of integer ids, like `build_postings`, but spills them to disk instead of holding them in memory.
+
+        Args:
+            events: Iterable of Matrix room events to be indexed, e.g. a generator
+            keyword_ids: Vocabulary that the keywords are added to
+            document_ids: Vocabulary that the event ids are added to
+            runs: `PostingRuns` that the posting lists are added to
+            normalizer: `Normalizer` used to tokenize the messages. Defaults to a shared English normalizer
+            workers: Number of processes that parse the events
+            chunk_size: Number of messages normalized at a time
+        """
+
+        for chunk_keywords, chunk_postings in _encode_events(
+                events, document_ids, normalizer, workers, chunk_size):
+            global_ids = keyword_ids.add_all(chunk_keywords)
+            for keyword_id, docs in chunk_postings.items():
+                runs.extend(global_ids[keyword_id], docs)
+
+    def calc_params(
+        self,
+        inverted_index: Union[InvertedIndex, Postings],
+    ) -> LevelInfos:
         """Calculates index-wide parameters and level-specific parameters based on s, L and the inverted index.
 
         Args:
             inverted_index: Mapping from keywords to documents that contain them
         """
 
-        self.size = sum(len(arr) for arr in inverted_index.values())
+        return self.__calc_levels(array("L", map(len,
+                                                 inverted_index.values())))
 
-        # Determine populated levels
-        if self.size == 0:
-            return {}
-        l0 = ceil(log(self.size, 2))
-        p = ceil(l0 / self.s)
-        level_indices = {l0 - i for i in range(0, p * self.s, p)}
-        if self.L > 1:
-            level_indices.add(0)
+    def __calc_levels(self, lengths: Sequence[int]) -> LevelInfos:
+        """Calculates the parameters of `calc_params` from the lengths of the posting lists alone.
 
-        # Determine parameters of various structures on each level
-        levels = {l: LevelInfo(l, self.size) for l in level_indices}
-        return levels
+        Args:
+            lengths: Length of the posting list of each keyword
+        """
 
-    def distribute(self, inverted_index: InvertedIndex) -> None:
+        with self.__phase("calc_params"):
+            self.size = sum(lengths)
+            if self.stats is not None:
+                self.stats.keywords = len(lengths)
+                self.stats.tokens = self.size
+                for n in lengths:
+                    # Round up to a power of two
+                    rounded_length = 1 << (n - 1).bit_length()
+                    self.stats.posting_list_lengths[rounded_length] += 1
+
+            # Determine populated levels
+            if self.size == 0:
+                return {}
+            level_indices = _level_indices(self.size, self.s, self.L)
+
+            # Determine parameters of various structures on each level
+            levels = {l: LevelInfo(l, self.size) for l in level_indices}
+            return levels
+
+    def distribute(
+        self,
+        inverted_index: Union[InvertedIndex, Postings],
+        keyword_ids: Optional[Vocabulary] = None,
+        document_ids: Optional[Vocabulary] = None,
+        workers: int = 1,
+    ) -> None:
         """Fill the datastore and lookup_table with values from the inverted index according to the SSE scheme.
 
+        Once keywords are assigned to levels, levels share no state, so each level is filled on its own, with randomness from its own `KeyedRandom` whose key is drawn from `rng`. With several workers, levels are filled by a pool of processes that receive posting lists and return filled levels and chunk placements as compact arrays. The result is exactly the same as filling them in this process.
+
         Args:
-            inverted_index: Mapping from keywords to documents that contain them
+            inverted_index: Mapping from keywords to documents that contain them, either as strings or as ids
+            keyword_ids: Vocabulary of the keywords, if `inverted_index` is keyed by keyword ids
+            document_ids: Vocabulary of the event ids, if `inverted_index` contains arrays of document ids
+            workers: Number of processes that fill levels
         """
-        # Initialize structures
-        self.lookup_table = {keyword: [] for keyword in self.keywords}
-        self.datastore = {
-            level_index: [[] for _ in range(level.number_of_buckets)]
-            for level_index, level in self.__levels.items()
-        }
+        stats = self.stats
+        with self.__phase("distribute"):
+            # Translate event ids into ids, if they're strings
+            if document_ids is None:
+                document_ids = Vocabulary()
+                inverted_index = {
+                    keyword: document_ids.add_all(docs)
+                    for keyword, docs in inverted_index.items()
+                }
+
+            # Assign every posting list to a level before placement
+            lengths = array("L", map(len, inverted_index.values()))
+            assigned_levels, chunk_counts = self.__assign_levels(lengths)
+            if stats is not None:
+                for level_index, count in chunk_counts.items():
+                    stats.chunks[level_index] += count
+
+            # Group keywords by level, keeping their order
+            self.lookup_table = {}
+            keywords_of_level: Dict[int, List[Tuple[str, int]]] = {
+                level_index: []
+                for level_index in self.__levels
+            }
+            postings_of_level: Dict[int, List[array]] = {
+                level_index: []
+                for level_index in self.__levels
+            }
+            for (keyword, docs), level_index in zip(inverted_index.items(),
+                                                    assigned_levels):
+                if keyword_ids is not None:
+                    keyword = keyword_ids[keyword]
+                self.lookup_table[keyword] = []
+                keywords_of_level[level_index].append((keyword, len(docs)))
+                postings_of_level[level_index].append(docs)
+
+            self.__fill_levels(_fill_level, postings_of_level,
+                               keywords_of_level, document_ids, workers)
+
+    def distribute_runs(
+        self,
+        runs: PostingRuns,
+        keyword_ids: Vocabulary,
+        document_ids: Vocabulary,
+        workers: int = 1,
+    ) -> None:
+        """Fill the datastore and lookup table from posting lists spilled to disk, like `distribute`, one level at a time.
+
+        The merged posting lists are written to one file per level, in order of keyword id. Each level is then filled straight from its file, so only the datastore, the lookup table and the vocabularies are held in memory, never the posting lists. The result is exactly the same as distributing the posting lists from memory.
 
-        # Initialize helper
-        bucket_capacity = dict()
-        for i, l in self.__levels.items():
-            bucket_capacity[i] = [
-                l.large_bucket_size for _ in range(l.number_of_large_buckets)
-            ]
-            if l.small_bucket_size != 0:
-                bucket_capacity[i].append(l.small_bucket_size)
-
-        for keyword in self.keywords:
-            docs = list(inverted_index[keyword])
-            n = len(docs)
+        Args:
+            runs: `PostingRuns` holding the posting lists
+            keyword_ids: Vocabulary of the keywords
+            document_ids: Vocabulary of the event ids
+            workers: Number of processes that fill levels
+        """
+        stats = self.stats
+        with self.__phase("distribute"):
+            # Assign every posting list to a level before placement
+            assigned_levels, chunk_counts = self.__assign_levels(runs.lengths)
+            if stats is not None:
+                for level_index, count in chunk_counts.items():
+                    stats.chunks[level_index] += count
+
+            # Split merged posting lists by level, keeping their order
+            self.lookup_table = {}
+            keywords_of_level: Dict[int, List[Tuple[str, int]]] = {
+                level_index: []
+                for level_index in self.__levels
+            }
+            paths = {
+                level_index: runs.path(f"level{level_index}")
+                for level_index in self.__levels
+            }
+            with ExitStack() as stack:
+                files = {
+                    level_index: stack.enter_context(open(path, "wb"))
+                    for level_index, path in paths.items()
+                }
+                for keyword_id, docs in runs:
+                    level_index = assigned_levels[keyword_id]
+                    keyword = keyword_ids[keyword_id]
+                    self.lookup_table[keyword] = []
+                    keywords_of_level[level_index].append((keyword, len(docs)))
+                    write_posting_list(files[level_index], keyword_id, docs)
+
+            self.__fill_levels(_fill_spilled_level, paths, keywords_of_level,
+                               document_ids, workers)
+
+    def __fill_levels(
+        self,
+        fill: Callable[..., Tuple[array, array, array, int]],
+        sources: Dict[int, Any],
+        keywords_of_level: Dict[int, List[Tuple[str, int]]],
+        document_ids: Vocabulary,
+        workers: int,
+    ) -> None:
+        """Fills every level, possibly in a pool of processes, and stitches the levels and lookup table together.
 
-            # Determine level
-            bound = log(n / self.L, 2)
-            level_index = min(l for l in self.__levels if l >= bound)
+        Args:
+            fill: `_fill_level`, or a function with the same results
+            sources: Mapping from level indices to the posting lists that `fill` takes, in some form
+            keywords_of_level: Keywords of each level and the lengths of their posting lists, in order
+            document_ids: Vocabulary of the event ids
+            workers: Number of processes that fill levels
+        """
+        stats = self.stats
+        # Fill levels
+        level_indices = sorted(self.__levels)
+        tasks = [(
+            self.__levels[level_index],
+            sources.pop(level_index),
+            self.rng.randbelow(2**(8 * SEED_SIZE)),
+            stats is not None,
+        ) for level_index in level_indices]
+        workers = min(workers, len(tasks))
+        if workers <= 1:
+            results = starmap(fill, tasks)
+        else:
+            from multiprocessing import Pool
+
+            with Pool(workers) as pool:
+                results = pool.starmap(fill, tasks)
+
+        # Stitch levels and lookup table together
+        documents = self.__documents = StringTable(document_ids)
+        self.__document_ordinals = None
+        self.__deleted = set()
+        self.tombstones = Tombstones()
+        self.datastore = {}
+        for level_index, (ordinals, offsets, placements,
+                          candidates) in zip(level_indices, results):
             level = self.__levels[level_index]
+            self.datastore[level_index] = CompactLevel(ordinals, offsets,
+                                                       documents)
+
+            self.__locate_chunks(level_index, keywords_of_level[level_index],
+                                 placements)
+
+            if stats is not None:
+                stats.candidate_buckets[level_index] += candidates
+                filled = len(ordinals)
+                stats.level_fill[level_index] = filled / level.array_size
+
+    def add_events(
+        self,
+        events: Iterable[Event],
+        normalizer: Optional[Normalizer] = None,
+    ) -> IndexUpdate:
+        """Adds new messages to the index without rebuilding it.
+
+        New postings of a keyword are appended as new chunks to buckets of the keyword's level that have capacity to spare. The last chunk of a keyword is extended in place instead, up to the chunk size of the level, if it's at the end of its bucket. A keyword whose posting list outgrows its level is moved, whole, to the level that fits it, and a keyword that would have more chunks than a rebuild gives it is placed anew, whole, on its level, so that keywords keep the locality of the scheme; the chunks it leaves behind stay where they are, unreferenced, so that their buckets don't change. Levels keep the parameters that they were built with, so once their slack is used up the index has to be rebuilt; keywords placed anew use it up fastest, since their old chunks are only dropped when their level is compacted. Events whose id is already indexed are skipped.
+
+        Args:
+            events: Iterable of new Matrix room events
+            normalizer: `Normalizer` used to tokenize the messages, which should be the one that the index was built with. Defaults to a shared English normalizer
+
+        Returns:
+            The buckets, levels and keywords that changed.
 
-            # Divide into chunks
-            chunks = [
-                docs[i:i + level.large_chunk_size]
-                for i in range(0, len(docs), level.large_chunk_size)
-            ]
-            for chunk in chunks:
+        Raises:
+            IndexCapacityError: If a posting list outgrows the highest level, or a level has no bucket with enough capacity left for a chunk. The index is left unchanged.
+            TypeError: If the datastore isn't made of `CompactLevel`s, e.g. if it was deserialized.
+        """
+
+        self.__check_compact()
+        document_ordinals = self.__ordinals()
+
+        # Parse new events
+        keyword_ids, document_ids = Vocabulary(), Vocabulary()
+        postings = self.build_postings(
+            (event for event in events
+             if event.get("event_id") not in document_ordinals),
+            keyword_ids,
+            document_ids,
+            normalizer,
+        )
+        first_ordinal = len(self.__documents)
+
+        # Plan placements without changing the index, so that it's left intact if they fail
+        update = IndexUpdate()
+        capacities: Dict[int, BucketCapacities] = {}
+        new_chunks: Dict[int, Dict[int, array]] = {}
+        new_locations: Dict[str, List[Location]] = {}
+        for keyword_id, docs in postings.items():
+            keyword = keyword_ids[keyword_id]
+            ordinals = array(ID_TYPECODE, (first_ordinal + d for d in docs))
+            locations = list(self.lookup_table.get(keyword, ()))
+            n = len(docs)
+            n += sum(location.chunk_length for location in locations)
+            level_index = self.__level_of(n)
+            if level_index not in capacities:
+                capacities[level_index] = self.__spare_capacities(level_index)
+                new_chunks[level_index] = {}
+            level = self.datastore[level_index]
+            chunk_size = self.__levels[level_index].large_chunk_size
+
+            # Room left in the last chunk of the keyword, if it's at the end of its bucket
+            extension = 0
+            if locations and locations[0].level_index == level_index:
+                last = locations[-1]
+                b = last.bucket_index
+                end_of_bucket = level.bucket_length(b) + len(
+                    new_chunks[level_index].get(b, ()))
+                if last.start_of_chunk + last.chunk_length == end_of_bucket:
+                    extension = min(len(ordinals),
+                                    chunk_size - last.chunk_length,
+                                    capacities[level_index][b])
+
+            chunks = len(locations) + ceil(
+                (len(ordinals) - extension) / chunk_size)
+            if locations and (locations[0].level_index != level_index
+                              or chunks > ceil(n / chunk_size)):
+                # Place the whole posting list anew, on the level that fits it and in as few chunks as a rebuild would
+                ordinals = self.__read(locations) + ordinals
+                locations = []
+            elif extension > 0:
+                # Extend the last chunk in place
+                capacities[level_index].fill(b, extension)
+                new_chunks[level_index].setdefault(
+                    b, array(ID_TYPECODE)).extend(ordinals[:extension])
+                locations[-1] = Location(
+                    is_remote=False,
+                    level_index=level_index,
+                    bucket_index=b,
+                    start_of_chunk=last.start_of_chunk,
+                    chunk_length=last.chunk_length + extension,
+                )
+                ordinals = ordinals[extension:]
+
+            for i in range(0, len(ordinals), chunk_size):
                 # Choose bucket
-                possible_buckets = [
-                    index for index, capacity in enumerate(
-                        bucket_capacity[level_index]) if capacity >= len(chunk)
-                ]
-                chosen_bucket = secrets.choice(possible_buckets)
-
-                # Update helper
-                prev_len = len(self.datastore[level_index][chosen_bucket])
-                chunk_length = len(chunk)
-                bucket_capacity[level_index][chosen_bucket] -= chunk_length
-
-                # Append chunk
-                self.datastore[level_index][chosen_bucket] += chunk
-                self.lookup_table[keyword].append(
+                chunk = ordinals[i:i + chunk_size]
+                try:
+                    chosen_bucket = capacities[level_index].choose(
+                        len(chunk), self.rng.randbelow)
+                except IndexError:
+                    raise IndexCapacityError(
+                        f"No bucket on level {level_index} has room for a chunk of {len(chunk)} documents"
+                    ) from None
+                capacities[level_index].fill(chosen_bucket, len(chunk))
+
+                # Append chunk after the ones already planned for the bucket
+                pending = new_chunks[level_index].setdefault(
+                    chosen_bucket, array(ID_TYPECODE))
+                start = level.bucket_length(chosen_bucket) + len(pending)
+                pending += chunk
+                locations.append(
                     Location(
                         is_remote=False,
                         level_index=level_index,
                         bucket_index=chosen_bucket,
-                        start_of_chunk=prev_len,
-                        chunk_length=chunk_length,
+                        start_of_chunk=start,
+                        chunk_length=len(chunk),
+                    ))
+
+            new_locations[keyword] = locations
+            update.postings += len(docs)
+
+        # Apply placements
+        self.__documents.extend(document_ids)
+        document_ordinals.update(
+            (event_id, ordinal)
+            for ordinal, event_id in enumerate(document_ids, first_ordinal))
+        for level_index, chunks in new_chunks.items():
+            self.datastore[level_index].extend_buckets(chunks)
+            update.buckets[level_index] = set(chunks)
+        self.lookup_table.update(new_locations)
+        self.keywords.update(new_locations)
+        self.size += update.postings
+
+        update.keywords = set(new_locations)
+        update.documents = len(document_ids)
+        return update
+
+    def delete_events(
+        self,
+        event_ids: Iterable[str],
+        compaction_ratio: float = DEFAULT_COMPACTION_RATIO,
+    ) -> IndexUpdate:
+        """Deletes messages from the index, e.g. because they were redacted or edited.
+
+        Deleted event ids are recorded in `tombstones`, which searches filter their results against, so the datastore doesn't have to change right away. Once the postings of deleted messages make up `compaction_ratio` of a level, that level alone is compacted: the live postings of its keywords are placed anew, and keywords without any are dropped. Event ids are removed from `tombstones` once no level holds them.
+
+        Args:
+            event_ids: Ids of the events to be deleted; unknown ids are ignored
+            compaction_ratio: Fraction of dead postings at which a level is compacted
+
+        Returns:
+            The buckets, levels and keywords that changed, and the number of messages deleted. Tombstones change whenever messages are deleted.
+
+        Raises:
+            IndexCapacityError: If the live postings of a level no longer fit its buckets once placed anew. The index is left unchanged.
+            TypeError: If the datastore isn't made of `CompactLevel`s, e.g. if it was deserialized.
+        """
+
+        self.__check_compact()
+        document_ordinals = self.__ordinals()
+        update = IndexUpdate()
+        deleted = set(self.__deleted)
+        for event_id in set(event_ids):
+            ordinal = document_ordinals.get(event_id)
+            if ordinal is not None and ordinal not in deleted:
+                deleted.add(ordinal)
+                update.deleted += 1
+        if not update.deleted:
+            return update
+
+        # Plan compactions without changing the index, so that it's left intact if they fail
+        remaining: Set[int] = set()
+        compactions: Dict[int, Tuple[List[Tuple[str, int]], array, array,
+                                     array]] = {}
+        dropped: List[str] = []
+        removed = 0
+        for level_index, level in self.datastore.items():
+            dead = sum(map(deleted.__contains__, level.ordinals))
+            if dead == 0:
+                continue
+            if dead < compaction_ratio * len(level.ordinals):
+                remaining.update(deleted.intersection(level.ordinals))
+                continue
+
+            # Place the live postings of the level anew
+            keywords: List[Tuple[str, int]] = []
+            posting_lists: List[array] = []
+            for keyword, locations in self.lookup_table.items():
+                if locations[0].level_index != level_index:
+                    continue
+                ordinals = self.__read(locations)
+                live = array(ID_TYPECODE,
+                             (o for o in ordinals if o not in deleted))
+                removed += len(ordinals) - len(live)
+                if live:
+                    keywords.append((keyword, len(live)))
+                    posting_lists.append(live)
+                else:
+                    dropped.append(keyword)
+            try:
+                ordinals, offsets, placements, _ = _fill_level(
+                    self.__levels[level_index],
+                    posting_lists,
+                    self.rng.randbelow(2**(8 * SEED_SIZE)),
+                )
+            except IndexError:
+                raise IndexCapacityError(
+                    f"No bucket on level {level_index} has room for a chunk of its live postings"
+                ) from None
+            compactions[level_index] = keywords, ordinals, offsets, placements
+
+        # Apply compactions
+        self.__deleted = deleted
+        for keyword in dropped:
+            del self.lookup_table[keyword]
+        self.keywords.difference_update(dropped)
+        update.keywords.update(dropped)
+        for level_index, (keywords, ordinals, offsets,
+                          placements) in compactions.items():
+            level = self.datastore[level_index]
+            level.ordinals, level.offsets = ordinals, offsets
+            for keyword, _ in keywords:
+                del self.lookup_table[keyword]
+                update.keywords.add(keyword)
+            self.__locate_chunks(level_index, keywords, placements)
+            update.buckets[level_index] = set(range(len(level)))
+        self.size -= removed
+
+        # Keep tombstones of the event ids that some level still holds
+        self.tombstones = Tombstones(self.__documents.lookup(
+            sorted(remaining)))
+        return update
+
+    def __assign_levels(
+        self,
+        lengths: Sequence[int],
+    ) -> Tuple[List[int], Dict[int, int]]:
+        """Assigns posting lists to levels by their lengths, computing the level once per distinct length.
+
+        Args:
+            lengths: Length of each posting list
+
+        Returns:
+            A tuple of the form (A, C), where — A is the level index of each posting list and C is the number of chunks on each level.
+        """
+
+        level_of_length: Dict[int, int] = {}
+        chunk_counts: DefaultDict[int, int] = defaultdict(int)
+        for n, count in Counter(lengths).items():
+            level_index = self.__level_of(n)
+            level_of_length[n] = level_index
+            chunk_size = self.__levels[level_index].large_chunk_size
+            chunk_counts[level_index] += count * ceil(n / chunk_size)
+        return list(map(level_of_length.__getitem__, lengths)), chunk_counts
+
+    def __locate_chunks(
+        self,
+        level_index: int,
+        keywords: List[Tuple[str, int]],
+        placements: array,
+    ) -> None:
+        """Appends the locations of the chunks placed by `_fill_level` to the lookup table.
+
+        Args:
+            level_index: Index of the filled level
+            keywords: Keywords of the level and the lengths of their posting lists, in the order they were placed
+            placements: Bucket index, start and length of every chunk, in order
+        """
+
+        chunk_size = self.__levels[level_index].large_chunk_size
+        placement = iter(placements)
+        for keyword, n in keywords:
+            locations = self.lookup_table.setdefault(keyword, [])
+            for _ in range(ceil(n / chunk_size)):
+                locations.append(
+                    Location(
+                        is_remote=False,
+                        level_index=level_index,
+                        bucket_index=next(placement),
+                        start_of_chunk=next(placement),
+                        chunk_length=next(placement),
                     ))
+
+    def __level_of(self, n: int) -> int:
+        """Finds the smallest level that fits a posting list of length `n` in at most L chunks.
+
+        Raises:
+            IndexCapacityError: If no level is large enough.
+        """
+
+        level_indices = sorted(self.__levels)
+        position = bisect_left(level_indices, log(n / self.L, 2))
+        if position == len(level_indices):
+            raise IndexCapacityError(
+                f"No level fits a posting list of {n} documents")
+        return level_indices[position]
+
+    def __check_compact(self) -> None:
+        """Ensures that the datastore can be changed in place."""
+
+        levels = self.datastore.values()
+        if not all(isinstance(level, CompactLevel) for level in levels):
+            raise TypeError(
+                "Only a datastore of compact levels can be changed in place")
+
+    def __ordinals(self) -> Dict[str, int]:
+        """Maps event ids to their ordinals, building the map on first use."""
+
+        if self.__document_ordinals is None:
+            self.__document_ordinals = {
+                event_id: ordinal
+                for ordinal, event_id in enumerate(self.__documents)
+            }
+        return self.__document_ordinals
+
+    def __spare_capacities(self, level_index: int) -> BucketCapacities:
+        """Indexes the capacity left in each bucket of a filled level."""
+
+        level = self.datastore[level_index]
+        return BucketCapacities([
+            size - level.bucket_length(b)
+            for b, size in enumerate(_bucket_sizes(self.__levels[level_index]))
+        ])
+
+    def __read(self, locations: List[Location]) -> array:
+        """Reads the document ordinals of local chunks from the datastore."""
+
+        ordinals = array(ID_TYPECODE)
+        for location in locations:
+            level = self.datastore[location.level_index]
+            start = level.offsets[
+                location.bucket_index] + location.start_of_chunk
+            ordinals += level.ordinals[start:start + location.chunk_length]
+        return ordinals
+
+    def __phase(self, name: str) -> ContextManager:
+        """Measures a phase of the build, if there are stats to be filled."""
+
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.phase(name)
+
+
+def _messages(events: Iterable[Event]) -> Iterator[Tuple[str, str]]:
+    """Picks out the event id and body of message events.
+
+    Args:
+        events: Matrix room events
+
+    Returns:
+        An iterator over tuples of the form (I, B), where — I is the id and B is the body of an "m.room.message" event.
+    """
+
+    for event in events:
+        if event["type"] == "m.room.message" \
+                and "content" in event \
+                and "body" in event["content"]:
+            yield event["event_id"], event["content"]["body"]
+
+
+def _bucket_sizes(level: LevelInfo) -> List[int]:
+    """Lists the capacity of each bucket of a level."""
+
+    sizes = [level.large_bucket_size] * level.number_of_large_buckets
+    if level.small_bucket_size != 0:
+        sizes.append(level.small_bucket_size)
+    return sizes
+
+
+def _level_indices(size: int, s: int, L: int) -> Set[int]:
+    """Determines the populated levels of an index of `size` postings with the given s and L."""
+
+    l0 = ceil(log(size, 2))
+    p = ceil(l0 / s)
+    level_indices = {l0 - i for i in range(0, p * s, p)}
+    if L > 1:
+        level_indices.add(0)
+    return level_indices
+
+
+def _fill_level(
+    level: LevelInfo,
+    posting_lists: Iterable[array],
+    key: int,
+    count_candidates: bool = False,
+) -> Tuple[array, array, array, int]:
+    """Places the posting lists of a level into its buckets, possibly in a worker process.
+
+    Args:
+        level: Parameters of the level
+        posting_lists: Document ids of each keyword on the level, in order
+        key: Key of the `KeyedRandom` that chooses buckets
+        count_candidates: Whether to count the buckets with enough capacity for each chunk
+
+    Returns:
+        A tuple of the form (O, B, P, C), where — O are the document ids in the level and B are the offsets of its buckets, as in `CompactLevel`, P holds the bucket index, start and length of every chunk in order, and C is the number of candidate buckets, if counted.
+    """
+
+    rng = KeyedRandom(key)
+    bucket_capacity = BucketCapacities(_bucket_sizes(level))
+
+    # Fill buckets in fixed-size slots
+    slots = array(ID_TYPECODE, bytes(level.array_size * ID_SIZE))
+    bucket_lengths = [0] * level.number_of_buckets
+    placements = array(PLACEMENT_TYPECODE)
+    candidates = 0
+
+    chunk_size = level.large_chunk_size
+    for docs in posting_lists:
+        for i in range(0, len(docs), chunk_size):
+            # Choose bucket
+            chunk = docs[i:i + chunk_size] if len(docs) > chunk_size else docs
+            chunk_length = len(chunk)
+            chosen_bucket = bucket_capacity.choose(chunk_length, rng.randbelow)
+            if count_candidates:
+                candidates += bucket_capacity.count_at_least(chunk_length)
+
+            # Update helper
+            prev_len = bucket_lengths[chosen_bucket]
+            bucket_lengths[chosen_bucket] += chunk_length
+            bucket_capacity.fill(chosen_bucket, chunk_length)
+
+            # Append chunk into the slot of the bucket
+            start = chosen_bucket * level.large_bucket_size + prev_len
+            slots[start:start + chunk_length] = chunk
+            placements.extend((chosen_bucket, prev_len, chunk_length))
+
+    ordinals, offsets = compact_slots(slots, level.large_bucket_size,
+                                      bucket_lengths)
+    return ordinals, offsets, placements, candidates
+
+
+def _fill_spilled_level(
+    level: LevelInfo,
+    path: str,
+    key: int,
+    count_candidates: bool = False,
+) -> Tuple[array, array, array, int]:
+    """Places the posting lists of a level, read from a run file as they're placed, possibly in a worker process.
+
+    Args:
+        level: Parameters of the level
+        path: Path of the run file that holds the posting lists of the level, in order
+        key: Key of the `KeyedRandom` that chooses buckets
+        count_candidates: Whether to count the buckets with enough capacity for each chunk
+
+    Returns:
+        The same results as `_fill_level`.
+    """
+
+    posting_lists = (docs for _, docs in read_posting_lists(path))
+    return _fill_level(level, posting_lists, key, count_candidates)
+
+
+def _encode_events(
+    events: Iterable[Event],
+    document_ids: Vocabulary,
+    normalizer: Optional[Normalizer],
+    workers: int,
+    chunk_size: int,
+) -> Iterator[Tuple[List[str], Postings]]:
+    """Normalizes messages in chunks, in order, skipping events whose id was already seen.
+
+    Args:
+        events: Iterable of Matrix room events to be indexed
+        document_ids: Vocabulary that the event ids are added to
+        normalizer: `Normalizer` used to tokenize the messages. Defaults to a shared English normalizer
+        workers: Number of processes that normalize chunks
+        chunk_size: Number of messages normalized at a time
+
+    Returns:
+        An iterator over the results of `_encode_chunk` for each chunk, in order.
+    """
+
+    if normalizer is None:
+        normalizer = get_default_normalizer()
+
+    def chunks() -> Iterator[Tuple[int, List[str]]]:
+        first_doc_id = len(document_ids)
+        contents: List[str] = []
+        for event_id, content in _messages(events):
+            if event_id in document_ids:
+                continue
+            document_ids.add(event_id)
+            contents.append(content)
+            if len(contents) == chunk_size:
+                yield first_doc_id, contents
+                first_doc_id += len(contents)
+                contents = []
+        if contents:
+            yield first_doc_id, contents
+
+    encode_chunk = partial(_encode_chunk, normalizer)
+    if workers <= 1:
+        yield from map(encode_chunk, chunks())
+        return
+
+    from multiprocessing import Pool
+
+    with Pool(workers) as pool:
+        # Keep a bounded number of chunks in flight
+        pending: Deque["AsyncResult"] = deque()
+        for chunk in chunks():
+            pending.append(pool.apply_async(encode_chunk, (chunk, )))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _encode_chunk(
+    normalizer: Normalizer,
+    chunk: Tuple[int, List[str]],
+) -> Tuple[List[str], Postings]:
+    """Normalizes a chunk of messages, possibly in a worker process.
+
+    Args:
+        normalizer: `Normalizer` used to tokenize the messages
+        chunk: Tuple of the form (F, C), where — F is the document id of the first message and C is the list of message bodies
+
+    Returns:
+        A tuple of the form (K, P), where — K is the list of keywords in the chunk, in order of first appearance, and P are the posting lists of the chunk. Keyword ids in P are indices into K.
+    """
+
+    first_doc_id, contents = chunk
+    keyword_ids = Vocabulary()
+    postings: Postings = {}
+    for doc_id, tokens in enumerate(normalizer.normalize_many(contents),
+                                    first_doc_id):
+        for keyword_id in keyword_ids.add_all(sorted(tokens)):
+            if keyword_id in postings:
+                postings[keyword_id].append(doc_id)
+            else:
+                postings[keyword_id] = array(ID_TYPECODE, (doc_id, ))
+    return list(keyword_ids), postings
@@ -0,0 +1,82 @@
+import json
+import mmap
+import os
+from typing import Iterable, Iterator, Union
+
+from .types import Event
+
+MESSAGE_TYPE = b'"m.room.message"'
+BODY_KEY = b'"body"'
+
+
+def read_ndjson(path: Union[str, os.PathLike]) -> Iterator[Event]:
+    """Reads message events from a room export in newline-delimited JSON, i.e. one event per line.
+
+    The file is memory-mapped instead of read into memory. Lines that can't be message events with a body, because they don't contain the strings `"m.room.message"` and `"body"`, are skipped without being decoded. Only the event id and body of each message are kept.
+
+    Args:
+        path: Path of the NDJSON file
+
+    Returns:
+        An iterator over minimal "m.room.message" events, that can be passed to `EncryptedIndex` as they're read.
+
+    Raises:
+        json.JSONDecodeError: If a line that passes the filter isn't valid JSON.
+
+    Examples:
+        >>> encrypted_index = EncryptedIndex(read_ndjson("room-export.ndjson"))
+    """
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for line in iter(data.readline, b""):
+                # Filter out lines before decoding them
+                if MESSAGE_TYPE not in line or BODY_KEY not in line:
+                    continue
+
+                event = json.loads(line)
+                content = event.get("content")
+                if event.get("type") == "m.room.message" \
+                        and isinstance(content, dict) \
+                        and "body" in content:
+                    yield {
+                        "type": "m.room.message",
+                        "event_id": event["event_id"],
+                        "content": {
+                            "body": content["body"]
+                        },
+                    }
+
+
+def stale_event_ids(events: Iterable[Event]) -> Iterator[str]:
+    """Finds the ids of indexed messages that newer events make stale, i.e. that should be deleted from the index.
+
+    Redactions make their target stale, as do edits, i.e. "m.replace" relations, whose new body is indexed as a message of its own.
+
+    Args:
+        events: Iterable of Matrix room events
+
+    Returns:
+        An iterator over the ids of redacted and edited events, that can be passed to `EncryptedIndex.delete_events`.
+
+    Examples:
+        >>> encrypted_index.delete_events(stale_event_ids(new_events))
+    """
+
+    for event in events:
+        content = event.get("content")
+        if not isinstance(content, dict):
+            continue
+        if event.get("type") == "m.room.redaction":
+            # Room versions 11+ move `redacts` into the content
+            redacts = event.get("redacts", content.get("redacts"))
+            if isinstance(redacts, str):
+                yield redacts
+        else:
+            relation = content.get("m.relates_to")
+            if isinstance(relation, dict) \
+                    and relation.get("rel_type") == "m.replace" \
+                    and isinstance(relation.get("event_id"), str):
+                yield relation["event_id"]
@@ -1,9 +1,11 @@
 from collections import defaultdict
-from typing import Callable, Dict, Iterable, List, Set, Tuple
+from typing import Callable, Dict, Iterable, List, Set, Tuple, Union
 
 from encrypted_search.index import EncryptedIndex
 from encrypted_search.models.location import Location
+from encrypted_search.models.tombstones import Tombstones
 from encrypted_search.types import Bucket, FileData, InvertedIndex, LookupTable
+from encrypted_search.utils.codecs import JSON_CODEC, Codec, decode_file
 
 
 class IndexMerge:
@@ -15,6 +17,10 @@ class IndexMerge:
     Keyword Args:
         s: Int parameter that determines the space/read efficiency tradeoff
         L: Int parameter that determines the locality
+        stats: `BuildStats` to be filled with measurements of the distribution of the merged index
+        rng: Source of randomness for the placement of chunks of the merged index. Defaults to a `KeyedRandom` seeded from `secrets`
+        codec: `Codec` that fetched files are decoded with, if they're given as bytes. Defaults to JSON
+        tombstones: `Tombstones` of the indices being merged, i.e. deleted event ids to be left out of the merged index
 
     Examples:
         >>> lookup_tables = (lookup_table1, lookup_table2, ...)
@@ -32,10 +38,16 @@ class IndexMerge:
     __inverted_index: InvertedIndex
     __keywords: Set[str]
     __lookup_tables: Iterable[LookupTable]
+    __codec: Codec
+    __tombstones: List[Tombstones]
     __remaining_keywords: Set[str]
 
     def __init__(self, lookup_tables: Iterable[LookupTable], **kwargs):
         self.__lookup_tables = lookup_tables
+        self.__codec = kwargs.get('codec') or JSON_CODEC
+        self.__tombstones = [
+            t for t in kwargs.get('tombstones', ()) if len(t) > 0
+        ]
 
         # Extract a common set of keywords
         self.__keywords = set.union(*(set(lt.keys()) for lt in lookup_tables))
@@ -44,10 +56,14 @@ class IndexMerge:
         self.__inverted_index = {keyword: set() for keyword in self.__keywords}
         self.encrypted_index = EncryptedIndex([],
                                               s=kwargs.get('s', 2),
-                                              L=kwargs.get('L', 1))
+                                              L=kwargs.get('L', 1),
+                                              stats=kwargs.get('stats'),
+                                              rng=kwargs.get('rng'))
         self.encrypted_index.keywords = self.__keywords
 
-    def __next__(self) -> Tuple[Set[str], Callable[[str, FileData], None]]:
+    def __next__(
+        self
+    ) -> Tuple[Set[str], Callable[[str, Union[FileData, bytes]], None]]:
         """Provides the next set of MXC URIs to fetch in order to merge indices.
 
         Returns:
@@ -68,14 +84,16 @@ class IndexMerge:
                 locations[location.mxc_uri].append(location)
 
         # Callback to be called after data is fetched from the homeserver.
-        def callback(mxc_uri: str, file_data: FileData):
+        def callback(mxc_uri: str, file_data: Union[FileData, bytes]):
             """Callback to update merged index with data fetched from `mxc_uri`.
 
             Args:
                 mxc_uri: URI which was fetched from.
-                file_data: Bucket/Level-like object found at the URI.
+                file_data: Bucket/Level-like object found at the URI, either as bytes or decoded.
             """
 
+            file_data = decode_file(file_data, self.__codec)
+
             # Get all locations associated with current uri
             current_locations = locations[mxc_uri]
 
@@ -83,7 +101,7 @@ class IndexMerge:
             for loc in current_locations:
                 # Extract a bucket from the fetched data
                 bucket: Bucket
-                if hasattr(loc, "bucket_index"):
+                if loc.bucket_index is not None:
                     bucket = file_data[loc.bucket_index]
                 else:
                     bucket = file_data
@@ -92,8 +110,11 @@ class IndexMerge:
                 chunk = bucket[loc.start_of_chunk:loc.start_of_chunk +
                                loc.chunk_length]
 
-                # Add the doc ids in the chunk to the inverted index
-                self.__inverted_index[keyword] |= set(chunk)
+                # Add the live doc ids in the chunk to the inverted index
+                doc_ids = set(chunk)
+                for tombstones in self.__tombstones:
+                    doc_ids = tombstones.filter(doc_ids)
+                self.__inverted_index[keyword] |= doc_ids
 
         return set(locations.keys()), callback
 
@@ -110,8 +131,14 @@ class IndexMerge:
         return self
 
     def distribute_new_index(self):
-        """Converts merged inverted index into encrypted index."""
+        """Converts merged inverted index into encrypted index.
+
+        Keywords whose documents were all deleted are left out.
+        """
 
+        for keyword in [k for k, v in self.__inverted_index.items() if not v]:
+            del self.__inverted_index[keyword]
+            self.encrypted_index.keywords.discard(keyword)
         self.encrypted_index._EncryptedIndex__levels = self.encrypted_index.calc_params(
             self.__inverted_index)
         self.encrypted_index.distribute(self.__inverted_index)
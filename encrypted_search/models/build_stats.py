@@ -0,0 +1,102 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, DefaultDict, Dict, Iterable, Iterator, Optional
+
+from ..types import Event
+
+
+class BuildStats:
+    """Measurements of an `EncryptedIndex` build, collected only when an instance is passed to the index.
+
+    Parsing and inverting happen in a single streaming pass, so they are measured together as the "parse" phase.
+
+    Args:
+        on_phase: Callback called with the name of each phase and these stats, when the phase ends
+
+    Attributes:
+        seconds: Wall time of each phase, i.e. "parse", "calc_params" and "distribute"
+        events: Number of events consumed
+        documents: Number of messages indexed
+        keywords: Number of distinct keywords
+        tokens: Number of (keyword, document) pairs, i.e. the size of the index
+        posting_list_lengths: Histogram of posting list lengths, keyed by the smallest power of two that is at least the length
+        chunks: Number of chunks placed on each level
+        candidate_buckets: Number of buckets with enough capacity considered for the chunks of each level
+        level_fill: Fraction of the capacity of each level that is filled
+    """
+
+    seconds: Dict[str, float]
+    events: int
+    documents: int
+    keywords: int
+    tokens: int
+    posting_list_lengths: DefaultDict[int, int]
+    chunks: DefaultDict[int, int]
+    candidate_buckets: DefaultDict[int, int]
+    level_fill: Dict[int, float]
+
+    def __init__(
+        self,
+        on_phase: Optional[Callable[[str, "BuildStats"], None]] = None,
+    ):
+        self.on_phase = on_phase
+
+        self.seconds = {}
+        self.events = 0
+        self.documents = 0
+        self.keywords = 0
+        self.tokens = 0
+        self.posting_list_lengths = defaultdict(int)
+        self.chunks = defaultdict(int)
+        self.candidate_buckets = defaultdict(int)
+        self.level_fill = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measures the wall time of a phase and reports its end to `on_phase`.
+
+        Args:
+            name: Name of the phase
+        """
+
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        self.seconds[name] = self.seconds.get(name, 0) + elapsed
+        if self.on_phase is not None:
+            self.on_phase(name, self)
+
+    def count_events(self, events: Iterable[Event]) -> Iterator[Event]:
+        """Passes events through, counting them.
+
+        Args:
+            events: Matrix room events
+
+        Returns:
+            An iterator over the same events.
+        """
+
+        for event in events:
+            self.events += 1
+            yield event
+
+    def to_json(self) -> Dict[str, Any]:
+        """Serializes the stats into a JSON.
+
+        Returns:
+            Serialized data in the form of a `dict`.
+        """
+
+        return {
+            "seconds": self.seconds,
+            "events": self.events,
+            "documents": self.documents,
+            "keywords": self.keywords,
+            "tokens": self.tokens,
+            "posting_list_lengths":
+            dict(sorted(self.posting_list_lengths.items())),
+            "chunks": dict(sorted(self.chunks.items())),
+            "candidate_buckets": dict(sorted(self.candidate_buckets.items())),
+            "level_fill": dict(sorted(self.level_fill.items())),
+        }
@@ -0,0 +1,120 @@
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Tuple, Union, overload
+
+from .string_table import OFFSET_TYPECODE, StringTable
+from .vocabulary import ID_TYPECODE
+
+
+def compact_slots(
+    slots: array,
+    slot_size: int,
+    lengths: List[int],
+) -> Tuple[array, array]:
+    """Compacts a level that was filled in fixed-size slots, one per bucket.
+
+    Args:
+        slots: Document ordinals, with bucket `b` starting at `b * slot_size`
+        slot_size: Capacity of the largest bucket
+        lengths: Number of ordinals in each bucket
+
+    Returns:
+        A tuple of the form (O, B), where — O are the ordinals of all buckets, concatenated, and B are the offsets of the buckets in O, followed by the total length.
+    """
+
+    ordinals = array(ID_TYPECODE)
+    offsets = array(OFFSET_TYPECODE, [0])
+    for b, length in enumerate(lengths):
+        start = b * slot_size
+        ordinals += slots[start:start + length]
+        offsets.append(len(ordinals))
+    return ordinals, offsets
+
+
+class CompactLevel(Sequence):
+    """A level of the datastore, stored as one flat array of document ordinals and an array of bucket offsets into it.
+
+    The buckets of a level are laid out one after another, so bucket `b` holds `ordinals[offsets[b]:offsets[b + 1]]`, and ordinals index a `StringTable` of event ids that is shared by all levels. Unfilled capacity isn't stored. Reading a bucket translates its ordinals back into event ids, so the level behaves like the `List[List[str]]` it replaces.
+
+    Args:
+        ordinals: Document ordinals of all buckets, concatenated
+        offsets: Start of each bucket in `ordinals`, followed by the total length
+        documents: Event ids, indexed by ordinal
+    """
+
+    ordinals: array
+    offsets: array
+    documents: StringTable
+
+    def __init__(self, ordinals: array, offsets: array,
+                 documents: StringTable):
+        self.ordinals = ordinals
+        self.offsets = offsets
+        self.documents = documents
+
+    def bucket_length(self, b: int) -> int:
+        """Returns the number of documents in a bucket, without reading it."""
+
+        return self.offsets[b + 1] - self.offsets[b]
+
+    def extend_buckets(self, chunks: Dict[int, array]) -> None:
+        """Appends document ordinals to the end of some buckets.
+
+        Args:
+            chunks: Mapping from bucket indices to the ordinals to be appended to each bucket
+        """
+
+        ordinals = array(ID_TYPECODE)
+        offsets = array(OFFSET_TYPECODE, [0])
+        for b in range(len(self)):
+            ordinals += self.ordinals[self.offsets[b]:self.offsets[b + 1]]
+            if b in chunks:
+                ordinals += chunks[b]
+            offsets.append(len(ordinals))
+        self.ordinals, self.offsets = ordinals, offsets
+
+    def tolist(self) -> List[List[str]]:
+        """Converts the level into lists of event ids, e.g. to be serialized."""
+
+        return [self[b] for b in range(len(self))]
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes taken by the ordinals and offsets, not counting the shared string table."""
+
+        return (self.ordinals.itemsize * len(self.ordinals) +
+                self.offsets.itemsize * len(self.offsets))
+
+    @overload
+    def __getitem__(self, b: int) -> List[str]:
+        ...
+
+    @overload
+    def __getitem__(self, b: slice) -> List[List[str]]:
+        ...
+
+    def __getitem__(
+        self,
+        b: Union[int, slice],
+    ) -> Union[List[str], List[List[str]]]:
+        if isinstance(b, slice):
+            return [self[i] for i in range(*b.indices(len(self)))]
+        if b < 0:
+            b += len(self)
+        if not 0 <= b < len(self):
+            raise IndexError("Level index out of range")
+        start, end = self.offsets[b], self.offsets[b + 1]
+        return self.documents.lookup(self.ordinals[start:end])
+
+    def __iter__(self) -> Iterator[List[str]]:
+        for b in range(len(self)):
+            yield self[b]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (CompactLevel, list)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
@@ -0,0 +1,35 @@
+from typing import Dict, Set
+
+
+class IndexUpdate:
+    """Parts of an `EncryptedIndex` changed by adding events to it or deleting them, i.e. what has to be uploaded again.
+
+    Attributes:
+        buckets: Mapping from level indices to the indices of the buckets that changed on each level
+        keywords: Keywords whose locations in the lookup table changed
+        documents: Number of messages added
+        postings: Number of (keyword, document) pairs added
+        deleted: Number of messages deleted
+    """
+
+    buckets: Dict[int, Set[int]]
+    keywords: Set[str]
+    documents: int
+    postings: int
+    deleted: int
+
+    def __init__(self):
+        self.buckets = {}
+        self.keywords = set()
+        self.documents = 0
+        self.postings = 0
+        self.deleted = 0
+
+    @property
+    def levels(self) -> Set[int]:
+        """Indices of the levels that changed."""
+
+        return set(self.buckets)
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords or self.deleted)
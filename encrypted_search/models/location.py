@@ -1,63 +1,83 @@
-from typing import Any, Dict, Optional
+import struct
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union, overload
 
 from ..exceptions import LocationFormatError
+from .vocabulary import Vocabulary
+
+# Packed record of a location: kind, level index or MXC URI id, bucket index, start and length of the chunk
+RECORD = struct.Struct("<BIiII")
+LOCAL, REMOTE = 0, 1  # Kinds of packed locations
+NO_BUCKET = -1  # Bucket index of packed locations that lead to a bucket, not a level
 
 
 class Location:
     """Common model for the two types of location data that can be stored in the `lookup_table` of an `EncryptedIndex`.
 
-    Attributes:
+    Lookup tables hold millions of locations, so every location has the same fixed set of slots. Data that a type of location doesn't have is `None`.
+
+    Args:
+        is_remote: Whether the location refers to a remote file
+
+    Keyword Args:
         mxc_uri: [if remote datastore] URI of the Matrix Content Repository file where the level or bucket is stored
         level_index: [if local datastore] Index of the level being located
         bucket_index: If the above data leads to a level, the index of the bucket being located
         start_of_chunk: Starting index of the chunk being located
         chunk_length: Length of the chunk being located
+
+    Attributes:
+        is_remote: Whether the location refers to a remote file
+        mxc_uri: [if remote datastore] URI of the Matrix Content Repository file where the level or bucket is stored, otherwise `None`
+        level_index: [if local datastore] Index of the level being located, otherwise `None`
+        bucket_index: If the above data leads to a level, the index of the bucket being located, otherwise `None`
+        start_of_chunk: Starting index of the chunk being located
+        chunk_length: Length of the chunk being located
+
+    Raises:
+        LocationFormatError:
+            To locate a remote datastore an MXC URI is necessary. To locate a local datastore, both level index and bucket index are necessary.
     """
 
+    __slots__ = ("is_remote", "mxc_uri", "level_index", "bucket_index",
+                 "start_of_chunk", "chunk_length")
+
     is_remote: bool
-    level_index: Optional[int]
     mxc_uri: Optional[str]
+    level_index: Optional[int]
     bucket_index: Optional[int]
     start_of_chunk: int
     chunk_length: int
 
-    def __init__(self, is_remote: bool, **kwargs):
-        """Common model for the two types of location data that can be stored in the `lookup_table` of an `EncryptedIndex`.
-
-        Args:
-            is_remote: Whether the location refers to a remote file
-
-        Keyword Args:
-            mxc_uri: [if remote datastore] URI of the Matrix Content Repository file where the level or bucket is stored
-            level_index: [if local datastore] Index of the level being located
-            bucket_index: If the above data leads to a level, the index of the bucket being located
-            start_of_chunk: Starting index of the chunk being located
-            chunk_length: Length of the chunk being located
-
-        Raises:
-            LocationFormatError:
-                To locate a remote datastore an MXC URI is necessary. To locate a local datastore, both level index and bucket index are necessary.
-        """
-
+    def __init__(
+        self,
+        is_remote: bool,
+        *,
+        mxc_uri: Optional[str] = None,
+        level_index: Optional[int] = None,
+        bucket_index: Optional[int] = None,
+        start_of_chunk: int,
+        chunk_length: int,
+    ):
         if is_remote:
-            self.mxc_uri = kwargs.get("mxc_uri")
-            if self.mxc_uri is None:
+            if mxc_uri is None:
                 raise LocationFormatError(
                     "Matrix Content Repository URI not provided for remote datastore location"
                 )
+            level_index = None
         else:
-            self.level_index = kwargs.get("level_index")
-            if self.level_index is None:
+            if level_index is None:
                 raise LocationFormatError(
                     "Level or bucket index not provided for local datastore location"
                 )
-
-        if "bucket_index" in kwargs and kwargs["bucket_index"] is not None:
-            self.bucket_index = int(kwargs["bucket_index"])
+            mxc_uri = None
 
         self.is_remote = is_remote
-        self.start_of_chunk = int(kwargs["start_of_chunk"])
-        self.chunk_length = int(kwargs["chunk_length"])
+        self.mxc_uri = mxc_uri
+        self.level_index = level_index
+        self.bucket_index = bucket_index
+        self.start_of_chunk = start_of_chunk
+        self.chunk_length = chunk_length
 
     @classmethod
     def from_json(cls, json: Dict[str, Any]) -> "Location":
@@ -70,13 +90,14 @@ class Location:
             Deserialized `Location` object.
         """
 
+        bucket_index = json.get("bucket_index")
         return cls(
             is_remote="mxc_uri" in json,
             mxc_uri=json.get("mxc_uri"),
             level_index=json.get("level_index"),
-            bucket_index=json.get("bucket_index"),
-            start_of_chunk=json.get("start_of_chunk"),
-            chunk_length=json.get("chunk_length"),
+            bucket_index=None if bucket_index is None else int(bucket_index),
+            start_of_chunk=int(json["start_of_chunk"]),
+            chunk_length=int(json["chunk_length"]),
         )
 
     def to_json(self) -> Dict[str, Any]:
@@ -86,35 +107,186 @@ class Location:
             Serialized data in the form of a `dict`.
         """
 
-        serialized = {"is_remote": self.is_remote}
-        optional_attributes = ("mxc_uri", "level_index", "bucket_index",
-                               "start_of_chunk", "chunk_length")
-        for attr in optional_attributes:
-            if hasattr(self, attr):
-                serialized[attr] = getattr(self, attr)
+        serialized: Dict[str, Any] = {"is_remote": self.is_remote}
+        if self.is_remote:
+            serialized["mxc_uri"] = self.mxc_uri
+        else:
+            serialized["level_index"] = self.level_index
+        if self.bucket_index is not None:
+            serialized["bucket_index"] = self.bucket_index
+        serialized["start_of_chunk"] = self.start_of_chunk
+        serialized["chunk_length"] = self.chunk_length
         return serialized
 
+    def pack(self, mxc_uris: Vocabulary) -> bytes:
+        """Encodes the location as a fixed-width record of `RECORD.size` bytes.
+
+        Args:
+            mxc_uris: Vocabulary that the MXC URI of a remote location is added to, and referred to by its id
+
+        Returns:
+            The packed record.
+        """
+
+        if self.is_remote:
+            kind, index = REMOTE, mxc_uris.add(self.mxc_uri)
+        else:
+            kind, index = LOCAL, self.level_index
+        bucket_index = self.bucket_index
+        if bucket_index is None:
+            bucket_index = NO_BUCKET
+        return RECORD.pack(kind, index, bucket_index, self.start_of_chunk,
+                           self.chunk_length)
+
+    @classmethod
+    def unpack(cls, record: Tuple[int, int, int, int, int],
+               mxc_uris: Vocabulary) -> "Location":
+        """Decodes a record unpacked with `RECORD`.
+
+        Args:
+            record: Fields of the record
+            mxc_uris: Vocabulary that MXC URI ids refer to
+
+        Returns:
+            Decoded `Location` object.
+        """
+
+        kind, index, bucket_index, start_of_chunk, chunk_length = record
+        is_remote = kind == REMOTE
+        return cls(
+            is_remote,
+            mxc_uri=mxc_uris[index] if is_remote else None,
+            level_index=index,
+            bucket_index=None if bucket_index == NO_BUCKET else bucket_index,
+            start_of_chunk=start_of_chunk,
+            chunk_length=chunk_length,
+        )
+
+    def __astuple(self) -> Tuple[Any, ...]:
+        return (self.is_remote, self.mxc_uri, self.level_index,
+                self.bucket_index, self.start_of_chunk, self.chunk_length)
+
     def __eq__(self, other):
-        return (self.is_remote == other.is_remote
-                and self.level_index == other.level_index
-                and self.mxc_uri == other.mxc_uri
-                and self.bucket_index == other.bucket_index
-                and self.start_of_chunk == other.start_of_chunk
-                and self.chunk_length == other.chunk_length)
+        if not isinstance(other, Location):
+            return NotImplemented
+        return self.__astuple() == other.__astuple()
 
     def __hash__(self):
-        t = (
-            self.is_remote,
-            self.level_index,
-            self.mxc_uri,
-            self.bucket_index,
-            self.start_of_chunk,
-            self.chunk_length,
-        )
-        return hash(t)
+        return hash(self.__astuple())
 
     def __repr__(self):
         if self.is_remote:
-            return f"({self.mxc_uri}, {self.bucket_index if hasattr(self, 'bucket_index') else None}, {self.start_of_chunk}, {self.chunk_length})"
+            return f"({self.mxc_uri}, {self.bucket_index}, {self.start_of_chunk}, {self.chunk_length})"
         else:
             return f"({self.level_index}, {self.bucket_index}, {self.start_of_chunk}, {self.chunk_length})"
+
+
+class PackedLocations(Sequence):
+    """The locations of a keyword, packed into one buffer of fixed-width records.
+
+    A `Location` object costs about a hundred bytes, whereas a packed location costs `RECORD.size` bytes. Remote locations refer to their MXC URI by its id in a vocabulary, which is meant to be shared by all keywords of a lookup table. Reading a location decodes it into a `Location`, so packed locations can stand in for the lists of a lookup table wherever they're only read, e.g. in `EncryptedSearch`.
+
+    Args:
+        locations: Locations to be packed, in order
+        mxc_uris: Vocabulary of the MXC URIs of remote locations. Defaults to a new vocabulary
+
+    Attributes:
+        mxc_uris: Vocabulary of the MXC URIs of remote locations
+    """
+
+    __slots__ = ("mxc_uris", "__data")
+
+    mxc_uris: Vocabulary
+
+    def __init__(
+        self,
+        locations: Iterable[Location] = (),
+        mxc_uris: Optional[Vocabulary] = None,
+    ):
+        self.mxc_uris = Vocabulary() if mxc_uris is None else mxc_uris
+        self.__data = b"".join(
+            location.pack(self.mxc_uris) for location in locations)
+
+    @classmethod
+    def from_bytes(cls, data: bytes,
+                   mxc_uris: Vocabulary) -> "PackedLocations":
+        """Wraps a buffer written by `to_bytes`.
+
+        Args:
+            data: Packed records
+            mxc_uris: Vocabulary that the records were packed with
+
+        Returns:
+            `PackedLocations` object backed by `data`.
+
+        Raises:
+            LocationFormatError: If the length of the buffer isn't a multiple of the record size.
+        """
+
+        if len(data) % RECORD.size != 0:
+            raise LocationFormatError(
+                f"Packed locations must be a multiple of {RECORD.size} bytes")
+        packed = cls(mxc_uris=mxc_uris)
+        packed.__data = bytes(data)
+        return packed
+
+    def to_bytes(self) -> bytes:
+        """Returns the packed records, `RECORD.size` bytes per location."""
+
+        return self.__data
+
+    def tolist(self) -> List[Location]:
+        """Decodes every location."""
+
+        return list(self)
+
+    @overload
+    def __getitem__(self, i: int) -> Location:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[Location]:
+        ...
+
+    def __getitem__(self, i: Union[int,
+                                   slice]) -> Union[Location, List[Location]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Location index out of range")
+        return Location.unpack(
+            RECORD.unpack_from(self.__data, i * RECORD.size), self.mxc_uris)
+
+    def __iter__(self) -> Iterator[Location]:
+        for record in RECORD.iter_unpack(self.__data):
+            yield Location.unpack(record, self.mxc_uris)
+
+    def __len__(self) -> int:
+        return len(self.__data) // RECORD.size
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (PackedLocations, list)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+def pack_lookup_table(
+    lookup_table: Dict[str, List[Location]], ) -> Dict[str, PackedLocations]:
+    """Packs the locations of every keyword of a lookup table, with one shared vocabulary of MXC URIs.
+
+    Args:
+        lookup_table: Map from keywords to their locations
+
+    Returns:
+        Map from keywords to their packed locations.
+    """
+
+    mxc_uris = Vocabulary()
+    return {
+        keyword: PackedLocations(locations, mxc_uris)
+        for keyword, locations in lookup_table.items()
+    }
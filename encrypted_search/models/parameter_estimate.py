@@ -0,0 +1,70 @@
+from typing import Any, Dict
+
+
+class ParameterEstimate:
+    """Expected costs of an index built and stored with one setting of s, L and cutoff_size, as evaluated by `ParameterAdvisor`.
+
+    Args:
+        s: Int parameter that determines the space/read efficiency tradeoff
+        L: Int parameter that determines the locality
+        cutoff_size: File size limit of `IndexStorage`, in bytes
+
+    Attributes:
+        s: Int parameter that determines the space/read efficiency tradeoff
+        L: Int parameter that determines the locality
+        cutoff_size: File size limit of `IndexStorage`, in bytes
+        levels: Number of populated levels
+        files: Number of files the index is stored in
+        storage: Total size of the files, in bytes
+        files_per_query: Mean number of files fetched per query
+        max_files_per_query: Largest number of files fetched by a single query
+        bytes_per_query: Mean number of bytes downloaded per query
+        build_seconds: Wall time of parsing the events, if the advisor was given them, and placing the posting lists into the datastore
+    """
+
+    s: int
+    L: int
+    cutoff_size: int
+    levels: int
+    files: int
+    storage: int
+    files_per_query: float
+    max_files_per_query: int
+    bytes_per_query: float
+    build_seconds: float
+
+    def __init__(self, s: int, L: int, cutoff_size: int):
+        self.s = s
+        self.L = L
+        self.cutoff_size = cutoff_size
+        self.levels = 0
+        self.files = 0
+        self.storage = 0
+        self.files_per_query = 0.0
+        self.max_files_per_query = 0
+        self.bytes_per_query = 0.0
+        self.build_seconds = 0.0
+
+    def to_json(self) -> Dict[str, Any]:
+        """Serializes the estimate into a JSON.
+
+        Returns:
+            Serialized data in the form of a `dict`.
+        """
+
+        return {
+            "s": self.s,
+            "L": self.L,
+            "cutoff_size": self.cutoff_size,
+            "levels": self.levels,
+            "files": self.files,
+            "storage": self.storage,
+            "files_per_query": self.files_per_query,
+            "max_files_per_query": self.max_files_per_query,
+            "bytes_per_query": self.bytes_per_query,
+            "build_seconds": self.build_seconds,
+        }
+
+    def __repr__(self) -> str:
+        return (f"ParameterEstimate(s={self.s}, L={self.L}, "
+                f"cutoff_size={self.cutoff_size})")
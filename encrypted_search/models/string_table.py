@@ -0,0 +1,103 @@
+import json
+import re
+from array import array
+from itertools import accumulate
+from typing import Iterable, Iterator, List
+
+# Typecode of the arrays that store byte offsets, i.e. unsigned 64-bit ints
+OFFSET_TYPECODE = "Q"
+# Bytes that `json.dumps` escapes: quotes, backslashes and anything but printable ASCII
+_NEEDS_ESCAPE = re.compile(rb'[\x00-\x1f"\\\x7f-\xff]')
+
+
+class StringTable:
+    """Append-only table of strings, stored as one UTF-8 blob and an array of offsets into it.
+
+    A list of strings costs a pointer and a full object header per string, whereas this costs the encoded bytes and one offset. Strings are decoded whenever they're read.
+
+    Args:
+        strings: Strings to be stored, in order; the position of a string is its ordinal
+    """
+
+    __data: bytearray
+    __offsets: array
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.__data = bytearray()
+        self.__offsets = array(OFFSET_TYPECODE, [0])
+        self.extend(strings)
+
+    def extend(self, strings: Iterable[str]) -> None:
+        """Appends strings to the table.
+
+        Args:
+            strings: Strings to be appended, in order
+        """
+
+        encoded = [string.encode() for string in strings]
+        self.__data += b"".join(encoded)
+        ends = accumulate(map(len, encoded), initial=self.__offsets[-1])
+        next(ends)  # Skip the current end of the blob
+        self.__offsets.extend(ends)
+
+    def lookup(self, ordinals: Iterable[int]) -> List[str]:
+        """Translates ordinals into strings.
+
+        Args:
+            ordinals: Positions of strings in the table
+
+        Returns:
+            List of the strings, in the same order as `ordinals`.
+        """
+
+        data, offsets = self.__data, self.__offsets
+        return [
+            data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in ordinals
+        ]
+
+    def byte_sizes(self, ordinals: Iterable[int]) -> List[int]:
+        """Returns the UTF-8 sizes of some strings, read off the offsets without decoding them.
+
+        Args:
+            ordinals: Positions of strings in the table
+
+        Returns:
+            List of the sizes, in the same order as `ordinals`.
+        """
+
+        offsets = self.__offsets
+        return [offsets[i + 1] - offsets[i] for i in ordinals]
+
+    def json_sizes(self) -> array:
+        """Returns the length of each string once serialized as a JSON string, e.g. to size files without serializing them.
+
+        Strings of printable ASCII without quotes or backslashes, like event ids, take two quotes more than their bytes, so their sizes are read off the offsets. Otherwise every string is serialized.
+        """
+
+        if _NEEDS_ESCAPE.search(self.__data) is None:
+            offsets = self.__offsets
+            return array(OFFSET_TYPECODE,
+                         (end - start + 2
+                          for start, end in zip(offsets, offsets[1:])))
+        return array(OFFSET_TYPECODE,
+                     (len(json.dumps(string)) for string in self))
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes taken by the blob and the offsets."""
+
+        return len(self.__data) + self.__offsets.itemsize * len(self.__offsets)
+
+    def __getitem__(self, ordinal: int) -> str:
+        if ordinal < 0:
+            ordinal += len(self)
+        if not 0 <= ordinal < len(self):
+            raise IndexError("String table index out of range")
+        start, end = self.__offsets[ordinal], self.__offsets[ordinal + 1]
+        return self.__data[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for ordinal in range(len(self)):
+            yield self[ordinal]
+
+    def __len__(self) -> int:
+        return len(self.__offsets) - 1
@@ -0,0 +1,93 @@
+import hashlib
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Set
+
+# Typecode of the arrays that store hashes, i.e. unsigned 64-bit ints
+HASH_TYPECODE = "Q"
+
+
+def _hash(event_id: str) -> int:
+    digest = hashlib.blake2b(event_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class Tombstones:
+    """Compact set of deleted event ids, that searches filter their results against.
+
+    Event ids are stored as a sorted array of 64-bit BLAKE2b hashes, i.e. 8 bytes per id, and looked up by bisection. A live event id is mistaken for a deleted one only if their hashes collide, which is negligibly likely.
+
+    Args:
+        event_ids: Deleted event ids
+    """
+
+    __hashes: array
+
+    def __init__(self, event_ids: Iterable[str] = ()):
+        self.__hashes = array(HASH_TYPECODE, sorted(set(map(_hash,
+                                                            event_ids))))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Tombstones":
+        """Deserializes tombstones written by `to_bytes`.
+
+        Args:
+            data: Serialized tombstones
+
+        Returns:
+            Deserialized `Tombstones` object.
+        """
+
+        tombstones = cls()
+        tombstones.__hashes = array(HASH_TYPECODE, data)
+        if sys.byteorder == "little":
+            tombstones.__hashes.byteswap()
+        return tombstones
+
+    def to_bytes(self) -> bytes:
+        """Serializes the tombstones as big-endian 64-bit hashes, e.g. to be uploaded next to the lookup table.
+
+        Returns:
+            Serialized tombstones, 8 bytes per event id.
+        """
+
+        hashes = array(HASH_TYPECODE, self.__hashes)
+        if sys.byteorder == "little":
+            hashes.byteswap()
+        return hashes.tobytes()
+
+    def add(self, event_ids: Iterable[str]) -> None:
+        """Adds deleted event ids.
+
+        Args:
+            event_ids: Deleted event ids
+        """
+
+        hashes = set(self.__hashes)
+        hashes.update(map(_hash, event_ids))
+        self.__hashes = array(HASH_TYPECODE, sorted(hashes))
+
+    def filter(self, event_ids: Iterable[str]) -> Set[str]:
+        """Drops deleted event ids.
+
+        Args:
+            event_ids: Event ids, e.g. results of a search
+
+        Returns:
+            Set of the event ids that aren't deleted.
+        """
+
+        if not self.__hashes:
+            return set(event_ids)
+        return {event_id for event_id in event_ids if event_id not in self}
+
+    def __contains__(self, event_id: object) -> bool:
+        if not isinstance(event_id, str):
+            return False
+        h = _hash(event_id)
+        i = bisect_left(self.__hashes, h)
+        return i < len(self.__hashes) and self.__hashes[i] == h
+
+    def __len__(self) -> int:
+        return len(self.__hashes)
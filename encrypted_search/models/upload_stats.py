@@ -0,0 +1,59 @@
+from typing import Any, Dict, List
+
+
+class UploadStats:
+    """Measurements of the uploads of an `IndexStorage`, as returned by `upload_all`.
+
+    Attributes:
+        files: Number of files uploaded
+        bytes: Total size of the files uploaded, in bytes. Files that aren't uploaded as bytes are counted by their JSON size
+        retries: Number of failed attempts that were retried
+        seconds: Wall time of all uploads
+        latencies: Time taken to upload each file, including retries, in seconds, in the order that uploads finished
+    """
+
+    files: int
+    bytes: int
+    retries: int
+    seconds: float
+    latencies: List[float]
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.retries = 0
+        self.seconds = 0.0
+        self.latencies = []
+
+    @property
+    def files_per_second(self) -> float:
+        """Throughput of the uploads, in files per second."""
+
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Throughput of the uploads, in bytes per second."""
+
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def to_json(self) -> Dict[str, Any]:
+        """Serializes the stats into a JSON.
+
+        Returns:
+            Serialized data in the form of a `dict`.
+        """
+
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "seconds": self.seconds,
+            "files_per_second": self.files_per_second,
+            "bytes_per_second": self.bytes_per_second,
+            "latencies": self.latencies,
+        }
+
+    def __repr__(self) -> str:
+        return (f"UploadStats(files={self.files}, bytes={self.bytes}, "
+                f"seconds={self.seconds:.3f})")
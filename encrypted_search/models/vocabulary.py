@@ -0,0 +1,91 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List
+
+# Typecode of the arrays that store ids, i.e. unsigned 32-bit ints
+ID_TYPECODE = "I"
+
+
+class Vocabulary:
+    """Two-way mapping between strings and dense integer ids.
+
+    Ids are assigned in order of first appearance, starting from zero. During an index build keywords and event ids are stored only once, here, and referred to by their ids everywhere else.
+
+    Args:
+        terms: Strings to be added to the vocabulary, in order
+    """
+
+    __ids: Dict[str, int]
+    __terms: List[str]
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self.__ids = {}
+        self.__terms = []
+        for term in terms:
+            self.add(term)
+
+    def add(self, term: str) -> int:
+        """Adds a string to the vocabulary, if it isn't present already.
+
+        Args:
+            term: String to be added
+
+        Returns:
+            Id of the string.
+        """
+
+        term_id = self.__ids.get(term)
+        if term_id is None:
+            term_id = self.__ids[term] = len(self.__terms)
+            self.__terms.append(term)
+        return term_id
+
+    def add_all(self, terms: Iterable[str]) -> array:
+        """Adds several strings to the vocabulary.
+
+        Args:
+            terms: Strings to be added, in order
+
+        Returns:
+            Array of the ids of the strings, in the same order as `terms`.
+        """
+
+        return array(ID_TYPECODE, map(self.add, terms))
+
+    def id_of(self, term: str) -> int:
+        """Finds the id of a string.
+
+        Args:
+            term: String present in the vocabulary
+
+        Returns:
+            Id of the string.
+
+        Raises:
+            KeyError: If the string isn't present in the vocabulary.
+        """
+
+        return self.__ids[term]
+
+    def lookup(self, term_ids: Iterable[int]) -> List[str]:
+        """Translates ids back into strings.
+
+        Args:
+            term_ids: Ids present in the vocabulary
+
+        Returns:
+            List of the strings, in the same order as `term_ids`.
+        """
+
+        return [self.__terms[term_id] for term_id in term_ids]
+
+    def __getitem__(self, term_id: int) -> str:
+        return self.__terms[term_id]
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.__ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__terms)
+
+    def __len__(self) -> int:
+        return len(self.__terms)
@@ -1,9 +1,11 @@
 from collections import defaultdict
-from typing import Dict, Iterable, List, Set, cast
+from typing import Dict, Iterable, List, Optional, Set, cast
 
 from .models.location import Location
+from .models.tombstones import Tombstones
 from .types import Bucket, FetchedFiles, Level, LookupTable
-from .utils.normalizer import normalize_surface
+from .utils.codecs import JSON_CODEC, Codec, decode_file
+from .utils.normalizer import Normalizer, get_default_normalizer
 
 
 class EncryptedSearch:
@@ -16,10 +18,14 @@ class EncryptedSearch:
 
     Args:
         lookup_tables: Tuple of lookup tables that define the scope of the search
+        normalizer: `Normalizer` used to tokenize queries. Defaults to a shared English normalizer
+        tombstones: `Tombstones` of the indices in the scope, i.e. deleted event ids to be dropped from results
+        codec: `Codec` that fetched files are decoded with, if they're given as bytes. Defaults to JSON
 
     Examples:
         >>> lookup_tables = (lookup_table1, lookup_table2, ...)
-        >>> search = EncryptedSearch(lookup_tables)
+        >>> tombstones = (Tombstones.from_bytes(data1), Tombstones.from_bytes(data2), ...)
+        >>> search = EncryptedSearch(lookup_tables, tombstones=tombstones)
         >>> lookup_results = search.lookup("search query here")
         >>> fetched_files = {uri: your_fetch_method(uri) for uri in lookup_results}
         >>> event_ids = search.locate(fetched_files)
@@ -27,9 +33,21 @@ class EncryptedSearch:
 
     __locations: Dict[str, Dict[str, List[Location]]]
     __lookup_tables: Iterable[LookupTable]
-
-    def __init__(self, lookup_tables: Iterable[LookupTable]):
+    __normalizer: Normalizer
+    __tombstones: List[Tombstones]
+    __codec: Codec
+
+    def __init__(
+        self,
+        lookup_tables: Iterable[LookupTable],
+        normalizer: Optional[Normalizer] = None,
+        tombstones: Iterable[Tombstones] = (),
+        codec: Optional[Codec] = None,
+    ):
         self.__lookup_tables = lookup_tables
+        self.__normalizer = normalizer or get_default_normalizer()
+        self.__tombstones = [t for t in tombstones if len(t) > 0]
+        self.__codec = JSON_CODEC if codec is None else codec
 
     def lookup(self, query: str) -> Set[str]:
         """Finds relevant locations in all lookup tables and returns significant MXC URIs.
@@ -44,7 +62,7 @@ class EncryptedSearch:
         self.__locations = defaultdict(lambda: defaultdict(list))
         locations: LookupTable = defaultdict(list)
         mxc_uris = set()
-        tokens = normalize_surface(query)
+        tokens = self.__normalizer.normalize_surface(query)
 
         # Get locations
         for token in tokens:
@@ -62,12 +80,16 @@ class EncryptedSearch:
         """Finds relevant docs ids within fetched files.
 
         Args:
-            fetched_files: Mapping from MXC URIs to file contents fetched from those URIs.
+            fetched_files: Mapping from MXC URIs to file contents fetched from those URIs, either as bytes or decoded.
 
         Returns:
-            Set of doc ids containing the tokens in the search query.
+            Set of doc ids containing the tokens in the search query, except deleted ones.
         """
 
+        fetched_files = {
+            uri: decode_file(file_data, self.__codec)
+            for uri, file_data in fetched_files.items()
+        }
         doc_ids = []
         for keyword in self.__locations:
             kw_doc_ids = set()
@@ -87,6 +109,7 @@ class EncryptedSearch:
                 doc_ids.append(kw_doc_ids)
         if len(doc_ids) == 0:
             return set()
-        elif len(doc_ids) == 1:
-            return doc_ids[0]
-        return doc_ids[0].intersection(*doc_ids)
+        results = doc_ids[0].intersection(*doc_ids[1:])
+        for tombstones in self.__tombstones:
+            results = tombstones.filter(results)
+        return results
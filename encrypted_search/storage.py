@@ -1,13 +1,37 @@
+import asyncio
 import json
+import re
+import time
 from abc import ABC
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
 from math import ceil
-from typing import IO, Callable, Dict, List, Tuple, Union
+from typing import (
+    IO,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
+from .exceptions import TransientUploadError
 from .index import EncryptedIndex
+from .models.compact_level import CompactLevel
 from .models.location import Location
+from .models.string_table import StringTable
+from .models.upload_stats import UploadStats
 from .types import (
     Bucket,
     Datastore,
+    DatastoreLevel,
     FileData,
     FileIdentifier,
     FilesMap,
@@ -19,14 +43,44 @@ from .types import (
     LookupTable,
     WholeLevelFiles,
 )
+from .utils.codecs import (
+    COMPRESSIONS,
+    JSON_CODEC,
+    BlobCodec,
+    Codec,
+    JsonCodec,
+    compress,
+)
+
+DEFAULT_CONCURRENCY = 8  # Uploads in flight at a time in `upload_all`
+DEFAULT_RETRIES = 3  # Times a failed upload is retried in `upload_all`
+DEFAULT_BACKOFF = 0.5  # Seconds before the first retry in `upload_all`
+# Errors of uploads that `upload_all` retries by default
+TRANSIENT_ERRORS = (TransientUploadError, ConnectionError,
+                    asyncio.TimeoutError)
+FITTING_MARGIN = 0.95  # Share of the estimated limit that files are planned with after a file didn't fit
+FITTING_SHARE = 0.9  # Share of the file size limit over which the estimated encoded size of a file is checked by encoding it
+
+# Strings that `json.dumps` doesn't escape, i.e. printable ASCII without quotes and backslashes
+_PLAIN_STRING = re.compile(r'[ !#-\[\]-~]*')
 
 
 class IndexStorage:
     """A transformer class that exposes methods to store an index as a collection of MXC files.
 
+    Files are sized without serializing them: the size of each bucket is added up from the JSON sizes of its event ids and separators, once, and levels and fractions are sized from their buckets.
+
     Args:
         encrypted_index: A structurally-encrypted searchable index.
         cutoff_size: File size limit, in bytes.
+        verify_sizes: Whether to check every computed size against the size of the actual serialization, e.g. in tests. Slow.
+        streaming: Whether to only plan the files up front, and read and serialize each file when the iterator reaches it. The iterator then provides bytes instead of lists, and keeps no file in memory once it has been provided.
+        codec: `Codec` that files are serialized with, e.g. `BLOB_CODEC`. If given, the iterator provides bytes instead of lists. Defaults to JSON
+        compression: Name of a compressor in `COMPRESSIONS` that files are compressed with after being serialized, e.g. "zlib". If given, the iterator provides bytes instead of lists
+        optimize_layout: Whether to lay files out by where the chunks of every keyword are, so that searches fetch fewer files. Buckets of split levels are grouped by the keywords whose chunks they hold instead of packed in order, wherever that's better, and extra-large buckets are split at the starts of chunks
+        query_profile: Relative frequency with which each keyword is searched for, e.g. counted from past queries, so that the buckets of frequent keywords are grouped first. Defaults to every keyword being equally frequent
+
+    Files are packed so that their size is within the limit once serialized with the codec and compressed. For JSON without compression, sizes are computed from the lengths of the event ids; otherwise, the limit on the JSON size of the files of each level is fitted by sizing the largest files and those estimated to be close to the limit, and a `ValueError` is raised if even a file of one event id is over the limit once encoded. Uncompressed blobs of `CompactLevel`s are sized from their ordinals, and other files by encoding them.
 
     Attributes:
         lookup_table: Map from a keyword to corresponding location in a remote file.
@@ -39,23 +93,75 @@ class IndexStorage:
         >>>     callback(mxc_uri)
         >>> storage.update_lookup_table()
         >>> updated_lookup_table = storage.lookup_table
+
+        >>> storage = IndexStorage(encrypted_index, cutoff_size, streaming=True, codec=BLOB_CODEC)
+        >>> for file_bytes, callback in storage:
+        >>>     callback(your_upload_method(file_bytes))
     """
 
     lookup_table: LookupTable
 
     __cutoff_size: int
+    __level_cutoff_sizes: Dict[int, int]
+    __verify_sizes: bool
+    __bucket_sizes: Dict[int, Tuple[DatastoreLevel, List[int]]]
+    __id_sizes: Optional[Tuple[StringTable, array]]
+    __streaming: bool
+    __codec: Codec
+    __compression: Optional[str]
+    __encodes: bool
     __files: FilesMap
-    __remaining_files: FilesMap
+    __plan: Dict[FileIdentifier, "_FileSpan"]
+    __remaining_files: Dict[FileIdentifier, Union[FileData, "_FileSpan"]]
     __mxc_uris_map: Dict[FileIdentifier, str]
+    __keyword_buckets: Dict[int, List[Tuple[float, List[int]]]]
+    __chunks: Dict[Tuple[int, int], List[Tuple[int, int]]]
+    __layouts: Dict[int, Dict[int, Tuple[int, int]]]
+    __level_fractions: Dict[int, List[int]]
+    __bucket_fractions: Dict[Tuple[int, int], List[int]]
 
-    def __init__(self, encrypted_index: EncryptedIndex, cutoff_size: int):
+    def __init__(
+        self,
+        encrypted_index: EncryptedIndex,
+        cutoff_size: int,
+        verify_sizes: bool = False,
+        streaming: bool = False,
+        codec: Optional[Codec] = None,
+        compression: Optional[str] = None,
+        optimize_layout: bool = False,
+        query_profile: Optional[Mapping[str, float]] = None,
+    ):
         self.lookup_table = encrypted_index.lookup_table
         self.__cutoff_size = cutoff_size
+        self.__level_cutoff_sizes = {}
+        self.__verify_sizes = verify_sizes
+        self.__streaming = streaming
+        self.__codec = JSON_CODEC if codec is None else codec
+        self.__compression = compression
+        self.__encodes = (streaming or codec is not None
+                          or compression is not None)
+        self.__bucket_sizes = {}
+        self.__id_sizes = None
         self.__mxc_uris_map = {}
+        self.__keyword_buckets, self.__chunks = (
+            self.__place_chunks(query_profile) if optimize_layout else
+            ({}, {}))
+        self.__layouts = {}
+
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}, expected "
+                             f"one of {', '.join(COMPRESSIONS)}")
+        if compression is not None or not isinstance(self.__codec, JsonCodec):
+            self.__level_cutoff_sizes = self.__fit_cutoff_sizes(
+                encrypted_index.datastore)
 
         # Get files
         whole_level_files, large_levels = self.__segregate_levels(
             encrypted_index.datastore)
+        if streaming:
+            self.__files = {}
+            self.__plan = self.__plan_files(whole_level_files, large_levels)
+            return
         fractions_of_level_files, large_buckets = self.__split_large_levels(
             large_levels)
         fractions_of_bucket_files = self.__split_large_buckets(large_buckets)
@@ -65,16 +171,22 @@ class IndexStorage:
             **fractions_of_bucket_files
         }
 
-    def __next__(self) -> Tuple[FileData, Callable[[str], None]]:
+    def __next__(self) -> Tuple[Union[FileData, bytes], Callable[[str], None]]:
         """Provides next file to be uploaded.
 
         Returns:
-            A tuple of the form (F, CB), where — F is the next file and CB is a callback function to update after
+            A tuple of the form (F, CB), where — F is the next file, serialized by the codec in streaming mode or if a codec was given, and CB is a callback function to update after
         """
         if not self.__remaining_files:
             raise StopIteration
 
         identifier, data = self.__remaining_files.popitem()
+        if isinstance(data, _FileSpan):
+            data = data.read()
+        elif isinstance(data, CompactLevel):
+            data = data.tolist()
+        if self.__encodes:
+            data = self.__encode(data)
 
         def callback(uri: str):
             self.__mxc_uris_map[identifier] = uri
@@ -89,9 +201,223 @@ class IndexStorage:
         Returns:
             The same object.
         """
-        self.__remaining_files = self.__files.copy()
+        self.__remaining_files = (self.__plan if self.__streaming else
+                                  self.__files).copy()
         return self
 
+    async def upload_all(
+        self,
+        uploader: Callable[[Union[FileData, bytes]], Awaitable[str]],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        transient_errors: Tuple[Type[BaseException], ...] = TRANSIENT_ERRORS,
+    ) -> UploadStats:
+        """Uploads every file, running up to `concurrency` uploads at a time, and records the MXC URI of each file like the callbacks of the iterator do.
+
+        A file is read, and serialized if the iterator would, only when an upload slot is free, so at most `concurrency` files are held at a time. Uploads that fail with a transient error are retried after an exponentially growing delay. URIs are recorded from the event loop's thread, so no locking is needed.
+
+        Args:
+            uploader: Coroutine function that uploads a file, as provided by the iterator, and returns its MXC URI
+            concurrency: Maximum number of uploads in flight
+            retries: Number of times a failed upload is retried
+            backoff: Delay before the first retry, in seconds; every further retry waits twice as long
+            transient_errors: Exceptions of `uploader` that are worth retrying
+
+        Returns:
+            Number, size, latency and throughput of the uploads.
+
+        Raises:
+            Exception: The error of the first upload that failed for good, once the uploads in flight have finished. No further uploads are started after it.
+
+        Examples:
+            >>> stats = await storage.upload_all(your_async_upload_method, concurrency=8)
+            >>> storage.update_lookup_table()
+        """
+
+        stats = UploadStats()
+        slots = asyncio.Semaphore(concurrency)
+        errors: List[BaseException] = []
+
+        async def upload(data: Union[FileData, bytes],
+                         callback: Callable[[str], None]):
+            start = time.perf_counter()
+            try:
+                for attempt in range(retries + 1):
+                    try:
+                        uri = await uploader(data)
+                        break
+                    except transient_errors:
+                        if attempt == retries:
+                            raise
+                        stats.retries += 1
+                        await asyncio.sleep(backoff * 2**attempt)
+                callback(uri)
+                stats.files += 1
+                stats.bytes += (len(data) if isinstance(data, bytes) else
+                                self.__estimate_json_size(data))
+                stats.latencies.append(time.perf_counter() - start)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                slots.release()
+
+        start = time.perf_counter()
+        tasks = []
+        files = iter(self)
+        while True:
+            await slots.acquire()
+            if errors:
+                break
+            try:
+                data, callback = next(files)
+            except StopIteration:
+                break
+            tasks.append(asyncio.ensure_future(upload(data, callback)))
+        await asyncio.gather(*tasks)
+        stats.seconds = time.perf_counter() - start
+
+        if errors:
+            raise errors[0]
+        return stats
+
+    def __encode(self, data: FileData) -> bytes:
+        """Serializes a file with the codec, and compresses it if a compression was given."""
+
+        encoded = self.__codec.encode(data)
+        if self.__compression is not None:
+            encoded = compress(encoded, self.__compression)
+        return encoded
+
+    def __fit_cutoff_sizes(self, datastore: Datastore) -> Dict[int, int]:
+        """Finds a limit on the JSON size of the files of each level at which they're packed as fully as their encoded size allows.
+
+        Levels are fitted separately, since their encoded size can be a different share of their JSON size, e.g. because a blob stores an event id repeated across its buckets once. The limit of a level starts at the file size limit divided by the ratio of encoded to JSON size of a sample of the level. The files of the level are then planned, the encoded size of each is estimated from its JSON size with the largest ratio seen so far on the level, and the largest file and the files estimated to be close to the file size limit are sized by `__encoded_size`. While one of them is over the file size limit, the limit of the level is lowered in proportion and its files are planned again; once they fit, the other files of the level are sized too, as the ratio varies between files with how many event ids they repeat.
+
+        Returns:
+            Map from the index of every level to the limit on the JSON size of its files, at which every file is within the file size limit.
+
+        Raises:
+            ValueError: If a file of a single event id is over the file size limit once encoded, so that no limit fits.
+        """
+
+        file_size_limit = self.__cutoff_size
+        threshold = FITTING_SHARE * file_size_limit
+        ratios = {
+            l: self.__encoding_ratio(l, level)
+            for l, level in datastore.items()
+        }
+        cutoff_sizes = {l: file_size_limit / ratios[l] for l in ratios}
+        unfitted = dict(datastore)
+        while unfitted:
+            self.__level_cutoff_sizes = {
+                l: max(int(cutoff_size), 1)
+                for l, cutoff_size in cutoff_sizes.items()
+            }
+            whole_level_files, large_levels = self.__segregate_levels(unfitted)
+            plan = self.__plan_files(whole_level_files, large_levels)
+            spans_of_levels: Dict[int, List[Tuple[float, _FileSpan]]] = {}
+            for identifier, span in plan.items():
+                l = identifier[0] if isinstance(identifier,
+                                                tuple) else identifier
+                spans_of_levels.setdefault(l, []).append(
+                    (self.__span_json_size(l, span), span))
+
+            for l in list(unfitted):
+                spans = sorted(spans_of_levels.get(l, ()),
+                               key=lambda item: item[0],
+                               reverse=True)
+
+                # Size the largest file and the others close to the limit, then the rest once those fit, since the ratio varies between files
+                largest, oversized = 0, None
+                for i, (json_size, span) in enumerate(spans):
+                    if (i > 0 and json_size * ratios[l] < threshold
+                            and largest > file_size_limit):
+                        break
+                    size = self.__encoded_size(span)
+                    if json_size > 0:
+                        ratios[l] = max(ratios[l], size / json_size)
+                    if size > largest:
+                        largest, oversized = size, span
+                if largest <= file_size_limit:
+                    del unfitted[l]
+                    continue
+
+                cutoff_size = self.__level_cutoff_sizes[l]
+                one_event_id = (oversized.bucket_index is not None
+                                and oversized.stop - oversized.start == 1)
+                if one_event_id or cutoff_size == 1:
+                    raise ValueError(
+                        f"File size limit of {file_size_limit} bytes is too "
+                        "small for a single event id once encoded")
+                cutoff_sizes[l] = min(
+                    cutoff_sizes[l] * FITTING_MARGIN * file_size_limit /
+                    largest, cutoff_size - 1)
+        return self.__level_cutoff_sizes
+
+    def __span_json_size(self, l: int, span: "_FileSpan") -> float:
+        """Computes the JSON size of the file that a span of level `l` holds, in proportion to the number of documents for fractions of buckets."""
+
+        level = span.level
+        bucket_sizes = self.__sizes_of_buckets(l, level)
+        if span.bucket_index is not None:
+            length = _bucket_length(level, span.bucket_index)
+            return (bucket_sizes[span.bucket_index] *
+                    (span.stop - span.start) / max(length, 1))
+        if span.buckets is not None:
+            buckets = span.buckets[span.start:span.stop]
+        else:
+            buckets = range(span.start, span.stop)
+        return _json_list_size([bucket_sizes[b] for b in buckets])
+
+    def __encoded_size(self, span: "_FileSpan") -> int:
+        """Computes the size of the file that a span of the datastore holds once encoded.
+
+        Uncompressed blobs of a `CompactLevel` are sized from its ordinals, without reading or encoding the file; other files are encoded.
+        """
+
+        level = span.level
+        if (self.__compression is not None
+                or not isinstance(self.__codec, BlobCodec)
+                or not isinstance(level, CompactLevel)):
+            return len(self.__encode(span.read()))
+
+        ordinals, offsets = level.ordinals, level.offsets
+        if span.bucket_index is not None:
+            offset = offsets[span.bucket_index]
+            documents = ordinals[offset + span.start:offset + span.stop]
+            return self.__codec.encoded_size(
+                1, len(documents), level.documents.byte_sizes(set(documents)))
+
+        if span.buckets is not None:
+            buckets = span.buckets[span.start:span.stop]
+        else:
+            buckets = range(span.start, span.stop)
+        distinct_documents: Set[int] = set()
+        entries = 0
+        for b in buckets:
+            documents = ordinals[offsets[b]:offsets[b + 1]]
+            distinct_documents.update(documents)
+            entries += len(documents)
+        return self.__codec.encoded_size(
+            len(buckets), entries,
+            level.documents.byte_sizes(distinct_documents))
+
+    def __encoding_ratio(self, l: int, level: DatastoreLevel) -> float:
+        """Estimates the ratio of the encoded size of the files of a level to their JSON size, from about one file worth of its first buckets."""
+
+        bucket_sizes = self.__sizes_of_buckets(l, level)
+        stop, json_size = 0, 2
+        while stop < len(level) and json_size < self.__cutoff_size:
+            json_size += bucket_sizes[stop] + 2
+            stop += 1
+        return self.__encoded_size(_FileSpan(level, None, 0, stop)) / json_size
+
+    def __cutoff(self, l: int) -> int:
+        """Returns the limit on the JSON size of the files of level `l`."""
+
+        return self.__level_cutoff_sizes.get(l, self.__cutoff_size)
+
     def __segregate_levels(
         self,
         levels: Datastore,
@@ -100,80 +426,57 @@ class IndexStorage:
         large_levels: LargeLevels = {}
 
         for l, level in levels.items():
-            level_size = self.__estimate_json_size(level)
-            if level_size < self.__cutoff_size:
+            level_size = _json_list_size(self.__sizes_of_buckets(l, level))
+            if self.__verify_sizes:
+                _verify_json_size(level, level_size)
+            if level_size < self.__cutoff(l):
                 files[l] = level
             else:
                 large_levels[l] = level
 
         return files, large_levels
 
-    def __split_large_levels(
-        self,
-        large_levels: LargeLevels,
-    ) -> Tuple[FractionsOfLevelFiles, LargeBuckets]:
-
-        def divide_level(l: int, level: Level):
-            """Divides level into appropriately sized blobs of buckets, reporting extra-large buckets separately.
-
-            Args:
-                l: Index of level being split
-                level: Data stored in the level to be split
-
-            Returns:
-                Tuple of the form (FOL, LB) where — FOL are fractions that the level has been divided into, and LB are extra-large buckets.
-            """
-
-            fractions = {}
-            temp_large_buckets = {}
-
-            f = 0
-            current_fraction: Level = []
-            size_so_far = 0
-
-            for b, bucket in enumerate(level):
-                bucket_size = self.__estimate_json_size(bucket)
-                if bucket_size >= self.__cutoff_size:
-                    # Add bucket to large buckets
-                    temp_large_buckets[l, b] = bucket
-
-                    # Save the fraction collected so far
-                    if len(current_fraction) > 0:
-                        fractions[l, f] = current_fraction
-
-                    # Reset current fraction
-                    f = b + 1
-                    current_fraction = []
-                    size_so_far = 0
-                elif size_so_far + bucket_size + 2 < self.__cutoff_size:
-                    # Add bucket to current fraction
-                    current_fraction.append(bucket)
-                    size_so_far += bucket_size + 2
-                else:
-                    # Save the fraction collected so far
-                    fractions[l, f] = current_fraction
+    def __sizes_of_buckets(self, l: int, level: DatastoreLevel) -> List[int]:
+        """Computes the JSON sizes of the buckets of a level, once per level."""
 
-                    # Reset current fraction
-                    f = b
-                    current_fraction = [bucket]
-                    size_so_far = bucket_size
+        cached = self.__bucket_sizes.get(l)
+        if cached is None or cached[0] is not level:
+            id_sizes = None
+            if isinstance(level, CompactLevel):
+                id_sizes = self.__sizes_of_event_ids(level.documents)
+            cached = self.__bucket_sizes[l] = (level,
+                                               _bucket_json_sizes(
+                                                   level, id_sizes))
+        return cached[1]
 
-            # Save remaining fraction
-            if len(current_fraction) > 0:
-                fractions[l, f] = current_fraction
+    def __sizes_of_event_ids(self, documents: StringTable) -> array:
+        """Computes the JSON sizes of the event ids of a string table, once for all the levels that share it."""
 
-            return fractions, temp_large_buckets
+        cached = self.__id_sizes
+        if (cached is None or cached[0] is not documents
+                or len(cached[1]) != len(documents)):
+            cached = self.__id_sizes = (documents, documents.json_sizes())
+        return cached[1]
 
+    def __split_large_levels(
+        self,
+        large_levels: LargeLevels,
+    ) -> Tuple[FractionsOfLevelFiles, LargeBuckets]:
         files: FractionsOfLevelFiles = {}
         large_buckets: LargeBuckets = {}
-
-        for level_index, level_data in large_levels.items():
-            fractions_of_level_files, current_large_buckets = divide_level(
-                level_index,
-                level_data,
-            )
-            files.update(fractions_of_level_files)
-            large_buckets.update(current_large_buckets)
+        self.__layouts = {}
+
+        for l, level in large_levels.items():
+            fractions, large_bucket_indices, order = self.__lay_out_level(
+                l, level)
+            for f, stop in fractions:
+                if order is None:
+                    files[l, f] = level[f:stop]
+                else:
+                    first, buckets = self.__lay_out_fraction(l, order[f:stop])
+                    files[l, first] = [level[b] for b in buckets]
+            for b in large_bucket_indices:
+                large_buckets[l, b] = level[b]
 
         return files, large_buckets
 
@@ -183,22 +486,239 @@ class IndexStorage:
     ) -> FractionsOfBucketFiles:
         files: FractionsOfBucketFiles = {}
 
-        # Iterate over large buckets
         for (l, b), bucket in large_buckets.items():
-            # Calculate size of fractions
-            number_of_fractions = ceil(
-                self.__estimate_json_size(bucket) / self.__cutoff_size)
-            fraction_length = ceil(len(bucket) / number_of_fractions)
-
-            # Divide bucket into fractions and save fractions
-            for i in range(number_of_fractions):
-                f = i * fraction_length
-                files[l, b, f] = bucket[f:f + fraction_length]
+            for f, stop in self.__divide_bucket(
+                    self.__estimate_json_size(bucket), len(bucket),
+                    self.__cutoff(l), self.__chunks.get((l, b))):
+                files[l, b, f] = bucket[f:stop]
 
         return files
 
+    def __plan_files(
+        self,
+        whole_level_files: WholeLevelFiles,
+        large_levels: LargeLevels,
+    ) -> Dict[FileIdentifier, "_FileSpan"]:
+        """Splits the datastore like `__split_large_levels` and `__split_large_buckets` do, but only records which buckets or documents go in each file.
+
+        Returns:
+            Map from the identifier of every file to the span of the datastore that it holds, in the order that files are stored in eagerly.
+        """
+
+        plan: Dict[FileIdentifier, _FileSpan] = {
+            l: _FileSpan(level, None, 0, len(level))
+            for l, level in whole_level_files.items()
+        }
+        fractions_of_buckets: Dict[FileIdentifier, _FileSpan] = {}
+        self.__layouts = {}
+        for l, level in large_levels.items():
+            fractions, large_bucket_indices, order = self.__lay_out_level(
+                l, level)
+            for f, stop in fractions:
+                if order is None:
+                    plan[l, f] = _FileSpan(level, None, f, stop)
+                else:
+                    first, buckets = self.__lay_out_fraction(l, order[f:stop])
+                    plan[l, first] = _FileSpan(level, None, 0, len(buckets),
+                                               buckets)
+            bucket_sizes = self.__sizes_of_buckets(l, level)
+            for b in large_bucket_indices:
+                for f, stop in self.__divide_bucket(bucket_sizes[b],
+                                                    _bucket_length(level, b),
+                                                    self.__cutoff(l),
+                                                    self.__chunks.get((l, b))):
+                    fractions_of_buckets[l, b,
+                                         f] = _FileSpan(level, b, f, stop)
+        plan.update(fractions_of_buckets)
+        return plan
+
+    def __lay_out_level(
+        self,
+        l: int,
+        level: DatastoreLevel,
+    ) -> Tuple[List[Tuple[int, int]], List[int], Optional[List[int]]]:
+        """Divides a level like `__divide_level` does, with its buckets in order or ordered by keyword, whichever makes searches fetch fewer files.
+
+        Returns:
+            A tuple of the form (FOL, LB, O), where — FOL and LB are as returned by `__divide_level`, and O is the order of the buckets that the fractions are positions in, or `None` if they're in order.
+        """
+
+        fractions, large_bucket_indices = self.__divide_level(l, level)
+        keyword_buckets = self.__keyword_buckets.get(l)
+        if not keyword_buckets:
+            return fractions, large_bucket_indices, None
+
+        order = _order_buckets(len(level), keyword_buckets)
+        ordered_fractions, _ = self.__divide_level(l, level, order)
+        if (_files_per_search(keyword_buckets, ordered_fractions, order) >=
+                _files_per_search(keyword_buckets, fractions)):
+            return fractions, large_bucket_indices, None
+        return ordered_fractions, large_bucket_indices, order
+
+    def __divide_level(
+        self,
+        l: int,
+        level: DatastoreLevel,
+        order: Optional[List[int]] = None,
+    ) -> Tuple[List[Tuple[int, int]], List[int]]:
+        """Divides level into appropriately sized blobs of buckets, reporting extra-large buckets separately.
+
+        Args:
+            l: Index of level being split
+            level: Data stored in the level to be split
+            order: Order that the buckets are packed in. Defaults to the order of the level
+
+        Returns:
+            Tuple of the form (FOL, LB) where — FOL are the first and last (exclusive) buckets of the fractions that the level has been divided into, or positions in `order` if given, and LB are the indices of extra-large buckets.
+        """
+
+        fractions = []
+        large_bucket_indices = []
+        bucket_sizes = self.__sizes_of_buckets(l, level)
+        cutoff_size = self.__cutoff(l)
+        if order is None:
+            order = range(len(level))
+
+        # The current fraction holds buckets f to p, in order
+        f = 0
+        size_so_far = 0
+
+        for p, b in enumerate(order):
+            bucket_size = bucket_sizes[b]
+            if self.__verify_sizes:
+                _verify_json_size(level[b], bucket_size)
+            if bucket_size >= cutoff_size:
+                # Add bucket to large buckets
+                large_bucket_indices.append(b)
+
+                # Save the fraction collected so far
+                if p > f:
+                    fractions.append((f, p))
+
+                # Reset current fraction
+                f = p + 1
+                size_so_far = 0
+            elif size_so_far + bucket_size + 2 < cutoff_size:
+                # Add bucket to current fraction
+                size_so_far += bucket_size + 2
+            else:
+                # Save the fraction collected so far
+                if p > f:
+                    fractions.append((f, p))
+
+                # Reset current fraction
+                f = p
+                size_so_far = bucket_size
+
+        # Save remaining fraction
+        if len(level) > f:
+            fractions.append((f, len(level)))
+
+        return fractions, large_bucket_indices
+
+    def __place_chunks(
+        self,
+        query_profile: Optional[Mapping[str, float]],
+    ) -> Tuple[Dict[int, List[Tuple[float, List[int]]]], Dict[Tuple[
+            int, int], List[Tuple[int, int]]]]:
+        """Reads where the chunks of every keyword were placed, to lay the files out by keyword.
+
+        Args:
+            query_profile: Relative frequency with which each keyword is searched for, or `None` if every keyword is equally frequent
+
+        Returns:
+            A tuple of the form (KB, C), where — KB maps the index of every level to the frequency and buckets of every keyword with chunks in several of its buckets, and C maps every bucket to the starts and lengths of its chunks, in order.
+        """
+
+        keyword_buckets: Dict[int, List[Tuple[float, List[int]]]] = {}
+        chunks: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        for keyword, locations in self.lookup_table.items():
+            buckets_of_levels: Dict[int, Set[int]] = {}
+            for location in locations:
+                l, b = location.level_index, location.bucket_index
+                if b is None:
+                    continue
+                buckets_of_levels.setdefault(l, set()).add(b)
+                chunks.setdefault((l, b), []).append(
+                    (location.start_of_chunk, location.chunk_length))
+            weight = 1.0 if query_profile is None else query_profile.get(
+                keyword, 0.0)
+            for l, buckets in buckets_of_levels.items():
+                # Keywords in one bucket are fetched from one file anyway
+                if len(buckets) > 1:
+                    keyword_buckets.setdefault(l, []).append(
+                        (weight, sorted(buckets)))
+
+        for bucket_chunks in chunks.values():
+            bucket_chunks.sort()
+        return keyword_buckets, chunks
+
+    def __lay_out_fraction(self, l: int,
+                           buckets: List[int]) -> Tuple[int, List[int]]:
+        """Records the file and position of each bucket of a fraction of a level laid out by keyword, for `update_lookup_table`.
+
+        Args:
+            l: Index of the level
+            buckets: Buckets of the fraction, in order
+
+        Returns:
+            A tuple of the form (F, B), where — F is the first bucket of the fraction, which identifies its file, and B are the buckets of the fraction.
+        """
+
+        layout = self.__layouts.setdefault(l, {})
+        for position, b in enumerate(buckets):
+            layout[b] = buckets[0], position
+        return buckets[0], buckets
+
+    def __divide_bucket(
+        self,
+        bucket_size: int,
+        bucket_length: int,
+        cutoff_size: int,
+        chunks: Optional[List[Tuple[int, int]]] = None,
+    ) -> List[Tuple[int, int]]:
+        """Divides a bucket into equally long fractions, each smaller than the file size limit.
+
+        If the chunks of the bucket are given, fractions are at most as long instead, and start at the start of a chunk wherever that keeps the chunk in fewer files, so that a chunk spans as few files as its length allows.
+
+        Args:
+            bucket_size: Size of the bucket once serialized
+            bucket_length: Number of documents in the bucket
+            cutoff_size: Limit on the JSON size of the files of the level of the bucket
+            chunks: Starts and lengths of the chunks of the bucket, in order
+
+        Returns:
+            The first and last (exclusive) documents of every fraction.
+        """
+
+        number_of_fractions = ceil(bucket_size / cutoff_size)
+        fraction_length = ceil(bucket_length / number_of_fractions)
+        if chunks is None:
+            return [(f, min(f + fraction_length, bucket_length))
+                    for f in range(0, number_of_fractions *
+                                   fraction_length, fraction_length)]
+
+        starts = [0]
+        for start, length in chain(chunks, [(bucket_length, 0)]):
+            # Close the fractions that end before the chunk
+            while start - starts[-1] > fraction_length:
+                starts.append(starts[-1] + fraction_length)
+            end = start + length
+            if end - starts[-1] <= fraction_length:
+                continue
+            # Start a fraction at the chunk, then cover the rest of the chunk
+            if start > starts[-1]:
+                starts.append(start)
+            while end - starts[-1] > fraction_length:
+                starts.append(starts[-1] + fraction_length)
+        return list(zip(starts, starts[1:] + [bucket_length]))
+
     def update_lookup_table(self):
-        """Updates lookup table of encrypted index with new, remote locations."""
+        """Updates lookup table of encrypted index with new, remote locations.
+
+        The identifiers of the uploaded files are indexed once, by level and by bucket, so that every location is converted by bisection instead of a scan over all files.
+        """
+        self.__index_files()
         new_lookup_table: LookupTable = {
             keyword: []
             for keyword in self.lookup_table
@@ -212,43 +732,32 @@ class IndexStorage:
                     new_lookup_table[keyword].append(converted)
         self.lookup_table = new_lookup_table
 
+    def __index_files(self):
+        """Indexes the starting buckets of the fractions of every level, and the starting offsets of the fractions of every bucket, in increasing order."""
+
+        level_fractions: Dict[int, List[int]] = {}
+        bucket_fractions: Dict[Tuple[int, int], List[int]] = {}
+        for identifier in self.__mxc_uris_map:
+            if not isinstance(identifier, tuple):
+                continue
+            if len(identifier) == 2:
+                l, f = identifier
+                level_fractions.setdefault(l, []).append(f)
+            else:
+                l, b, f = identifier
+                bucket_fractions.setdefault((l, b), []).append(f)
+        for starts in chain(level_fractions.values(),
+                            bucket_fractions.values()):
+            starts.sort()
+        self.__level_fractions = level_fractions
+        self.__bucket_fractions = bucket_fractions
+
     def __convert_location(
             self, location: Location) -> Union[Location, Tuple[Location, ...]]:
 
-        def is_stored_as_level(level_index: int) -> bool:
-            return level_index in self.__mxc_uris_map
-
-        def is_stored_as_fraction_of_bucket(
-            level_index: int,
-            bucket_index: int,
-        ) -> bool:
-            return any(
-                True for identifier in self.__mxc_uris_map
-                if isinstance(identifier, tuple) and len(identifier) == 3 and
-                identifier[0] == level_index and identifier[1] == bucket_index)
-
-        def find_fraction_of_bucket_file(
-            level_index: int,
-            bucket_index: int,
-        ) -> List[int]:
-            return sorted(
-                identifier[2] for identifier in self.__mxc_uris_map
-                if isinstance(identifier, tuple) and len(identifier) == 3 and
-                identifier[0] == level_index and identifier[1] == bucket_index)
-
-        def find_fraction_of_level_file(
-            level_index: int,
-            bucket_index: int,
-        ) -> int:
-            closest_lower = max(
-                identifier[1] for identifier in self.__mxc_uris_map
-                if isinstance(identifier, tuple) and len(identifier) == 2 and
-                identifier[0] == level_index and identifier[1] <= bucket_index)
-            return closest_lower
-
         l, b, s, c = location.level_index, location.bucket_index, location.start_of_chunk, location.chunk_length
         new_location: Location
-        if is_stored_as_level(l):
+        if l in self.__mxc_uris_map:
             return Location(
                 is_remote=True,
                 mxc_uri=self.__mxc_uris_map[l],
@@ -256,21 +765,14 @@ class IndexStorage:
                 start_of_chunk=s,
                 chunk_length=c,
             )
-        elif is_stored_as_fraction_of_bucket(l, b):
-            # Find all fractions of that bucket
-            starts_of_files = find_fraction_of_bucket_file(l, b)
+        elif (l, b) in self.__bucket_fractions:
+            # Find the fractions of that bucket that the chunk overlaps
+            starts_of_files = self.__bucket_fractions[l, b]
             if s >= starts_of_files[-1]:
                 starts_of_files = [starts_of_files[-1]]
             else:
-                first_fraction = next(
-                    (i for i in range(len(starts_of_files) - 1)
-                     if starts_of_files[i] <= s < starts_of_files[i + 1]),
-                    starts_of_files[-1],
-                )
-                last_fraction = next(
-                    (i for i, f in enumerate(starts_of_files) if f >= s + c),
-                    starts_of_files[-1],
-                )
+                first_fraction = max(bisect_right(starts_of_files, s) - 1, 0)
+                last_fraction = bisect_left(starts_of_files, s + c)
                 starts_of_files = starts_of_files[first_fraction:last_fraction]
 
             # Modify relevant locations of fractions.
@@ -286,8 +788,20 @@ class IndexStorage:
                     ))
 
             return tuple(locations)
+        elif l in self.__layouts:
+            # Find the fraction of that level that the bucket was laid out in
+            f, position = self.__layouts[l][b]
+            return Location(
+                is_remote=True,
+                mxc_uri=self.__mxc_uris_map[l, f],
+                bucket_index=position,
+                start_of_chunk=s,
+                chunk_length=c,
+            )
         else:
-            prev_b = find_fraction_of_level_file(l, b)
+            # Find the fraction of that level that starts closest before the bucket
+            starts_of_files = self.__level_fractions[l]
+            prev_b = starts_of_files[bisect_right(starts_of_files, b) - 1]
             return Location(
                 is_remote=True,
                 mxc_uri=self.__mxc_uris_map[l, prev_b],
@@ -297,10 +811,155 @@ class IndexStorage:
             )
 
     @staticmethod
-    def __estimate_json_size(data: Union[Bucket, Level]):
-        fakefile = _FakeFile()
-        json.dump(data, fakefile)
-        return fakefile.size
+    def __estimate_json_size(data: Union[Bucket, DatastoreLevel]) -> int:
+        """Computes the size of a bucket or level once serialized as JSON, without serializing it."""
+
+        if isinstance(data, CompactLevel) or (data
+                                              and isinstance(data[0], list)):
+            return _json_list_size(_bucket_json_sizes(data))
+        return _bucket_json_size(data)
+
+
+def _bucket_json_size(bucket: Bucket) -> int:
+    """Computes the size of a bucket once serialized as JSON.
+
+    Event ids rarely need escaping, so they're checked all at once, and only sized one by one if some do.
+    """
+
+    if not bucket:
+        return 2
+    text = "".join(bucket)
+    if _PLAIN_STRING.fullmatch(text):
+        # Quotes around every id, and ", " between ids and brackets around them
+        return len(text) + 4 * len(bucket)
+    return _json_list_size([len(json.dumps(string)) for string in bucket])
+
+
+def _json_list_size(item_sizes: List[int]) -> int:
+    """Computes the size of a list once serialized as JSON, from the sizes of its items."""
+
+    if not item_sizes:
+        return 2
+    return 2 + sum(item_sizes) + 2 * (len(item_sizes) - 1)
+
+
+def _bucket_json_sizes(level: DatastoreLevel,
+                       id_sizes: Optional[array] = None) -> List[int]:
+    """Computes the size of every bucket of a level once serialized as JSON.
+
+    The event ids of a `CompactLevel` are sized once, in its string table, and summed bucket by bucket over its ordinals, so that no per-document list is built.
+
+    Args:
+        level: Level whose buckets are sized
+        id_sizes: JSON sizes of the event ids of the string table of a `CompactLevel`, if already computed
+    """
+
+    if isinstance(level, CompactLevel):
+        if id_sizes is None:
+            id_sizes = level.documents.json_sizes()
+        ordinals, offsets = level.ordinals, level.offsets
+        sizes = []
+        for b in range(len(level)):
+            start, end = offsets[b], offsets[b + 1]
+            if start == end:
+                sizes.append(2)
+            else:
+                sizes.append(
+                    sum(map(id_sizes.__getitem__, ordinals[start:end])) + 2 *
+                    (end - start))
+        return sizes
+    return list(map(_bucket_json_size, level))
+
+
+def _verify_json_size(data: Union[Bucket, DatastoreLevel], size: int):
+    """Checks a computed size against the size of the actual serialization.
+
+    Raises:
+        AssertionError: If the sizes differ.
+    """
+
+    fakefile = _FakeFile()
+    json.dump(data, fakefile, default=_compact_level_to_json)
+    if fakefile.size != size:
+        raise AssertionError(
+            f"Computed JSON size {size} differs from actual size {fakefile.size}"
+        )
+
+
+def _compact_level_to_json(level: CompactLevel) -> Level:
+    """Serializes a compact level like the list of buckets that it stands for."""
+
+    if not isinstance(level, CompactLevel):
+        raise TypeError(f"Object of type {type(level).__name__} "
+                        "is not JSON serializable")
+    return level.tolist()
+
+
+def _bucket_length(level: DatastoreLevel, b: int) -> int:
+    """Returns the number of documents in a bucket, without reading a `CompactLevel`."""
+
+    if isinstance(level, CompactLevel):
+        return level.bucket_length(b)
+    return len(level[b])
+
+
+def _order_buckets(
+        number_of_buckets: int,
+        keyword_buckets: List[Tuple[float, List[int]]]) -> List[int]:
+    """Orders the buckets of a level so that the buckets holding the chunks of a keyword are next to each other, to be packed into the same files.
+
+    Keywords are taken from the most frequently searched, and among equally frequent ones from those with the fewest buckets, whose buckets fit in a file most easily. Each keyword appends its buckets that aren't ordered yet, and the other buckets come last, in order.
+    """
+
+    ordered = {}  # Insertion-ordered set of buckets
+    for _, buckets in sorted(keyword_buckets,
+                             key=lambda item: (-item[0], len(item[1]))):
+        ordered.update(dict.fromkeys(buckets))
+    ordered.update(dict.fromkeys(range(number_of_buckets)))
+    return list(ordered)
+
+
+def _files_per_search(
+    keyword_buckets: List[Tuple[float, List[int]]],
+    fractions: List[Tuple[int, int]],
+    order: Optional[List[int]] = None,
+) -> float:
+    """Computes the number of files of a level that searches fetch, weighted by the frequency of every keyword, if the level is divided into the given fractions.
+
+    Buckets that aren't in any fraction are extra-large, and count as a file each.
+    """
+
+    fraction_of_buckets = {}
+    for i, (f, stop) in enumerate(fractions):
+        for p in range(f, stop):
+            fraction_of_buckets[p if order is None else order[p]] = i
+    return sum(weight *
+               len({fraction_of_buckets.get(b, -1 - b)
+                    for b in buckets}) for weight, buckets in keyword_buckets)
+
+
+class _FileSpan(NamedTuple):
+    """The part of a level that a file holds: buckets `start` to `stop` of the level if `bucket_index` is `None`, otherwise documents `start` to `stop` of that bucket. If `buckets` is given, the range is of positions in it instead."""
+
+    level: DatastoreLevel
+    bucket_index: Optional[int]
+    start: int
+    stop: int
+    buckets: Optional[List[int]] = None
+
+    def read(self) -> FileData:
+        """Reads the buckets or documents into lists, e.g. to be serialized."""
+
+        level, b = self.level, self.bucket_index
+        if b is None and self.buckets is not None:
+            return [level[i] for i in self.buckets[self.start:self.stop]]
+        if b is None:
+            return level[self.start:self.stop]
+        if isinstance(level, CompactLevel):
+            offset = level.offsets[b]
+            return level.documents.lookup(
+                level.ordinals[offset + self.start:offset + self.stop])
+        return level[b][self.start:self.stop]
 
 
 class _FakeFile(IO, ABC):
@@ -1,5 +1,7 @@
+from array import array
 from typing import Any, Dict, List, Set, Tuple, Union
 
+from .models.compact_level import CompactLevel
 from .models.level_info import LevelInfo
 from .models.location import Location
 
@@ -10,18 +12,22 @@ Corpus = Dict[str, Set[str]]
 # index.invert
 InvertedIndex = Dict[str, Set[str]]
 
+# index.build_postings
+Postings = Dict[int, array]
+
 # index.calc_params
 LevelInfos = Dict[int, LevelInfo]
 
 # index.distribute
 Bucket = List[str]
 Level = List[Bucket]
-Datastore = Dict[int, Level]
+DatastoreLevel = Union[Level, CompactLevel]
+Datastore = Dict[int, DatastoreLevel]
 LookupTable = Dict[str, List[Location]]
 
 # storage.__segregate_levels
-WholeLevelFiles = Dict[int, Level]
-LargeLevels = Dict[int, Level]
+WholeLevelFiles = Dict[int, DatastoreLevel]
+LargeLevels = Dict[int, DatastoreLevel]
 
 # storage.__split_large_levels
 FractionsOfLevelFiles = Dict[Tuple[int, int], Level]
@@ -38,4 +44,4 @@ FileData = Union[Level, Bucket]
 FilesMap = Dict[FileIdentifier, FileData]
 
 # search.locate
-FetchedFiles = Dict[str, Union[Bucket, Level]]
+FetchedFiles = Dict[str, Union[Bucket, Level, bytes]]
@@ -0,0 +1,152 @@
+from array import array
+from typing import Callable, Dict, List, Sequence
+
+# Levels with at most this many buckets are scanned instead of indexed
+LINEAR_SCAN_LIMIT = 64
+
+
+class BucketCapacities:
+    """Remaining capacities of the buckets of a level, indexed so that a bucket with enough capacity for a chunk can be chosen in logarithmic time.
+
+    Buckets are grouped by their exact remaining capacity, and a Fenwick tree over capacities counts the buckets in each group. Choosing a bucket draws a uniformly random rank among all buckets with enough capacity and finds the group holding that rank, so the choice is distributed exactly like picking uniformly from a list of all such buckets. Levels with few buckets, where the tree would be larger than a scan is slow, are scanned instead.
+
+    Args:
+        capacities: Initial capacity of each bucket
+    """
+
+    __capacities: List[int]
+    __tree: array
+    __members: Dict[int, List[int]]
+    __positions: List[int]
+
+    def __init__(self, capacities: Sequence[int]):
+        self.__capacities = list(capacities)
+        self.__indexed = len(self.__capacities) > LINEAR_SCAN_LIMIT
+        if not self.__indexed:
+            return
+
+        # Group buckets by capacity
+        self.__members = {}
+        self.__positions = []
+        for bucket, capacity in enumerate(self.__capacities):
+            members = self.__members.setdefault(capacity, [])
+            self.__positions.append(len(members))
+            members.append(bucket)
+
+        # Count buckets of each capacity, in a Fenwick tree over capacities 0 to the maximum
+        self.__domain = max(self.__capacities) + 1
+        self.__tree = array("L", [0]) * (self.__domain + 1)
+        for capacity, members in self.__members.items():
+            self.__add(capacity, len(members))
+
+    def __getitem__(self, bucket: int) -> int:
+        return self.__capacities[bucket]
+
+    def __len__(self) -> int:
+        return len(self.__capacities)
+
+    def count_at_least(self, length: int) -> int:
+        """Counts the buckets that can hold a chunk.
+
+        Args:
+            length: Length of the chunk
+
+        Returns:
+            Number of buckets whose remaining capacity is at least `length`.
+        """
+
+        if not self.__indexed:
+            return sum(1 for capacity in self.__capacities
+                       if capacity >= length)
+        return len(self.__capacities) - self.__count_below(length)
+
+    def choose(self, length: int, randbelow: Callable[[int], int]) -> int:
+        """Chooses a bucket uniformly at random among those that can hold a chunk.
+
+        Args:
+            length: Length of the chunk
+            randbelow: Function that returns a uniformly random int in [0, n), e.g. `secrets.randbelow`
+
+        Returns:
+            Index of the chosen bucket.
+
+        Raises:
+            IndexError: If no bucket can hold the chunk.
+        """
+
+        if not self.__indexed:
+            possible_buckets = [
+                bucket for bucket, capacity in enumerate(self.__capacities)
+                if capacity >= length
+            ]
+            if not possible_buckets:
+                raise IndexError("No bucket can hold the chunk")
+            return possible_buckets[randbelow(len(possible_buckets))]
+
+        below = self.__count_below(length)
+        count = len(self.__capacities) - below
+        if count <= 0:
+            raise IndexError("No bucket can hold the chunk")
+        capacity, offset = self.__find(below + randbelow(count))
+        return self.__members[capacity][offset]
+
+    def fill(self, bucket: int, length: int) -> None:
+        """Reduces the remaining capacity of a bucket by the length of a chunk placed in it.
+
+        Args:
+            bucket: Index of the bucket
+            length: Length of the chunk
+        """
+
+        capacity = self.__capacities[bucket]
+        self.__capacities[bucket] = capacity - length
+        if not self.__indexed:
+            return
+
+        # Swap-remove from the old group
+        members = self.__members[capacity]
+        position = self.__positions[bucket]
+        last = members.pop()
+        if last != bucket:
+            members[position] = last
+            self.__positions[last] = position
+        self.__add(capacity, -1)
+
+        # Add to the new group
+        members = self.__members.setdefault(capacity - length, [])
+        self.__positions[bucket] = len(members)
+        members.append(bucket)
+        self.__add(capacity - length, 1)
+
+    def __add(self, capacity: int, delta: int) -> None:
+        i = capacity + 1
+        while i <= self.__domain:
+            self.__tree[i] += delta
+            i += i & -i
+
+    def __count_below(self, capacity: int) -> int:
+        """Counts the buckets with remaining capacity less than `capacity`."""
+
+        i = min(capacity, self.__domain)
+        count = 0
+        while i > 0:
+            count += self.__tree[i]
+            i -= i & -i
+        return count
+
+    def __find(self, rank: int):
+        """Finds the bucket of a rank in the order of capacities.
+
+        Returns:
+            A tuple of the form (C, O), where — C is the capacity of the bucket and O is its offset among buckets of that capacity.
+        """
+
+        position = 0
+        step = 1 << self.__domain.bit_length()
+        while step:
+            following = position + step
+            if following <= self.__domain and self.__tree[following] <= rank:
+                position = following
+                rank -= self.__tree[following]
+            step >>= 1
+        return position, rank
@@ -0,0 +1,371 @@
+import bz2
+import json
+import lzma
+import struct
+import sys
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union, overload
+
+from ..exceptions import FileFormatError
+from ..types import Bucket, FileData
+
+# Header of a blob: magic, kind, number of buckets, number of distinct event ids, number of entries
+BLOB_HEADER = struct.Struct("<4sBIII")
+BLOB_MAGIC = b"MESB"
+BUCKET, LEVEL = 0, 1  # Kinds of blobs
+# Typecode of the offsets and ordinals of a blob, i.e. unsigned 32-bit ints
+BLOB_TYPECODE = "I"
+# Compressors that files can be compressed with, by name
+COMPRESSIONS: Dict[str, Callable[[bytes], bytes]] = {
+    "zlib": zlib.compress,
+    "lzma": lzma.compress,
+    "bz2": bz2.compress,
+}
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+BZ2_MAGIC = b"BZh"
+
+
+class Codec(ABC):
+    """Format of the files that `IndexStorage` uploads, and that `EncryptedSearch` and `IndexMerge` read chunks from.
+
+    Attributes:
+        name: Name of the format, e.g. to be stored next to a lookup table
+    """
+
+    name: str
+
+    @abstractmethod
+    def encode(self, file_data: FileData) -> bytes:
+        """Serializes a level or a bucket.
+
+        Args:
+            file_data: Level or bucket to be stored as one file
+
+        Returns:
+            Contents of the file.
+        """
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Union[FileData, "BlobFile"]:
+        """Deserializes a file written by `encode`.
+
+        Args:
+            data: Contents of the file
+
+        Returns:
+            The level or bucket, or an object that reads like it.
+        """
+
+
+class JsonCodec(Codec):
+    """Files as JSON arrays of event ids, the format that every version reads."""
+
+    name = "json"
+
+    def encode(self, file_data: FileData) -> bytes:
+        return json.dumps(file_data).encode()
+
+    def decode(self, data: bytes) -> FileData:
+        return json.loads(data)
+
+
+class BlobCodec(Codec):
+    """Files as binary blobs of dictionary-coded event ids, that are read lazily.
+
+    A blob is laid out as little-endian fields, in order:
+        1. A `BLOB_HEADER`, holding `BLOB_MAGIC`, whether the blob holds a level or a bucket, the number of buckets B, the number of distinct event ids D and the number of entries E.
+        2. B + 1 offsets of the buckets into the entries, the last one being E.
+        3. D + 1 offsets of the distinct event ids into the id bytes, the last one being their length.
+        4. E entries, each the ordinal of an event id.
+        5. The UTF-8 bytes of the distinct event ids, concatenated.
+
+    An event id repeated across buckets is stored once, and otherwise takes four bytes of ordinal and four of offset instead of the quotes and separator of JSON. Decoding only reads the header and offsets; event ids are decoded when a chunk is read.
+
+    Blobs are smaller than JSON where files hold many repeated event ids, like the levels of large rooms. They're larger where event ids are mostly distinct, e.g. in fractions of a bucket or the files of small indices, and files under a few hundred bytes are dominated by the 29 bytes of header and offsets of a blob, so that the same file size limit takes more files than JSON. Encoding is in Python rather than in C like `json.dumps`, so it's slower than JSON; `IndexStorage` also fits the file size limit of every level to blobs before packing files, whereas it computes JSON sizes directly.
+    """
+
+    name = "blob"
+
+    def encode(self, file_data: FileData) -> bytes:
+        if file_data and not isinstance(file_data[0], str):
+            kind, buckets = LEVEL, file_data
+        else:
+            kind, buckets = BUCKET, [file_data]
+
+        ordinals_of_ids: Dict[str, int] = {}
+        entries = array(BLOB_TYPECODE)
+        bucket_offsets = array(BLOB_TYPECODE, [0])
+        for bucket in buckets:
+            entries.extend(
+                ordinals_of_ids.setdefault(event_id, len(ordinals_of_ids))
+                for event_id in bucket)
+            bucket_offsets.append(len(entries))
+
+        encoded_ids = [event_id.encode() for event_id in ordinals_of_ids]
+        id_offsets = array(BLOB_TYPECODE, [0])
+        for encoded_id in encoded_ids:
+            id_offsets.append(id_offsets[-1] + len(encoded_id))
+
+        header = BLOB_HEADER.pack(BLOB_MAGIC, kind, len(buckets),
+                                  len(encoded_ids), len(entries))
+        return b"".join((header, _to_little_endian(bucket_offsets),
+                         _to_little_endian(id_offsets),
+                         _to_little_endian(entries), *encoded_ids))
+
+    def decode(self, data: bytes) -> "BlobFile":
+        return BlobFile(data)
+
+    def encoded_size(self, buckets: int, entries: int,
+                     id_sizes: Iterable[int]) -> int:
+        """Computes the size of a blob without encoding it, e.g. to size files from the ordinals of a `CompactLevel`.
+
+        Args:
+            buckets: Number of buckets in the blob, 1 for a bucket
+            entries: Number of event ids in the buckets, repeated ones included
+            id_sizes: UTF-8 size of each distinct event id
+
+        Returns:
+            The length of the blob that `encode` returns.
+        """
+
+        distinct_ids, id_bytes = 0, 0
+        for size in id_sizes:
+            distinct_ids += 1
+            id_bytes += size
+        itemsize = array(BLOB_TYPECODE).itemsize
+        return (BLOB_HEADER.size + itemsize *
+                (buckets + 1 + distinct_ids + 1 + entries) + id_bytes)
+
+
+class BlobFile(Sequence):
+    """A file written by `BlobCodec`, that reads like the level or bucket it holds.
+
+    Reading a bucket of a level returns a `BlobBucket`, and reading a chunk of a bucket returns a list of event ids, so a chunk is sliced out without decoding the rest of the file.
+
+    Args:
+        data: Contents of the file
+
+    Raises:
+        FileFormatError: If the data isn't a blob, or is truncated.
+    """
+
+    __slots__ = ("is_level", "__data", "__bucket_offsets", "__id_offsets",
+                 "__entries", "__ids_start")
+
+    is_level: bool
+
+    def __init__(self, data: bytes):
+        if len(data) < BLOB_HEADER.size:
+            raise FileFormatError("Blob is shorter than its header")
+        magic, kind, buckets, ids, entries = BLOB_HEADER.unpack_from(data)
+        if magic != BLOB_MAGIC or kind not in (BUCKET, LEVEL):
+            raise FileFormatError("Data is not a blob of event ids")
+
+        self.is_level = kind == LEVEL
+        self.__data = data
+        position = BLOB_HEADER.size
+        self.__bucket_offsets, position = _read_array(data, position,
+                                                      buckets + 1)
+        self.__id_offsets, position = _read_array(data, position, ids + 1)
+        self.__entries, position = _read_array(data, position, entries)
+        self.__ids_start = position
+        if len(data) != position + self.__id_offsets[-1]:
+            raise FileFormatError("Blob is truncated")
+
+    def entries(self, start: int, stop: int) -> List[str]:
+        """Decodes a range of entries, across buckets.
+
+        Args:
+            start: Index of the first entry
+            stop: Index after the last entry
+
+        Returns:
+            List of the event ids of the entries, in order.
+        """
+
+        data, offsets, base = self.__data, self.__id_offsets, self.__ids_start
+        return [
+            data[base + offsets[i]:base + offsets[i + 1]].decode("utf-8")
+            for i in self.__entries[start:stop]
+        ]
+
+    def tolist(self) -> FileData:
+        """Decodes the whole file into the level or bucket it holds."""
+
+        if self.is_level:
+            return [bucket.tolist() for bucket in self]
+        return self.entries(0, len(self.__entries))
+
+    def bucket_range(self, b: int) -> range:
+        """Returns the range of entries of a bucket."""
+
+        return range(self.__bucket_offsets[b], self.__bucket_offsets[b + 1])
+
+    @overload
+    def __getitem__(self, i: int) -> Union["BlobBucket", str]:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> Union[List["BlobBucket"], List[str]]:
+        ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if not self.is_level:
+            return _read_entries(self, self.bucket_range(0), i)
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Bucket index out of range")
+        return BlobBucket(self, i)
+
+    def __len__(self) -> int:
+        if self.is_level:
+            return len(self.__bucket_offsets) - 1
+        return len(self.__entries)
+
+
+class BlobBucket(Sequence):
+    """A bucket of a level stored by `BlobCodec`, whose event ids are decoded when read.
+
+    Args:
+        blob: File that holds the level
+        b: Index of the bucket in the level
+    """
+
+    __slots__ = ("__blob", "__range")
+
+    def __init__(self, blob: BlobFile, b: int):
+        self.__blob = blob
+        self.__range = blob.bucket_range(b)
+
+    def tolist(self) -> Bucket:
+        """Decodes every event id of the bucket."""
+
+        return self.__blob.entries(self.__range.start, self.__range.stop)
+
+    @overload
+    def __getitem__(self, i: int) -> str:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[str]:
+        ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[str, List[str]]:
+        return _read_entries(self.__blob, self.__range, i)
+
+    def __len__(self) -> int:
+        return len(self.__range)
+
+
+JSON_CODEC = JsonCodec()
+BLOB_CODEC = BlobCodec()
+CODECS: Dict[str, Codec] = {
+    codec.name: codec
+    for codec in (JSON_CODEC, BLOB_CODEC)
+}
+
+
+def decode_file(data: Union[FileData, bytes], codec: Codec) -> Any:
+    """Decodes the contents of a fetched file, leaving files that were already decoded as they are.
+
+    Args:
+        data: Contents of the file, or the level or bucket it holds
+        codec: Codec that the file was written with
+
+    Returns:
+        The level or bucket, or an object that reads like it.
+    """
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return codec.decode(decompress(bytes(data)))
+    return data
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    """Compresses the contents of a file.
+
+    Args:
+        data: Contents of the file
+        compression: Name of a compressor in `COMPRESSIONS`
+
+    Returns:
+        The compressed contents, which `decompress` recognizes by their header.
+
+    Raises:
+        ValueError: If the compressor is unknown.
+    """
+
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}, expected one "
+                         f"of {', '.join(COMPRESSIONS)}")
+    return COMPRESSIONS[compression](data)
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompresses the contents of a file if they're compressed, recognizing the compressor by its header.
+
+    Neither JSON nor blobs start like the output of a compressor in `COMPRESSIONS`, so uncompressed contents are returned as they are.
+
+    Args:
+        data: Contents of the file, compressed or not
+
+    Returns:
+        The uncompressed contents.
+    """
+
+    if data.startswith(LZMA_MAGIC):
+        return lzma.decompress(data)
+    if data.startswith(BZ2_MAGIC):
+        return bz2.decompress(data)
+    if len(data) >= 2 and data[0] & 0x0f == 8 and int.from_bytes(
+            data[:2], "big") % 31 == 0:
+        return zlib.decompress(data)
+    return data
+
+
+def _read_entries(blob: BlobFile, entries: range,
+                  i: Union[int, slice]) -> Union[str, List[str]]:
+    """Reads an entry, or a slice of entries, within a range of entries of a blob."""
+
+    if isinstance(i, slice):
+        selected = entries[i]
+        if selected.step != 1:
+            return [blob.entries(j, j + 1)[0] for j in selected]
+        return blob.entries(selected.start, selected.stop)
+    try:
+        j = entries[i]
+    except IndexError:
+        raise IndexError("Event index out of range") from None
+    return blob.entries(j, j + 1)[0]
+
+
+def _to_little_endian(values: array) -> bytes:
+    """Serializes an array of ints of a blob."""
+
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_array(data: bytes, position: int, length: int) -> Tuple[array, int]:
+    """Reads an array of little-endian ints of a blob.
+
+    Returns:
+        A tuple of the form (A, P), where — A is the array and P is the position after it.
+    """
+
+    values = array(BLOB_TYPECODE)
+    end = position + values.itemsize * length
+    if len(data) < end:
+        raise FileFormatError("Blob is truncated")
+    values.frombytes(data[position:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
@@ -1,49 +1,135 @@
-from typing import Set
+import re
+from typing import FrozenSet, Iterable, Iterator, Optional, Set
 
-from nltk.corpus import stopwords
-from nltk.tokenize.regexp import RegexpTokenizer, WhitespaceTokenizer
+from .stopwords import ENGLISH_STOPWORDS
 
+BACKENDS = ("builtin", "nltk")
+PUNCTUATION = """<>()[]{}'"_.,;:!?$%&-*~^/\\"""
 
-def normalize(string: str) -> Set[str]:
-    """Tokenizes and normalizes a given string
+
+class Normalizer:
+    """Reusable tokenizer and normalizer for message bodies and search queries.
+
+    The tokenizers and the stopword set are set up once, when the object is created, instead of on every call. Create one normalizer and reuse it for every string of a build or search.
+
+    Two backends produce identical tokens: "builtin" uses precompiled regular expressions and an embedded copy of the English stopwords of NLTK, while "nltk" imports NLTK's tokenizers and reads its stopwords corpus from disk. NLTK is imported only when its backend is selected.
 
     Args:
-        string: Raw string to be tokenized
+        backend: Either "builtin" or "nltk"
+        stop_words: Words to be excluded from the tokens. Defaults to the English stopwords of NLTK.
 
-    Returns:
-        A set of normalized tokens
+    Raises:
+        ValueError: If `backend` is not one of the supported backends.
 
+    Attributes:
+        backend: Name of the backend in use
+        stop_words: Frozen set of words excluded from the tokens, including the empty string
     """
 
-    # Initialize helper methods
-    split_by_whitespaces = WhitespaceTokenizer().tokenize
-    get_letter_sequences = RegexpTokenizer(pattern=r"\w+").tokenize
-    strip_punctuation = lambda x: x.strip("""<>()[]{}'"_.,;:!?$%&-*~^/\\""")
+    backend: str
+    stop_words: FrozenSet[str]
 
-    # Lowercase
-    string = string.lower()
+    def __init__(
+        self,
+        backend: str = "builtin",
+        stop_words: Optional[Iterable[str]] = None,
+    ):
+        if backend == "builtin":
+            self.__split_by_whitespaces = str.split
+            self.__get_letter_sequences = re.compile(r"\w+").findall
+            if stop_words is None:
+                stop_words = ENGLISH_STOPWORDS
+        elif backend == "nltk":
+            from nltk.corpus import stopwords
+            from nltk.tokenize.regexp import RegexpTokenizer, WhitespaceTokenizer
 
-    # Split by whitespaces
-    temp_tokens = set(split_by_whitespaces(string))
+            self.__split_by_whitespaces = WhitespaceTokenizer().tokenize
+            self.__get_letter_sequences = RegexpTokenizer(
+                pattern=r"\w+").tokenize
+            if stop_words is None:
+                stop_words = stopwords.words("english")
+        else:
+            raise ValueError(
+                f"Unknown normalizer backend '{backend}', expected one of {BACKENDS}"
+            )
 
-    tokens: Set[str] = set()
-    for token in temp_tokens:
-        # Strip punctuation
-        stripped_token = strip_punctuation(token)
-        tokens.add(stripped_token)
+        self.backend = backend
+        self.stop_words = frozenset(stop_words) | {''}
 
-        # Find sub-tokens
-        sub_tokens = set(get_letter_sequences(stripped_token))
-        tokens |= sub_tokens
+    def __reduce__(self):
+        # Rebuild the tokenizers, instead of pickling them, when sent to a worker process
+        return self.__class__, (self.backend, self.stop_words)
 
-    # Remove stopwords
-    tokens -= set(stopwords.words("english"))
+    def normalize(self, string: str) -> Set[str]:
+        """Tokenizes and normalizes a given string
 
-    return tokens - {''}
+        Args:
+            string: Raw string to be tokenized
 
+        Returns:
+            A set of normalized tokens
+        """
 
-def normalize_surface(string: str) -> Set[str]:
-    """Tokenizes and normalizes a given string without breaking down to sub-tokens.
+        tokens: Set[str] = set()
+        for token in set(self.__split_by_whitespaces(string.lower())):
+            # Strip punctuation
+            stripped_token = token.strip(PUNCTUATION)
+            tokens.add(stripped_token)
+
+            # Find sub-tokens
+            tokens.update(self.__get_letter_sequences(stripped_token))
+
+        # Remove stopwords
+        tokens -= self.stop_words
+
+        return tokens
+
+    def normalize_surface(self, string: str) -> Set[str]:
+        """Tokenizes and normalizes a given string without breaking down to sub-tokens.
+
+        Args:
+            string: Raw string to be tokenized
+
+        Returns:
+            A set of normalized tokens
+        """
+
+        return {
+            token.strip(PUNCTUATION)
+            for token in self.__split_by_whitespaces(string.lower())
+        } - self.stop_words
+
+    def normalize_many(self, strings: Iterable[str]) -> Iterator[Set[str]]:
+        """Tokenizes and normalizes a batch of strings.
+
+        Args:
+            strings: Raw strings to be tokenized
+
+        Returns:
+            An iterator over the sets of normalized tokens, in the same order as `strings`.
+        """
+
+        return map(self.normalize, strings)
+
+
+_default_normalizer: Optional[Normalizer] = None
+
+
+def get_default_normalizer() -> Normalizer:
+    """Provides a shared normalizer, creating it on first use.
+
+    Returns:
+        The `Normalizer` used when no other normalizer is specified.
+    """
+
+    global _default_normalizer
+    if _default_normalizer is None:
+        _default_normalizer = Normalizer()
+    return _default_normalizer
+
+
+def normalize(string: str) -> Set[str]:
+    """Tokenizes and normalizes a given string
 
     Args:
         string: Raw string to be tokenized
@@ -53,21 +139,18 @@ def normalize_surface(string: str) -> Set[str]:
 
     """
 
-    # Initialize helper methods
-    split_by_whitespaces = WhitespaceTokenizer().tokenize
-    strip_punctuation = lambda x: x.strip("""<>()[]{}'"_.,;:!?$%&-*~^/\\""")
+    return get_default_normalizer().normalize(string)
+
 
-    # Lowercase
-    string = string.lower()
+def normalize_surface(string: str) -> Set[str]:
+    """Tokenizes and normalizes a given string without breaking down to sub-tokens.
 
-    # Split by whitespaces
-    temp_tokens = set(split_by_whitespaces(string))
+    Args:
+        string: Raw string to be tokenized
 
-    # Remove stopwords
-    stopwords_set = set(stopwords.words("english"))
-    stopwords_set.add('')
+    Returns:
+        A set of normalized tokens
 
-    tokens = {strip_punctuation(token)
-              for token in temp_tokens} - stopwords_set
+    """
 
-    return tokens
+    return get_default_normalizer().normalize_surface(string)
@@ -0,0 +1,168 @@
+import heapq
+import os
+import tempfile
+from array import array
+from itertools import repeat
+from operator import itemgetter
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..models.vocabulary import ID_TYPECODE
+
+ID_SIZE = array(ID_TYPECODE).itemsize
+LIST_OVERHEAD = 128  # Approximate bytes taken by a buffered posting list besides its ids
+LENGTH_TYPECODE = "L"  # Typecode of the array of posting list lengths
+
+
+def write_posting_list(file: BinaryIO, keyword_id: int, docs: array) -> None:
+    """Appends a posting list to a run file, as its keyword id and length followed by its document ids.
+
+    Args:
+        file: Run file, opened for writing in binary mode
+        keyword_id: Id of the keyword
+        docs: Document ids of the keyword, in increasing order
+    """
+
+    array(ID_TYPECODE, (keyword_id, len(docs))).tofile(file)
+    docs.tofile(file)
+
+
+def read_posting_lists(path: str) -> Iterator[Tuple[int, array]]:
+    """Reads the posting lists of a run file written by `write_posting_list`.
+
+    Args:
+        path: Path of the run file
+
+    Returns:
+        An iterator over tuples of the form (K, D), where — K is a keyword id and D are its document ids, in the order they were written.
+    """
+
+    with open(path, "rb") as file:
+        while True:
+            header = array(ID_TYPECODE)
+            try:
+                header.fromfile(file, 2)
+            except EOFError:
+                return
+            keyword_id, length = header
+            docs = array(ID_TYPECODE)
+            docs.fromfile(file, length)
+            yield keyword_id, docs
+
+
+class PostingRuns:
+    """Posting lists that are buffered in memory up to a budget and spilled to temporary files as sorted runs, for rooms whose inverted index doesn't fit in memory.
+
+    Document ids must be added in increasing order, e.g. chunk by chunk. Whenever the buffer exceeds `memory_budget`, its posting lists are written to a new run file in order of keyword id. Iterating k-way merges the runs, and the buffer as the last run, back into complete posting lists, holding one posting list per run at a time. Runs are stored in a temporary directory, which is removed by `close`.
+
+    Args:
+        memory_budget: Approximate number of bytes the buffered posting lists may take
+        directory: Directory in which the temporary directory is created. Defaults to the system's temporary directory
+
+    Attributes:
+        memory_budget: Approximate number of bytes the buffered posting lists may take
+        lengths: Total length of the posting list of each keyword id
+        runs: Number of runs spilled so far
+
+    Examples:
+        >>> with PostingRuns(2**28) as runs:
+        ...     runs.extend(keyword_id, docs)
+        ...     for keyword_id, docs in runs:
+        ...         ...
+    """
+
+    memory_budget: int
+    lengths: array
+    runs: int
+
+    __directory: tempfile.TemporaryDirectory
+    __buffer: Dict[int, array]
+    __buffered: int
+
+    def __init__(self, memory_budget: int, directory: Optional[str] = None):
+        self.memory_budget = memory_budget
+        self.lengths = array(LENGTH_TYPECODE)
+        self.runs = 0
+        self.__directory = tempfile.TemporaryDirectory(prefix="runs-",
+                                                       dir=directory)
+        self.__buffer = {}
+        self.__buffered = 0
+
+    def extend(self, keyword_id: int, docs: array) -> None:
+        """Appends document ids to the posting list of a keyword.
+
+        Args:
+            keyword_id: Id of the keyword
+            docs: Document ids, greater than all ids added before
+        """
+
+        if keyword_id >= len(self.lengths):
+            self.lengths.extend(repeat(0, keyword_id + 1 - len(self.lengths)))
+        self.lengths[keyword_id] += len(docs)
+
+        buffered = self.__buffer.get(keyword_id)
+        if buffered is None:
+            self.__buffer[keyword_id] = array(ID_TYPECODE, docs)
+            self.__buffered += LIST_OVERHEAD
+        else:
+            buffered.extend(docs)
+        self.__buffered += ID_SIZE * len(docs)
+        if self.__buffered > self.memory_budget:
+            self.spill()
+
+    def spill(self) -> None:
+        """Writes the buffered posting lists to a new run file and empties the buffer."""
+
+        if not self.__buffer:
+            return
+        with open(self.path(f"run{self.runs}"), "wb") as file:
+            for keyword_id in sorted(self.__buffer):
+                write_posting_list(file, keyword_id, self.__buffer[keyword_id])
+        self.runs += 1
+        self.__buffer = {}
+        self.__buffered = 0
+
+    def path(self, name: str) -> str:
+        """Returns the path of a file in the temporary directory, e.g. for further runs.
+
+        Args:
+            name: Name of the file
+        """
+
+        return os.path.join(self.__directory.name, name)
+
+    def close(self) -> None:
+        """Removes the temporary directory and everything in it."""
+
+        self.__buffer = {}
+        self.__buffered = 0
+        self.__directory.cleanup()
+
+    def __iter__(self) -> Iterator[Tuple[int, array]]:
+        """Merges the runs into complete posting lists, in order of keyword id.
+
+        Returns:
+            An iterator over tuples of the form (K, D), where — K is a keyword id and D are all of its document ids, in increasing order.
+        """
+
+        # Runs hold increasing document ids, and merging is stable
+        runs: List[Iterable[Tuple[int, array]]] = [
+            read_posting_lists(self.path(f"run{i}")) for i in range(self.runs)
+        ]
+        runs.append(sorted(self.__buffer.items()))
+
+        keyword_id, docs = -1, array(ID_TYPECODE)
+        for next_id, next_docs in heapq.merge(*runs, key=itemgetter(0)):
+            if next_id == keyword_id:
+                docs.extend(next_docs)
+                continue
+            if keyword_id >= 0:
+                yield keyword_id, docs
+            keyword_id, docs = next_id, next_docs
+        if keyword_id >= 0:
+            yield keyword_id, docs
+
+    def __enter__(self) -> "PostingRuns":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
@@ -2,12 +2,13 @@ import asyncio
 import json
 from typing import Iterable, List, Set, Tuple
 
-from nio import AsyncClient, RoomMessagesError, RoomMessageText
+from nio import AsyncClient, RoomMessagesError, RoomMessageText, RoomSendError
 
+from encrypted_search.exceptions import TransientUploadError
 from encrypted_search.index import EncryptedIndex
 from encrypted_search.search import EncryptedSearch
 from encrypted_search.storage import IndexStorage
-from encrypted_search.types import Event, LookupTable
+from encrypted_search.types import Event, FileData, LookupTable
 
 HOMESERVER = "https://matrix.org"
 USER = "@burgers:matrix.org"
@@ -17,6 +18,8 @@ SOURCE_ROOM = "!vQWVXkEbAIxqvhOGmF:matrix.org"  # Room to be indexed
 DESTINATION_ROOM = "!zzqwCHxHhBvTXwkRZm:matrix.org"  # Room to store index in
 N = 20  # Number of messages to index
 DOCUMENT_SIZE = 5000  # Maximum size of each document in database
+UPLOADS_IN_FLIGHT = 4  # Maximum number of documents being uploaded at a time
+TRANSIENT_ERRCODES = {"M_LIMIT_EXCEEDED"}  # Errors worth retrying, besides 5xx
 
 SEARCH_QUERIES = [
     "matrix",
@@ -25,6 +28,22 @@ SEARCH_QUERIES = [
 ]
 
 
+def is_transient(response: RoomSendError) -> bool:
+    """Tells whether a failed send is worth retrying, i.e. whether it was rate limited or failed on the side of the homeserver.
+
+    Args:
+        response: Error response of the homeserver
+
+    Returns:
+        Whether the send may succeed if retried.
+    """
+
+    if response.status_code in TRANSIENT_ERRCODES:
+        return True
+    transport_response = response.transport_response
+    return transport_response is not None and transport_response.status >= 500
+
+
 async def login() -> Tuple[AsyncClient, str]:
     """Logs in a Nio client with provided `USER` and `PASSWORD` and syncs up with current state.
 
@@ -109,8 +128,8 @@ async def create_and_upload_index(
     # Prepare the index for upload
     upload_ready_index = IndexStorage(encrypted_index, DOCUMENT_SIZE)
 
-    # Upload each file and save the generated uri in the lookup table
-    for file_data, callback in upload_ready_index:
+    # Upload files concurrently and save the generated uris in the lookup table
+    async def upload(file_data: FileData) -> str:
         response = await client.room_send(
             room_id=DESTINATION_ROOM,
             message_type="m.room.message",
@@ -119,7 +138,16 @@ async def create_and_upload_index(
                 "body": json.dumps(file_data)
             },
         )
-        callback(response.event_id)
+        if isinstance(response, RoomSendError):
+            if is_transient(response):
+                raise TransientUploadError(response.message)
+            # Permanent errors, e.g. M_FORBIDDEN or M_TOO_LARGE, fail the upload right away
+            raise RuntimeError(
+                f"Upload failed with {response.status_code}: {response.message}"
+            )
+        return response.event_id
+
+    await upload_ready_index.upload_all(upload, concurrency=UPLOADS_IN_FLIGHT)
 
     # Update the lookup table
     upload_ready_index.update_lookup_table()
@@ -0,0 +1,105 @@
+import unittest
+
+from encrypted_search.advisor import ParameterAdvisor
+from encrypted_search.index import EncryptedIndex
+
+from .utils.test_helpers import get_test_data
+
+
+class ParameterAdvisorTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.events = get_test_data("index/distribute", "real")["events"]
+        self.advisor = ParameterAdvisor.from_events(self.events)
+
+    def test_evaluate(self):
+        documents, keywords = EncryptedIndex.parse(self.events)
+        inverted_index = EncryptedIndex.invert(documents, keywords)
+        for s in range(1, 5):
+            for L in (1, 2):
+                levels = EncryptedIndex([], s=s,
+                                        L=L).calc_params(inverted_index)
+
+                # Whole levels are stored in a file each
+                whole = self.advisor.evaluate(s, L, cutoff_size=2**30)
+                self.assertEqual(len(levels), whole.levels)
+                self.assertEqual(whole.levels, whole.files)
+                self.assertEqual(1, whole.files_per_query)
+                self.assertEqual(1, whole.max_files_per_query)
+
+                # Split levels take more files, but less bytes per query
+                split = self.advisor.evaluate(s, L, cutoff_size=2**6)
+                self.assertGreater(split.files, whole.files)
+                self.assertLess(split.bytes_per_query, whole.bytes_per_query)
+                self.assertLessEqual(split.max_files_per_query, split.files)
+                self.assertLessEqual(split.bytes_per_query, split.storage)
+
+    def test_queries(self):
+        advisor = ParameterAdvisor.from_events(self.events,
+                                               queries=["unindexed"])
+
+        estimate = advisor.evaluate(2, 1, 2**10)
+
+        self.assertEqual(0, estimate.files_per_query)
+        self.assertEqual(0, estimate.bytes_per_query)
+        self.assertGreater(estimate.files, 0)
+
+    def test_room_size(self):
+        events = get_test_data("integration", "multiple")["events"]
+        sample = events[0] + events[1]
+        # A room in which every posting list is 8 times longer than in the sample
+        room = [
+            dict(event, event_id=f"{event['event_id'][:-1]}{copy}")
+            for copy in range(8) for event in sample
+        ]
+        advisor = ParameterAdvisor.from_events(sample, room_size=len(room))
+        room_advisor = ParameterAdvisor.from_events(room)
+
+        for s, L in ((1, 1), (2, 1), (3, 2)):
+            # Far smaller files hold fewer event ids than the scale suggests, since brackets don't scale
+            for cutoff_size in (2**12, 2**14):
+                estimate = advisor.evaluate(s, L, cutoff_size)
+                expected = room_advisor.evaluate(s, L, cutoff_size)
+
+                self.assertEqual(cutoff_size, estimate.cutoff_size)
+                self.assertEqual(expected.levels, estimate.levels)
+                self.assertAlmostEqual(expected.files,
+                                       estimate.files,
+                                       delta=0.15 * expected.files)
+                self.assertAlmostEqual(expected.storage,
+                                       estimate.storage,
+                                       delta=0.05 * expected.storage)
+                self.assertAlmostEqual(expected.files_per_query,
+                                       estimate.files_per_query,
+                                       delta=0.15)
+
+    def test_recommend(self):
+        estimates = self.advisor.evaluate_all(s_values=(1, 2, 4),
+                                              L_values=(1, 2),
+                                              cutoff_sizes=(2**6, 2**12))
+        self.assertEqual(3 * 2 * 2, len(estimates))
+
+        latency = self.advisor.recommend("latency", estimates=estimates)
+        self.assertEqual(min(e.files_per_query for e in estimates),
+                         latency.files_per_query)
+
+        storage = self.advisor.recommend("storage", estimates=estimates)
+        self.assertEqual(min(e.storage for e in estimates), storage.storage)
+
+        limited = self.advisor.recommend(
+            "latency",
+            max_bytes_per_query=min(e.bytes_per_query for e in estimates),
+            estimates=estimates)
+        self.assertEqual(min(e.bytes_per_query for e in estimates),
+                         limited.bytes_per_query)
+
+        with self.assertRaises(ValueError):
+            self.advisor.recommend("storage",
+                                   max_storage=0,
+                                   estimates=estimates)
+        with self.assertRaises(ValueError):
+            self.advisor.recommend("throughput", estimates=estimates)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import random
+import unittest
+from collections import Counter
+from math import sqrt
+
+from encrypted_search.utils.bucket_capacities import LINEAR_SCAN_LIMIT, BucketCapacities
+
+
+def chi_square_critical(df: int, z: float = 3.29) -> float:
+    """Wilson–Hilferty approximation of the chi-square quantile of `df` degrees of freedom, at the normal quantile `z` (p ≈ 0.0005 by default)."""
+
+    return df * (1 - 2 / (9 * df) + z * sqrt(2 / (9 * df)))**3
+
+
+class BucketCapacitiesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rng = random.Random(0)
+
+    def random_capacities(self, n: int):
+        return [self.rng.randrange(0, 64) for _ in range(n)]
+
+    def test_matches_scan(self):
+        for n in (LINEAR_SCAN_LIMIT // 2, LINEAR_SCAN_LIMIT * 4):
+            capacities = self.random_capacities(n)
+            bucket_capacities = BucketCapacities(capacities)
+
+            for _ in range(1000):
+                length = self.rng.randrange(1, 64)
+                possible_buckets = [
+                    index for index, capacity in enumerate(capacities)
+                    if capacity >= length
+                ]
+                self.assertEqual(
+                    len(possible_buckets),
+                    bucket_capacities.count_at_least(length),
+                )
+                if not possible_buckets:
+                    with self.assertRaises(IndexError):
+                        bucket_capacities.choose(length, self.rng.randrange)
+                    continue
+
+                chosen_bucket = bucket_capacities.choose(
+                    length, self.rng.randrange)
+                self.assertIn(chosen_bucket, possible_buckets)
+
+                # Place a chunk now and then, so that capacities don't run out at once
+                if self.rng.random() < 0.1:
+                    bucket_capacities.fill(chosen_bucket, length)
+                    capacities[chosen_bucket] -= length
+                self.assertEqual(capacities[chosen_bucket],
+                                 bucket_capacities[chosen_bucket])
+
+    def test_uniform_choice(self):
+        for n in (LINEAR_SCAN_LIMIT // 2, LINEAR_SCAN_LIMIT * 4):
+            capacities = self.random_capacities(n)
+            bucket_capacities = BucketCapacities(capacities)
+            # Move buckets between groups, so that the tree is exercised after updates
+            for bucket in range(0, n, 3):
+                bucket_capacities.fill(bucket, capacities[bucket] // 2)
+                capacities[bucket] -= capacities[bucket] // 2
+
+            length = 20
+            possible_buckets = [
+                index for index, capacity in enumerate(capacities)
+                if capacity >= length
+            ]
+            draws = 200 * len(possible_buckets)
+            counts = Counter(
+                bucket_capacities.choose(length, self.rng.randrange)
+                for _ in range(draws))
+
+            self.assertEqual(set(possible_buckets), set(counts))
+            expected = draws / len(possible_buckets)
+            chi_square = sum((counts[bucket] - expected)**2 / expected
+                             for bucket in possible_buckets)
+            self.assertLess(chi_square,
+                            chi_square_critical(len(possible_buckets) - 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
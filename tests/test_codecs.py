@@ -0,0 +1,106 @@
+import json
+import unittest
+
+from encrypted_search.exceptions import FileFormatError
+from encrypted_search.utils.codecs import (
+    BLOB_CODEC,
+    CODECS,
+    COMPRESSIONS,
+    JSON_CODEC,
+    BlobBucket,
+    compress,
+    decode_file,
+    decompress,
+)
+
+
+class CodecsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        event_id1 = '$2c0y92QwXRjRAcKbZ2MK2QR4kMxxHSlACrFrtz0A0HE'
+        event_id2 = '$A0TaO8FhcLKym6An3fSnA_rU1P9oODG5JxNjLomITVE'
+        self.level = [
+            [event_id1, event_id2, event_id1],
+            [],
+            [event_id2, '$ünïcödé'],
+        ]
+        self.bucket = [event_id2, event_id1, event_id2, event_id2]
+
+    def test_round_trip(self):
+        for codec in CODECS.values():
+            for file_data in (self.level, self.bucket, [], [[]] * 3):
+                decoded = codec.decode(codec.encode(file_data))
+                if codec is BLOB_CODEC:
+                    decoded = decoded.tolist()
+                self.assertEqual(file_data, decoded)
+
+    def test_json_codec(self):
+        self.assertEqual(
+            json.dumps(self.level).encode(), JSON_CODEC.encode(self.level))
+
+    def test_blob_reads(self):
+        level = BLOB_CODEC.decode(BLOB_CODEC.encode(self.level))
+        self.assertEqual(3, len(level))
+        self.assertIsInstance(level[0], BlobBucket)
+        self.assertEqual(self.level[0][1:3], level[0][1:3])
+        self.assertEqual(self.level[2][-1], level[-1][-1])
+        self.assertEqual([], level[1][0:5])
+        self.assertEqual(self.level[0][::2], level[0][::2])
+        with self.assertRaises(IndexError):
+            level[3]
+        with self.assertRaises(IndexError):
+            level[1][0]
+
+        bucket = BLOB_CODEC.decode(BLOB_CODEC.encode(self.bucket))
+        self.assertEqual(4, len(bucket))
+        self.assertIsInstance(bucket[0], str)
+        self.assertEqual(self.bucket[1:10], bucket[1:10])
+
+    def test_blob_size(self):
+        level = [self.level[0] * 10] * 10
+        self.assertLess(len(BLOB_CODEC.encode(level)),
+                        len(JSON_CODEC.encode(level)) / 4)
+
+    def test_blob_encoded_size(self):
+        for file_data, buckets in ((self.level, self.level), (self.bucket,
+                                                              [self.bucket]),
+                                   ([], [[]]), ([[]] * 3, [[]] * 3)):
+            id_sizes = [
+                len(event_id.encode()) for event_id in set().union(*buckets)
+            ]
+            self.assertEqual(
+                len(BLOB_CODEC.encode(file_data)),
+                BLOB_CODEC.encoded_size(len(buckets), sum(map(len, buckets)),
+                                        id_sizes))
+
+    def test_invalid_blob(self):
+        data = BLOB_CODEC.encode(self.level)
+        for invalid in (b"", JSON_CODEC.encode(self.level), data[:-1],
+                        data + b"0"):
+            with self.assertRaises(FileFormatError):
+                BLOB_CODEC.decode(invalid)
+
+    def test_decode_file(self):
+        self.assertEqual(
+            self.bucket, decode_file(JSON_CODEC.encode(self.bucket),
+                                     JSON_CODEC))
+        self.assertIs(self.bucket, decode_file(self.bucket, BLOB_CODEC))
+
+    def test_compression(self):
+        for compression in COMPRESSIONS:
+            for codec in CODECS.values():
+                data = codec.encode(self.level)
+                compressed = compress(data, compression)
+                self.assertEqual(data, decompress(compressed))
+                decoded = decode_file(compressed, codec)
+                if codec is BLOB_CODEC:
+                    decoded = decoded.tolist()
+                self.assertEqual(self.level, decoded)
+                self.assertEqual(data, decompress(data))
+
+        with self.assertRaises(ValueError):
+            compress(b"[]", "zip")
+
+
+if __name__ == "__main__":
+    unittest.main()
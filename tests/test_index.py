@@ -1,11 +1,53 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
 import unittest
+from math import ceil, log
+from typing import List
+from unittest.mock import patch
 
-from encrypted_search.index import EncryptedIndex
+from encrypted_search.exceptions import IndexCapacityError
+from encrypted_search.index import EncryptedIndex, _fill_level
+from encrypted_search.models.build_stats import BuildStats
+from encrypted_search.models.vocabulary import Vocabulary
+from encrypted_search.types import Event
+from encrypted_search.utils.keyed_random import KeyedRandom
 
-from .utils.serializers import levels_to_json
+from .utils.deserializers import index_from_json
+from .utils.serializers import datastore_to_json, levels_to_json, lookup_table_to_json
 from .utils.test_helpers import get_test_data
 
 
+def generate_events(n: int) -> List[Event]:
+    """Generates `n` messages of words drawn from a small, skewed vocabulary."""
+
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(50)]
+    weights = [1 / rank for rank in range(1, 51)]
+    return [{
+        "type": "m.room.message",
+        "event_id": f"$event{i}",
+        "content": {
+            "body": " ".join(rng.choices(words, weights, k=6))
+        },
+    } for i in range(n)]
+
+
+def read_documents(encrypted_index: EncryptedIndex, keyword: str) -> List[str]:
+    """Reads the event ids of a keyword from the local datastore."""
+
+    return [
+        event_id for location in encrypted_index.lookup_table[keyword]
+        for event_id in encrypted_index.datastore[location.level_index][
+            location.bucket_index]
+        [location.start_of_chunk:location.start_of_chunk +
+         location.chunk_length]
+    ]
+
+
 class EncryptedIndexTest(unittest.TestCase):
 
     def test_parse(self):
@@ -30,6 +72,77 @@ class EncryptedIndexTest(unittest.TestCase):
             self.assertEqual(documents, expected_documents)
             self.assertEqual(keywords, expected_keywords)
 
+    def test_build_postings(self):
+        cases = (
+            "basic",  # Basic tokenization
+            "punctuation",  # Remove punctuation
+            "case_insensitive",  # Ignore case
+            "other_events",  # Ignore other events
+            "stopwords",  # Exclude stopwords
+        )
+        for case_name in cases:
+            raw_test_data = get_test_data("index/parse", case_name)
+            events = raw_test_data["events"]
+            documents = {
+                k: set(v)
+                for k, v in raw_test_data["documents"].items()
+            }
+            keywords = set(raw_test_data["keywords"])
+            expected_inverted_index = EncryptedIndex.invert(
+                documents, keywords)
+
+            keyword_ids, document_ids = Vocabulary(), Vocabulary()
+            postings = EncryptedIndex.build_postings(
+                (event for event in events + events),  # Repeated, streamed
+                keyword_ids,
+                document_ids,
+                chunk_size=2,
+            )
+
+            self.assertEqual(
+                expected_inverted_index,
+                {
+                    keyword_ids[keyword_id]: set(document_ids.lookup(docs))
+                    for keyword_id, docs in postings.items()
+                },
+            )
+            self.assertEqual(keywords, set(keyword_ids))
+            for docs in postings.values():
+                self.assertEqual(sorted(set(docs)), list(docs))
+
+    def test_build_postings_in_parallel(self):
+        events = (
+            get_test_data("integration/single/keyword", "large")["events"] +
+            get_test_data("index/parse", "other_events")["events"])
+        serial_keyword_ids, serial_document_ids = Vocabulary(), Vocabulary()
+        serial_postings = EncryptedIndex.build_postings(
+            events, serial_keyword_ids, serial_document_ids)
+
+        for workers, chunk_size in ((2, 1), (2, 7), (3, 1000)):
+            keyword_ids, document_ids = Vocabulary(), Vocabulary()
+            postings = EncryptedIndex.build_postings(
+                iter(events),
+                keyword_ids,
+                document_ids,
+                workers=workers,
+                chunk_size=chunk_size,
+            )
+
+            self.assertEqual(list(serial_keyword_ids), list(keyword_ids))
+            self.assertEqual(list(serial_document_ids), list(document_ids))
+            self.assertEqual(serial_postings, postings)
+
+    def test_lazy_multiprocessing_import(self):
+        code = ("import sys, encrypted_search.index\n"
+                "print('multiprocessing' in sys.modules)")
+
+        output = subprocess.run([sys.executable, "-c", code],
+                                capture_output=True,
+                                text=True,
+                                check=True).stdout
+
+        self.assertEqual("False", output.strip())
+
     def test_invert(self):
         cases = (
             "basic",  # Trivial example
@@ -111,6 +224,325 @@ class EncryptedIndexTest(unittest.TestCase):
                                     level_info["large_bucket_size"],
                                 )
 
+    def test_level_assignment(self):
+        events = get_test_data("index/distribute", "real")["events"]
+        documents, keywords = EncryptedIndex.parse(events)
+        inverted_index = EncryptedIndex.invert(documents, keywords)
+        for s in range(1, 5):
+            for L in range(1, 3):
+                encrypted_index = EncryptedIndex(events, s=s, L=L)
+                levels = encrypted_index._EncryptedIndex__levels
+
+                for keyword, locations in encrypted_index.lookup_table.items():
+                    n = len(inverted_index[keyword])
+                    level_index = min(l for l in levels if l >= log(n / L, 2))
+                    self.assertEqual(
+                        ceil(n / levels[level_index].large_chunk_size),
+                        len(locations),
+                    )
+                    for location in locations:
+                        self.assertEqual(level_index, location.level_index)
+
+    def test_distribute_in_parallel(self):
+        events = get_test_data("index/distribute", "real")["events"]
+        for s in (2, 4):
+            for L in (1, 2):
+                serial_index = EncryptedIndex(events,
+                                              s=s,
+                                              L=L,
+                                              rng=KeyedRandom(3))
+                parallel_index = EncryptedIndex(events,
+                                                s=s,
+                                                L=L,
+                                                workers=3,
+                                                rng=KeyedRandom(3))
+
+                self.assertEqual(
+                    datastore_to_json(serial_index.datastore),
+                    datastore_to_json(parallel_index.datastore),
+                )
+                self.assertEqual(
+                    lookup_table_to_json(serial_index.lookup_table),
+                    lookup_table_to_json(parallel_index.lookup_table),
+                )
+
+    def test_out_of_core_build(self):
+        events = generate_events(400)
+        for workers in (1, 2):
+            in_memory_stats, out_of_core_stats = BuildStats(), BuildStats()
+            in_memory_index = EncryptedIndex(events,
+                                             rng=KeyedRandom(5),
+                                             stats=in_memory_stats)
+            with tempfile.TemporaryDirectory() as directory:
+                out_of_core_index = EncryptedIndex(
+                    iter(events),
+                    rng=KeyedRandom(5),
+                    stats=out_of_core_stats,
+                    workers=workers,
+                    chunk_size=50,
+                    memory_budget=2**12,
+                    temp_dir=directory,
+                )
+                self.assertEqual([], os.listdir(directory))
+
+            self.assertEqual(in_memory_index.keywords,
+                             out_of_core_index.keywords)
+            self.assertEqual(in_memory_index.size, out_of_core_index.size)
+            self.assertEqual(
+                datastore_to_json(in_memory_index.datastore),
+                datastore_to_json(out_of_core_index.datastore),
+            )
+            self.assertEqual(
+                lookup_table_to_json(in_memory_index.lookup_table),
+                lookup_table_to_json(out_of_core_index.lookup_table),
+            )
+            self.assertEqual(in_memory_stats.chunks, out_of_core_stats.chunks)
+            self.assertEqual(in_memory_stats.posting_list_lengths,
+                             out_of_core_stats.posting_list_lengths)
+
+            # Out-of-core indices can be updated like any other
+            out_of_core_index.delete_events(["$event0"])
+            self.assertIn("$event0", out_of_core_index.tombstones)
+
+    def test_seeded_build(self):
+        events = get_test_data("index/distribute", "real")["events"]
+
+        def build(seed):
+            encrypted_index = EncryptedIndex(events, rng=KeyedRandom(seed))
+            return (
+                json.dumps(datastore_to_json(encrypted_index.datastore)),
+                json.dumps(lookup_table_to_json(encrypted_index.lookup_table)),
+            )
+
+        self.assertEqual(build(7), build(7))
+        self.assertNotEqual(build(7), build(8))
+
+    def test_add_events(self):
+        events = generate_events(400)
+        complete_index = EncryptedIndex(events)
+        encrypted_index = EncryptedIndex(events[:300], rng=KeyedRandom(1))
+        datastore = datastore_to_json(encrypted_index.datastore)
+
+        update = encrypted_index.add_events(events)
+
+        self.assertEqual(complete_index.keywords, encrypted_index.keywords)
+        self.assertEqual(complete_index.size, encrypted_index.size)
+        for keyword in complete_index.keywords:
+            self.assertEqual(
+                read_documents(complete_index, keyword),
+                read_documents(encrypted_index, keyword),
+            )
+        self.assertEqual(100, update.documents)
+
+        # Exactly the reported buckets changed
+        changed_buckets = {}
+        for level_index, level in datastore_to_json(
+                encrypted_index.datastore).items():
+            for b, bucket in enumerate(level):
+                if bucket != datastore[level_index][b]:
+                    changed_buckets.setdefault(int(level_index), set()).add(b)
+        self.assertEqual(changed_buckets, update.buckets)
+        self.assertEqual(set(changed_buckets), update.levels)
+        for keyword in update.keywords:
+            self.assertTrue(
+                any(location.bucket_index in changed_buckets[
+                    location.level_index]
+                    for location in encrypted_index.lookup_table[keyword]))
+
+        # Known events are skipped
+        datastore = datastore_to_json(encrypted_index.datastore)
+        self.assertFalse(encrypted_index.add_events(events))
+        self.assertEqual(datastore,
+                         datastore_to_json(encrypted_index.datastore))
+
+    def test_add_events_locality(self):
+        events = generate_events(1050)
+        complete_index = EncryptedIndex(events, L=1)
+        encrypted_index = EncryptedIndex(events[:1000],
+                                         L=1,
+                                         rng=KeyedRandom(1))
+        levels = encrypted_index._EncryptedIndex__levels
+
+        for i in range(1000, 1050, 10):
+            encrypted_index.add_events(events[i:i + 10])
+
+        for keyword, locations in encrypted_index.lookup_table.items():
+            n = sum(location.chunk_length for location in locations)
+            chunk_size = levels[locations[0].level_index].large_chunk_size
+            self.assertLessEqual(len(locations), ceil(n / chunk_size))
+            self.assertEqual(
+                sorted(read_documents(complete_index, keyword)),
+                sorted(read_documents(encrypted_index, keyword)),
+            )
+
+    def test_add_events_over_capacity(self):
+        events = generate_events(400)
+        encrypted_index = EncryptedIndex(events[:50], s=1)
+        datastore = datastore_to_json(encrypted_index.datastore)
+        lookup_table = lookup_table_to_json(encrypted_index.lookup_table)
+
+        with self.assertRaises(IndexCapacityError):
+            encrypted_index.add_events(events)
+
+        self.assertEqual(datastore,
+                         datastore_to_json(encrypted_index.datastore))
+        self.assertEqual(lookup_table,
+                         lookup_table_to_json(encrypted_index.lookup_table))
+
+        encrypted_index = index_from_json({
+            "s": 2,
+            "L": 1,
+            "keywords": [],
+            "datastore": {
+                "1": [["$event0"], []]
+            },
+            "lookup_table": {},
+        })
+        with self.assertRaises(TypeError):
+            encrypted_index.add_events(events)
+
+    def test_delete_events(self):
+        events = generate_events(400)
+        encrypted_index = EncryptedIndex(events, rng=KeyedRandom(1))
+        datastore = datastore_to_json(encrypted_index.datastore)
+        deleted = {f"$event{i}" for i in range(0, 400, 50)}
+
+        update = encrypted_index.delete_events(list(deleted) + ["$unknown"],
+                                               compaction_ratio=1)
+
+        # Deleted events are tombstoned, without changing the datastore
+        self.assertEqual(len(deleted), update.deleted)
+        self.assertEqual({}, update.buckets)
+        self.assertEqual(datastore,
+                         datastore_to_json(encrypted_index.datastore))
+        self.assertEqual(len(deleted), len(encrypted_index.tombstones))
+        for event_id in deleted:
+            self.assertIn(event_id, encrypted_index.tombstones)
+        self.assertFalse(encrypted_index.delete_events(deleted))
+
+    def test_delete_events_with_compaction(self):
+        events = generate_events(400)
+        complete_index = EncryptedIndex(events)
+        encrypted_index = EncryptedIndex(events, rng=KeyedRandom(1))
+        datastore = datastore_to_json(encrypted_index.datastore)
+        # Messages with rare words make up more of the lower levels
+        rare_words = {f"word{i}" for i in range(45, 50)}
+        deleted = {
+            event["event_id"]
+            for event in events
+            if rare_words.intersection(event["content"]["body"].split())
+        }
+
+        update = encrypted_index.delete_events(deleted, compaction_ratio=0.18)
+
+        # Compacted levels no longer hold deleted events
+        self.assertEqual({5}, update.levels)
+        for keyword in complete_index.keywords:
+            live = [
+                event_id
+                for event_id in read_documents(complete_index, keyword)
+                if event_id not in deleted
+            ]
+            if not live:
+                self.assertNotIn(keyword, encrypted_index.keywords)
+                self.assertNotIn(keyword, encrypted_index.lookup_table)
+                self.assertIn(keyword, update.keywords)
+                continue
+            documents = read_documents(encrypted_index, keyword)
+            level_index = encrypted_index.lookup_table[keyword][0].level_index
+            if level_index in update.levels:
+                self.assertEqual(sorted(live), sorted(documents))
+            else:
+                self.assertEqual(read_documents(complete_index, keyword),
+                                 documents)
+        self.assertEqual(
+            sum(
+                len(read_documents(encrypted_index, keyword))
+                for keyword in encrypted_index.keywords),
+            encrypted_index.size,
+        )
+
+        # Exactly the other levels are unchanged
+        for level_index, level in datastore_to_json(
+                encrypted_index.datastore).items():
+            self.assertEqual(
+                int(level_index) not in update.levels,
+                level == datastore[level_index],
+            )
+
+        # Only events in uncompacted levels are still tombstoned
+        held = {
+            event_id
+            for level_index, level in encrypted_index.datastore.items()
+            for bucket in level for event_id in bucket
+        }
+        self.assertEqual(len(deleted & held), len(encrypted_index.tombstones))
+        for event_id in deleted & held:
+            self.assertIn(event_id, encrypted_index.tombstones)
+
+    def test_delete_events_over_capacity(self):
+        events = generate_events(400)
+        encrypted_index = EncryptedIndex(events, rng=KeyedRandom(1))
+        datastore = datastore_to_json(encrypted_index.datastore)
+        lookup_table = lookup_table_to_json(encrypted_index.lookup_table)
+        keywords, size = set(encrypted_index.keywords), encrypted_index.size
+        deleted = [f"$event{i}" for i in range(0, 400, 2)]
+
+        # Compact the first level, then fail to place the second one
+        placements = []
+
+        def fill_level(*args):
+            if placements:
+                raise IndexError("No bucket has enough capacity")
+            placements.append(_fill_level(*args))
+            return placements[-1]
+
+        with patch("encrypted_search.index._fill_level", fill_level):
+            with self.assertRaises(IndexCapacityError):
+                encrypted_index.delete_events(deleted, compaction_ratio=0)
+
+        self.assertEqual(datastore,
+                         datastore_to_json(encrypted_index.datastore))
+        self.assertEqual(lookup_table,
+                         lookup_table_to_json(encrypted_index.lookup_table))
+        self.assertEqual(keywords, encrypted_index.keywords)
+        self.assertEqual(size, encrypted_index.size)
+        self.assertEqual(0, len(encrypted_index.tombstones))
+        self.assertEqual(len(deleted),
+                         encrypted_index.delete_events(deleted).deleted)
+
+    def test_build_stats(self):
+        events = get_test_data("index/distribute", "real")["events"]
+        phases = []
+        stats = BuildStats(on_phase=lambda name, _: phases.append(name))
+
+        encrypted_index = EncryptedIndex(events, stats=stats)
+
+        self.assertIsNone(EncryptedIndex(events).stats)
+        self.assertEqual(["parse", "calc_params", "distribute"], phases)
+        self.assertEqual(set(phases), set(stats.seconds))
+        self.assertEqual(len(events), stats.events)
+        self.assertEqual(len(encrypted_index.keywords), stats.keywords)
+        self.assertEqual(encrypted_index.size, stats.tokens)
+        self.assertEqual(stats.keywords,
+                         sum(stats.posting_list_lengths.values()))
+
+        locations = [
+            location for locations in encrypted_index.lookup_table.values()
+            for location in locations
+        ]
+        self.assertEqual(len(locations), sum(stats.chunks.values()))
+        for level_index in encrypted_index.datastore:
+            self.assertGreaterEqual(stats.candidate_buckets[level_index],
+                                    stats.chunks[level_index])
+            self.assertLessEqual(stats.level_fill[level_index], 1)
+        self.assertAlmostEqual(
+            stats.tokens,
+            sum(stats.level_fill[l] *
+                encrypted_index._EncryptedIndex__levels[l].array_size
+                for l in stats.level_fill),
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
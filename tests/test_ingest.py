@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import unittest
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.ingest import read_ndjson, stale_event_ids
+
+from .utils.test_helpers import get_test_data
+
+
+class IngestTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "export.ndjson")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write_lines(self, lines):
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines))
+
+    def test_read_ndjson(self):
+        events = get_test_data("index/parse", "other_events")["events"]
+        events.append({
+            "event_id": "6",
+            "type": "m.reaction",
+            "content": {
+                "body": "not a m.room.message"
+            },
+        })
+        self.write_lines([json.dumps(event) for event in events] + [""])
+
+        read_events = list(read_ndjson(self.path))
+
+        self.assertEqual(
+            [{
+                "type": "m.room.message",
+                "event_id": event["event_id"],
+                "content": {
+                    "body": event["content"]["body"]
+                },
+            } for event in events[:3]],
+            read_events,
+        )
+
+    def test_empty_file(self):
+        self.write_lines([])
+
+        self.assertEqual([], list(read_ndjson(self.path)))
+
+    def test_index_from_ndjson(self):
+        events = get_test_data("integration/single/keyword", "small")["events"]
+        self.write_lines(json.dumps(event) for event in events)
+
+        from_list = EncryptedIndex(events)
+        from_file = EncryptedIndex(read_ndjson(self.path))
+
+        self.assertEqual(from_list.keywords, from_file.keywords)
+        self.assertEqual(from_list.size, from_file.size)
+
+    def test_stale_event_ids(self):
+        events = [
+            {
+                "type": "m.room.redaction",
+                "event_id": "$redaction",
+                "redacts": "$redacted",
+                "content": {},
+            },
+            {
+                "type": "m.room.redaction",
+                "event_id": "$v11_redaction",
+                "content": {
+                    "redacts": "$v11_redacted"
+                },
+            },
+            {
+                "type": "m.room.message",
+                "event_id": "$edit",
+                "content": {
+                    "body": "* fixed",
+                    "m.new_content": {
+                        "body": "fixed"
+                    },
+                    "m.relates_to": {
+                        "rel_type": "m.replace",
+                        "event_id": "$edited",
+                    },
+                },
+            },
+            {
+                "type": "m.room.message",
+                "event_id": "$reply",
+                "content": {
+                    "body": "reply",
+                    "m.relates_to": {
+                        "m.in_reply_to": {
+                            "event_id": "$original"
+                        }
+                    },
+                },
+            },
+            {
+                "type": "m.reaction",
+                "event_id": "$reaction",
+                "content": {
+                    "m.relates_to": {
+                        "rel_type": "m.annotation",
+                        "event_id": "$original",
+                        "key": "👍",
+                    }
+                },
+            },
+        ]
+
+        self.assertEqual(["$redacted", "$v11_redacted", "$edited"],
+                         list(stale_event_ids(events)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ from encrypted_search.index import EncryptedIndex
 from encrypted_search.merge import IndexMerge
 from encrypted_search.search import EncryptedSearch
 from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.codecs import BLOB_CODEC
 
 from .utils.mock_homeserver import MockHomeserver
 from .utils.test_helpers import get_test_data
@@ -194,6 +195,62 @@ class IntegrationTest(unittest.TestCase):
                 f"Search results for '{query}' failed.",
             )
 
+    def test_blob_codec(self):
+        # Reuse test data from `multiple` case
+        raw_test_data = get_test_data("integration", "multiple")
+        expected_search_results = raw_test_data["search_results"]
+        lookup_tables = []
+
+        # Create and upload two indices as blobs
+        for i in range(2):
+            events = raw_test_data["events"][i]
+            encrypted_index = EncryptedIndex(events)
+
+            upload_ready_index = IndexStorage(encrypted_index,
+                                              100,
+                                              codec=BLOB_CODEC)
+            for file_bytes, callback in upload_ready_index:
+                self.assertIsInstance(file_bytes, bytes)
+                mxc_uri = self.homeserver.upload(file_bytes)
+                callback(mxc_uri)
+            upload_ready_index.update_lookup_table()
+            lookup_tables.append(upload_ready_index.lookup_table)
+
+            del encrypted_index, upload_ready_index
+
+        # Merge two indices into one encrypted index
+        index_merger = IndexMerge(lookup_tables, codec=BLOB_CODEC)
+        for mxc_uris, callback in index_merger:
+            for mxc_uri in mxc_uris:
+                callback(mxc_uri, self.homeserver.fetch(mxc_uri))
+        index_merger.distribute_new_index()
+
+        # Upload merged index, streaming
+        upload_ready_index = IndexStorage(index_merger.encrypted_index,
+                                          100,
+                                          streaming=True,
+                                          codec=BLOB_CODEC)
+        for file_bytes, callback in upload_ready_index:
+            callback(self.homeserver.upload(file_bytes))
+        upload_ready_index.update_lookup_table()
+        lookup_table = upload_ready_index.lookup_table
+
+        # Search and assert
+        index_search = EncryptedSearch((lookup_table, ), codec=BLOB_CODEC)
+        for query, expected_result in expected_search_results.items():
+            mxc_uris = index_search.lookup(query)
+            fetched_files = {
+                mxc_uri: self.homeserver.fetch(mxc_uri)
+                for mxc_uri in mxc_uris
+            }
+            search_result = index_search.locate(fetched_files)
+
+            self.assertEqual(
+                set(expected_result),
+                search_result,
+                f"Search results for '{query}' failed.",
+            )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,47 @@
+import hashlib
+import unittest
+from collections import Counter
+
+from encrypted_search.utils.keyed_random import KeyedRandom
+
+
+class KeyedRandomTest(unittest.TestCase):
+
+    def test_reproducible(self):
+        first, second = KeyedRandom(seed=42), KeyedRandom(42)
+        self.assertEqual(
+            [first.randbelow(1000) for _ in range(10000)],
+            [second.randbelow(1000) for _ in range(10000)],
+        )
+        self.assertNotEqual(
+            [KeyedRandom().randbelow(2**32) for _ in range(4)],
+            [KeyedRandom().randbelow(2**32) for _ in range(4)],
+        )
+
+    def test_stream(self):
+        # The first word of a seeded generator is the start of the SHAKE-256 output of the key and batch 0
+        digest = hashlib.shake_256(b"key" + bytes(8)).digest(8)
+        self.assertEqual(int.from_bytes(digest, "big"),
+                         KeyedRandom(b"key").getrandbits(64))
+        self.assertEqual(
+            int.from_bytes(
+                hashlib.shake_256(b"key" + bytes(8)).digest(16), "big") >> 28,
+            KeyedRandom(b"key").getrandbits(100),
+        )
+
+    def test_randbelow(self):
+        rng = KeyedRandom(seed=0)
+        for n in (1, 2, 3, 7, 1000, 2**64 - 1, 2**64, 3**50):
+            for _ in range(50):
+                self.assertTrue(0 <= rng.randbelow(n) < n)
+        with self.assertRaises(ValueError):
+            rng.randbelow(0)
+
+        counts = Counter(rng.randbelow(5) for _ in range(50000))
+        self.assertEqual(set(range(5)), set(counts))
+        for count in counts.values():
+            self.assertAlmostEqual(count / 50000, 1 / 5, delta=0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
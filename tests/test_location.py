@@ -0,0 +1,102 @@
+import unittest
+
+from encrypted_search.exceptions import LocationFormatError
+from encrypted_search.models.location import (
+    RECORD,
+    Location,
+    PackedLocations,
+    pack_lookup_table,
+)
+from encrypted_search.search import EncryptedSearch
+
+from .utils.test_helpers import get_test_data
+
+SERIALIZED_LOCATIONS = (
+    {
+        "is_remote": False,
+        "level_index": 3,
+        "bucket_index": 5,
+        "start_of_chunk": 2,
+        "chunk_length": 8,
+    },
+    {
+        "is_remote": True,
+        "mxc_uri": "mxc://example.org/level",
+        "bucket_index": 0,
+        "start_of_chunk": 0,
+        "chunk_length": 1,
+    },
+    {
+        "is_remote": True,
+        "mxc_uri": "mxc://example.org/bucket",
+        "start_of_chunk": 4,
+        "chunk_length": 4,
+    },
+)
+
+
+class LocationTest(unittest.TestCase):
+
+    def test_json(self):
+        for serialized in SERIALIZED_LOCATIONS:
+            location = Location.from_json(serialized)
+
+            self.assertEqual(serialized, location.to_json())
+            self.assertEqual(location, Location.from_json(serialized))
+            self.assertFalse(hasattr(location, "__dict__"))
+
+        remote = Location.from_json(SERIALIZED_LOCATIONS[2])
+        self.assertIsNone(remote.level_index)
+        self.assertIsNone(remote.bucket_index)
+        self.assertNotEqual(Location.from_json(SERIALIZED_LOCATIONS[1]),
+                            remote)
+
+    def test_missing_data(self):
+        with self.assertRaises(LocationFormatError):
+            Location(True, start_of_chunk=0, chunk_length=1)
+        with self.assertRaises(LocationFormatError):
+            Location(False,
+                     mxc_uri="mxc://example.org/level",
+                     start_of_chunk=0,
+                     chunk_length=1)
+
+    def test_packed_locations(self):
+        locations = [Location.from_json(s) for s in SERIALIZED_LOCATIONS]
+
+        packed = PackedLocations(locations)
+
+        self.assertEqual(len(locations), len(packed))
+        self.assertEqual(RECORD.size * len(locations), len(packed.to_bytes()))
+        self.assertEqual(locations, packed.tolist())
+        self.assertEqual(locations[-1], packed[-1])
+        self.assertEqual(locations[1:], packed[1:])
+        self.assertEqual(
+            packed,
+            PackedLocations.from_bytes(packed.to_bytes(), packed.mxc_uris))
+        with self.assertRaises(IndexError):
+            packed[len(locations)]
+        with self.assertRaises(LocationFormatError):
+            PackedLocations.from_bytes(b"\0", packed.mxc_uris)
+
+    def test_packed_lookup_table(self):
+        raw_test_data = get_test_data("search/lookup", "multiple")
+        lookup_tables = tuple({
+            keyword: [Location.from_json(location) for location in locations]
+            for keyword, locations in lookup_table.items()
+        } for lookup_table in raw_test_data["lookup_tables"])
+
+        packed_tables = tuple(map(pack_lookup_table, lookup_tables))
+
+        for lookup_table, packed_table in zip(lookup_tables, packed_tables):
+            self.assertEqual(lookup_table, packed_table)
+            mxc_uris = {id(p.mxc_uris) for p in packed_table.values()}
+            self.assertEqual(1, len(mxc_uris))
+        search, packed_search = (EncryptedSearch(lookup_tables),
+                                 EncryptedSearch(packed_tables))
+        for keyword in raw_test_data["results"]:
+            self.assertEqual(search.lookup(keyword),
+                             packed_search.lookup(keyword))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 import unittest
 
+from encrypted_search.index import EncryptedIndex
 from encrypted_search.merge import IndexMerge
+from encrypted_search.storage import IndexStorage
 from tests.utils.deserializers import lookup_table_from_json
 
+from .utils.mock_homeserver import MockHomeserver
+from .utils.serializers import datastore_to_json
 from .utils.test_helpers import get_test_data
 
 
@@ -49,6 +53,42 @@ class IndexMergeTest(unittest.TestCase):
             self.assertEqual(expected_inverted_index,
                              index_merge._IndexMerge__inverted_index)
 
+    def test_tombstones(self):
+        events = get_test_data("integration", "multiple")["events"][0]
+        event_ids = [event["event_id"] for event in events]
+        deleted = event_ids[:2]
+        encrypted_index = EncryptedIndex(events)
+        encrypted_index.delete_events(deleted, compaction_ratio=1)
+
+        # Upload the index, whose datastore still holds the deleted events
+        homeserver = MockHomeserver()
+        storage = IndexStorage(encrypted_index, 100)
+        for file_data, callback in storage:
+            callback(homeserver.upload(file_data))
+        storage.update_lookup_table()
+
+        def merge(**kwargs):
+            index_merge = IndexMerge((storage.lookup_table, ), **kwargs)
+            for mxc_uris, callback in index_merge:
+                for mxc_uri in mxc_uris:
+                    callback(mxc_uri, homeserver.fetch(mxc_uri))
+            index_merge.distribute_new_index()
+            merged_index = index_merge.encrypted_index
+            return merged_index, {
+                event_id
+                for level in datastore_to_json(
+                    merged_index.datastore).values() for bucket in level
+                for event_id in bucket
+            }
+
+        _, merged_event_ids = merge()
+        self.assertTrue(set(deleted) <= merged_event_ids)
+
+        merged_index, merged_event_ids = merge(
+            tombstones=(encrypted_index.tombstones, ))
+        self.assertEqual(set(event_ids) - set(deleted), merged_event_ids)
+        self.assertEqual(set(merged_index.lookup_table), merged_index.keywords)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,101 @@
+import subprocess
+import sys
+import unittest
+
+from encrypted_search.utils.normalizer import Normalizer
+from encrypted_search.utils.stopwords import ENGLISH_STOPWORDS
+
+from .utils.test_helpers import get_test_data
+
+
+def nltk_stopwords_available() -> bool:
+    try:
+        from nltk.corpus import stopwords
+        stopwords.words("english")
+    except (ImportError, LookupError):
+        return False
+    return True
+
+
+class NormalizerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.normalizer = Normalizer(stop_words=("is", "an", "for", "the"))
+
+    def test_normalize(self):
+        tokens = self.normalizer.normalize(
+            "Matrix is an open network for (secure), real-time communication!")
+
+        self.assertEqual(
+            {
+                "matrix", "open", "network", "secure", "real-time", "real",
+                "time", "communication"
+            },
+            tokens,
+        )
+
+    def test_normalize_surface(self):
+        tokens = self.normalizer.normalize_surface("The REAL-TIME network.")
+
+        self.assertEqual({"real-time", "network"}, tokens)
+
+    def test_normalize_many(self):
+        strings = ["Matrix is open", "", "for the... network!", "e2ee v1.2"]
+
+        batch = list(self.normalizer.normalize_many(strings))
+
+        self.assertEqual([self.normalizer.normalize(s) for s in strings],
+                         batch)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            Normalizer("spacy")
+
+    def test_lazy_nltk_import(self):
+        code = ("import sys, encrypted_search.index, encrypted_search.search\n"
+                "from encrypted_search.utils.normalizer import normalize\n"
+                "normalize('Matrix is open')\n"
+                "print('nltk' in sys.modules)")
+
+        output = subprocess.run([sys.executable, "-c", code],
+                                capture_output=True,
+                                text=True,
+                                check=True).stdout
+
+        self.assertEqual("False", output.strip())
+
+    @unittest.skipUnless(nltk_stopwords_available(),
+                         "NLTK stopwords corpus is not installed")
+    def test_stopwords_match(self):
+        self.assertEqual(
+            Normalizer("nltk").stop_words,
+            Normalizer("builtin").stop_words,
+            "The installed NLTK stopwords corpus differs from the snapshot, "
+            "e.g. because it predates the contractions",
+        )
+
+    def test_stopwords_snapshot(self):
+        self.assertEqual(198, len(ENGLISH_STOPWORDS))
+        self.assertTrue(
+            {"i'm", "they're", "she's", "don't"} <= ENGLISH_STOPWORDS)
+        self.assertEqual(
+            {"back", "late"},
+            Normalizer("builtin").normalize("I'm back, they're late"))
+
+    def test_tokenizers_match(self):
+        builtin = Normalizer("builtin")
+        nltk = Normalizer("nltk", stop_words=ENGLISH_STOPWORDS)
+
+        strings = [
+            event["content"]["body"] for case in ("small", "large")
+            for event in get_test_data("integration/single/keyword", case)
+            ["events"] if "body" in event.get("content", {})
+        ] + ["tabs\tand\nnew lines", "Über-cool café!", "  ", "I'm here"]
+        for string in strings:
+            self.assertEqual(nltk.normalize(string), builtin.normalize(string))
+            self.assertEqual(nltk.normalize_surface(string),
+                             builtin.normalize_surface(string))
+
+
+if __name__ == "__main__":
+    unittest.main()
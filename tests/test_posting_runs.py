@@ -0,0 +1,51 @@
+import os
+import random
+import tempfile
+import unittest
+from array import array
+
+from encrypted_search.models.vocabulary import ID_TYPECODE
+from encrypted_search.utils.posting_runs import PostingRuns
+
+
+class PostingRunsTest(unittest.TestCase):
+
+    def test_merge(self):
+        rng = random.Random(0)
+        expected = {}
+        with PostingRuns(memory_budget=1000) as runs:
+            for doc_id in range(2000):
+                for keyword_id in rng.sample(range(100), 3):
+                    expected.setdefault(keyword_id, []).append(doc_id)
+                    runs.extend(keyword_id, array(ID_TYPECODE, (doc_id, )))
+
+            merged = [(keyword_id, list(docs)) for keyword_id, docs in runs]
+
+            self.assertGreater(runs.runs, 1)
+            self.assertEqual(sorted(expected.items()), merged)
+            self.assertEqual([len(expected.get(k, [])) for k in range(100)],
+                             list(runs.lengths))
+
+    def test_in_memory(self):
+        with PostingRuns(memory_budget=2**20) as runs:
+            runs.extend(3, array(ID_TYPECODE, (0, 2)))
+            runs.extend(1, array(ID_TYPECODE, (1, )))
+            runs.extend(3, array(ID_TYPECODE, (5, )))
+
+            self.assertEqual(0, runs.runs)
+            self.assertEqual([(1, [1]), (3, [0, 2, 5])],
+                             [(k, list(docs)) for k, docs in runs])
+            self.assertEqual([0, 1, 0, 3], list(runs.lengths))
+
+    def test_cleanup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with PostingRuns(memory_budget=0, directory=directory) as runs:
+                runs.extend(0, array(ID_TYPECODE, (0, )))
+                self.assertEqual(1, runs.runs)
+                self.assertEqual(1, len(os.listdir(directory)))
+
+            self.assertEqual([], os.listdir(directory))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 
 from encrypted_search.models.location import Location
+from encrypted_search.models.tombstones import Tombstones
 from encrypted_search.search import EncryptedSearch
 
 from .utils.test_helpers import get_test_data
@@ -62,6 +63,28 @@ class EncryptedSearchTest(unittest.TestCase):
 
                 self.assertEqual(set(expected_doc_ids), doc_ids)
 
+    def test_locate_with_tombstones(self):
+        raw_test_data = get_test_data("search/locate", "multiple")
+        for keyword, keyword_test_data in raw_test_data.items():
+            locations = {
+                mxc_uri: [
+                    Location.from_json(serialized_location)
+                    for serialized_location in serialized_locations
+                ]
+                for mxc_uri, serialized_locations in
+                keyword_test_data["locations"].items()
+            }
+            expected_doc_ids = sorted(keyword_test_data["doc_ids"])
+            deleted = expected_doc_ids[::2]
+
+            search = EncryptedSearch(
+                (),
+                tombstones=(Tombstones(deleted[:1]), Tombstones(deleted[1:])))
+            search._EncryptedSearch__locations = {keyword: locations}
+            doc_ids = search.locate(keyword_test_data["fetched_files"])
+
+            self.assertEqual(set(expected_doc_ids) - set(deleted), doc_ids)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,12 +1,18 @@
 import ast
+import asyncio
+import json
 import unittest
 
+from encrypted_search.exceptions import TransientUploadError
 from encrypted_search.index import EncryptedIndex
 from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.codecs import CODECS, COMPRESSIONS
+from encrypted_search.utils.keyed_random import KeyedRandom
 
-from .utils.deserializers import index_from_json
+from .utils.async_mock_homeserver import AsyncMockHomeserver
+from .utils.deserializers import compact_datastore, index_from_json
 from .utils.serializers import lookup_table_to_json
-from .utils.test_helpers import get_test_data
+from .utils.test_helpers import get_test_data, search_all, store_index
 
 
 class IndexSearchTest(unittest.TestCase):
@@ -124,6 +130,256 @@ class IndexSearchTest(unittest.TestCase):
 
                 self.assertEqual(expected_files, storage._IndexStorage__files)
 
+    def test_compact_datastore(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        encrypted_index = index_from_json(raw_test_data["encrypted_index"])
+        files = IndexStorage(encrypted_index, 3000)._IndexStorage__files
+        encrypted_index.datastore = compact_datastore(
+            encrypted_index.datastore)
+
+        storage = IndexStorage(encrypted_index, 3000)
+
+        self.assertEqual(files, storage._IndexStorage__files)
+        for file_data, callback in storage:
+            self.assertIsInstance(file_data, list)
+            json.dumps(file_data)
+            callback("file_uri")
+
+    def test_verify_sizes(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        encrypted_index = index_from_json(raw_test_data["encrypted_index"])
+        files = IndexStorage(encrypted_index, 3000)._IndexStorage__files
+
+        for datastore in (encrypted_index.datastore,
+                          compact_datastore(encrypted_index.datastore)):
+            encrypted_index.datastore = datastore
+            for cutoff_size in (1000, 3000, 11000):
+                IndexStorage(encrypted_index, cutoff_size, verify_sizes=True)
+            storage = IndexStorage(encrypted_index, 3000, verify_sizes=True)
+            self.assertEqual(files, storage._IndexStorage__files)
+
+        # Ids that `json.dumps` escapes
+        encrypted_index.datastore = {
+            0: [['$"quoted"\\', '$ünïcödé'], [], ['$\x7f\n']] * 50,
+        }
+        IndexStorage(encrypted_index, 200, verify_sizes=True)
+
+    def test_streaming(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        encrypted_index = index_from_json(raw_test_data["encrypted_index"])
+
+        for datastore in (encrypted_index.datastore,
+                          compact_datastore(encrypted_index.datastore)):
+            encrypted_index.datastore = datastore
+            for cutoff_size in (1000, 3000, 11000):
+                storage = IndexStorage(encrypted_index, cutoff_size)
+                expected_files = []
+                for file_data, callback in storage:
+                    expected_files.append(json.dumps(file_data).encode())
+                    callback(f"file_uri/{len(expected_files)}")
+                storage.update_lookup_table()
+
+                streaming_storage = IndexStorage(encrypted_index,
+                                                 cutoff_size,
+                                                 streaming=True)
+                files = []
+                for file_bytes, callback in streaming_storage:
+                    self.assertIsInstance(file_bytes, bytes)
+                    files.append(file_bytes)
+                    callback(f"file_uri/{len(files)}")
+                streaming_storage.update_lookup_table()
+
+                self.assertEqual({}, streaming_storage._IndexStorage__files)
+                self.assertEqual(expected_files, files)
+                self.assertEqual(storage.lookup_table,
+                                 streaming_storage.lookup_table)
+
+    def test_compression(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        cutoff_size = 3000
+
+        def store(codec=None, compression=None):
+            return store_index(index_from_json(
+                raw_test_data["encrypted_index"]),
+                               cutoff_size,
+                               codec=codec,
+                               compression=compression)
+
+        lookup_table, repository = store()
+        expected_results, _ = search_all(lookup_table, repository)
+        for codec in CODECS.values():
+            for compression in (None, *COMPRESSIONS):
+                lookup_table, files = store(codec, compression)
+
+                self.assertTrue(
+                    all(len(data) <= cutoff_size for data in files.values()))
+                if compression is not None:
+                    self.assertLess(len(files), len(repository))
+                self.assertEqual(expected_results,
+                                 search_all(lookup_table, files, codec)[0])
+
+        with self.assertRaises(ValueError):
+            store(compression="zip")
+
+        # No limit fits a file of one event id over the file size limit
+        with self.assertRaises(ValueError):
+            store_index(index_from_json(raw_test_data["encrypted_index"]),
+                        100,
+                        compression="lzma")
+
+    def test_blob_cutoff(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        encrypted_index = index_from_json(raw_test_data["encrypted_index"])
+        events = get_test_data("integration", "multiple")["events"]
+        small_index = EncryptedIndex(events[0] + events[1],
+                                     L=2,
+                                     rng=KeyedRandom(0))
+        blob_codec = CODECS["blob"]
+
+        for datastore in (encrypted_index.datastore,
+                          compact_datastore(encrypted_index.datastore)):
+            encrypted_index.datastore = datastore
+            for index, cutoff_size in ((encrypted_index,
+                                        1000), (encrypted_index, 3000),
+                                       (encrypted_index, 11000),
+                                       (small_index, 150), (small_index, 500)):
+                expected_results, _ = search_all(
+                    *store_index(index, cutoff_size))
+                for streaming in (False, True):
+                    lookup_table, files = store_index(index,
+                                                      cutoff_size,
+                                                      codec=blob_codec,
+                                                      streaming=streaming)
+
+                    self.assertTrue(
+                        all(
+                            len(data) <= cutoff_size
+                            for data in files.values()))
+                    self.assertEqual(
+                        expected_results,
+                        search_all(lookup_table, files, blob_codec)[0])
+
+    def test_optimize_layout(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        encrypted_index = index_from_json(raw_test_data["encrypted_index"])
+        datastore = encrypted_index.datastore
+
+        profile = {
+            keyword: 1.0
+            for keyword in sorted(encrypted_index.lookup_table)[:20]
+        }
+        for cutoff_size in (1000, 3000, 11000):
+            encrypted_index.datastore = datastore
+            expected_results, expected_fetched = search_all(
+                *store_index(encrypted_index, cutoff_size))
+            for layout_datastore in (datastore, compact_datastore(datastore)):
+                for kwargs in (dict(), dict(streaming=True),
+                               dict(query_profile=profile)):
+                    encrypted_index.datastore = layout_datastore
+                    lookup_table, files = store_index(encrypted_index,
+                                                      cutoff_size,
+                                                      optimize_layout=True,
+                                                      **kwargs)
+                    if kwargs.get("streaming"):
+                        files = {
+                            uri: json.loads(data)
+                            for uri, data in files.items()
+                        }
+                    results, fetched = search_all(lookup_table, files)
+
+                    self.assertEqual(expected_results, results)
+                    self.assertLessEqual(fetched, expected_fetched)
+                    if not kwargs:
+                        self.assertLess(fetched, expected_fetched)
+                    self.assertTrue(
+                        all(
+                            len(json.dumps(file_data)) <= cutoff_size
+                            for file_data in files.values()))
+
+        # The cutoff of other codecs and compressions is fitted over several plans, of which only the last one is uploaded
+        events = get_test_data("integration", "multiple")["events"]
+        small_index = EncryptedIndex(events[0] + events[1],
+                                     L=2,
+                                     rng=KeyedRandom(0))
+        encrypted_index.datastore = datastore
+        for index, cutoff_size in ((encrypted_index, 3000), (small_index,
+                                                             150)):
+            for codec in CODECS.values():
+                for compression in (None, *COMPRESSIONS):
+                    expected_lookup_table, expected_files = store_index(
+                        index,
+                        cutoff_size,
+                        codec=codec,
+                        compression=compression)
+                    expected_results, _ = search_all(expected_lookup_table,
+                                                     expected_files, codec)
+                    lookup_table, files = store_index(index,
+                                                      cutoff_size,
+                                                      codec=codec,
+                                                      compression=compression,
+                                                      optimize_layout=True)
+
+                    self.assertEqual(expected_results,
+                                     search_all(lookup_table, files, codec)[0])
+                    self.assertTrue(
+                        all(
+                            len(data) <= cutoff_size
+                            for data in files.values()))
+
+    def test_upload_all(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        cutoff_size = 1000
+
+        # Upload serially
+        lookup_table, files = store_index(
+            index_from_json(raw_test_data["encrypted_index"]), cutoff_size)
+        expected_results, _ = search_all(lookup_table, files)
+
+        # Upload concurrently, with transient failures
+        for streaming in (False, True):
+            homeserver = AsyncMockHomeserver(latency=0.001, failures=3)
+            storage = IndexStorage(index_from_json(
+                raw_test_data["encrypted_index"]),
+                                   cutoff_size,
+                                   streaming=streaming)
+
+            stats = asyncio.run(
+                storage.upload_all(homeserver.upload, concurrency=4,
+                                   backoff=0))
+            storage.update_lookup_table()
+
+            self.assertEqual(len(files), stats.files)
+            self.assertEqual(len(files), len(stats.latencies))
+            self.assertEqual(3, stats.retries)
+            self.assertGreater(stats.bytes, 0)
+            self.assertEqual(4, homeserver.max_in_flight)
+            self.assertEqual(
+                expected_results,
+                search_all(storage.lookup_table, homeserver.files)[0])
+
+    def test_upload_all_failures(self):
+        raw_test_data = get_test_data("storage/constructor", "large")
+        encrypted_index = index_from_json(raw_test_data["encrypted_index"])
+
+        # Transient failures beyond the retries
+        homeserver = AsyncMockHomeserver(failures=10)
+        storage = IndexStorage(encrypted_index, 1000)
+        with self.assertRaises(TransientUploadError):
+            asyncio.run(
+                storage.upload_all(homeserver.upload,
+                                   concurrency=1,
+                                   retries=2,
+                                   backoff=0))
+        self.assertEqual(3, homeserver.attempts)
+
+        # Other errors aren't retried
+        async def failing_upload(file_data):
+            raise ValueError("Invalid file")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(storage.upload_all(failing_upload, concurrency=2))
+        self.assertEqual({}, storage._IndexStorage__mxc_uris_map)
+
     def test_iterator(self):
         cases = {
             "small": (100, 300, 500),  # Small dataset
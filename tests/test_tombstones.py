@@ -0,0 +1,41 @@
+import unittest
+
+from encrypted_search.models.tombstones import Tombstones
+
+
+class TombstonesTest(unittest.TestCase):
+
+    def test_contains(self):
+        tombstones = Tombstones(f"$event{i}" for i in range(0, 100, 2))
+
+        self.assertEqual(50, len(tombstones))
+        for i in range(100):
+            self.assertEqual(i % 2 == 0, f"$event{i}" in tombstones)
+        self.assertNotIn(None, tombstones)
+
+    def test_add_and_filter(self):
+        tombstones = Tombstones()
+        event_ids = {f"$event{i}" for i in range(10)}
+        self.assertEqual(event_ids, tombstones.filter(event_ids))
+
+        tombstones.add(["$event3", "$event4", "$event3"])
+
+        self.assertEqual(2, len(tombstones))
+        self.assertEqual(event_ids - {"$event3", "$event4"},
+                         tombstones.filter(event_ids))
+
+    def test_bytes(self):
+        tombstones = Tombstones(f"$event{i}" for i in range(20))
+
+        data = tombstones.to_bytes()
+        deserialized = Tombstones.from_bytes(data)
+
+        self.assertEqual(8 * 20, len(data))
+        self.assertEqual(data, deserialized.to_bytes())
+        for i in range(20):
+            self.assertIn(f"$event{i}", deserialized)
+        self.assertNotIn("$event20", deserialized)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Dict
+
+from encrypted_search.exceptions import TransientUploadError
+
+
+class AsyncMockHomeserver:
+
+    def __init__(self, latency: float = 0.0, failures: int = 0):
+        self.files: Dict[str, Any] = {}
+        self.latency = latency
+        self.failures = failures  # Number of uploads to fail transiently
+        self.attempts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def upload(self, file: Any) -> str:
+        self.attempts += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures > 0:
+                self.failures -= 1
+                raise TransientUploadError("Homeserver is busy")
+            uri = f"mxc://mock/{len(self.files)}"
+            self.files[uri] = file
+            return uri
+        finally:
+            self.in_flight -= 1
+
+    async def fetch(self, uri: str) -> Any:
+        await asyncio.sleep(self.latency)
+        return self.files[uri]
@@ -1,8 +1,12 @@
+from array import array
 from typing import Any, Dict
 
 from encrypted_search.index import EncryptedIndex
+from encrypted_search.models.compact_level import CompactLevel
 from encrypted_search.models.location import Location
-from encrypted_search.types import LookupTable
+from encrypted_search.models.string_table import OFFSET_TYPECODE, StringTable
+from encrypted_search.models.vocabulary import ID_TYPECODE, Vocabulary
+from encrypted_search.types import Datastore, LookupTable
 
 
 def index_from_json(json: Dict[str, Any]) -> EncryptedIndex:
@@ -35,6 +39,33 @@ def index_from_json(json: Dict[str, Any]) -> EncryptedIndex:
     return encrypted_index
 
 
+def compact_datastore(datastore: Datastore) -> Datastore:
+    """Converts a datastore of lists into compact levels that share one string table.
+
+    Args:
+        datastore: Mapping from level indices to lists of buckets
+
+    Returns:
+        Equivalent datastore of `CompactLevel` objects.
+    """
+
+    document_ids = Vocabulary()
+    arrays = {}
+    for level_index, level in datastore.items():
+        ordinals = array(ID_TYPECODE)
+        offsets = array(OFFSET_TYPECODE, [0])
+        for bucket in level:
+            ordinals += document_ids.add_all(bucket)
+            offsets.append(len(ordinals))
+        arrays[level_index] = ordinals, offsets
+
+    documents = StringTable(document_ids)
+    return {
+        level_index: CompactLevel(ordinals, offsets, documents)
+        for level_index, (ordinals, offsets) in arrays.items()
+    }
+
+
 def lookup_table_from_json(json: Dict[str, Any]) -> LookupTable:
     """Deserializes JSON map into an `LookupTable`.
 
@@ -1,7 +1,7 @@
 from typing import Any, Dict
 
 from encrypted_search.models.level_info import LevelInfo
-from encrypted_search.types import LevelInfos, LookupTable
+from encrypted_search.types import Datastore, LevelInfos, LookupTable
 
 
 def levels_to_json(levels: LevelInfos) -> Dict[str, Any]:
@@ -28,6 +28,19 @@ def __level_info_to_json(level: LevelInfo) -> Dict[str, Any]:
     }
 
 
+def datastore_to_json(datastore: Datastore) -> Dict[str, Any]:
+    """Utility method to serialize a datastore, whether its levels are lists or compact.
+
+    Args:
+        datastore: Mapping from level indices to the buckets of each level
+
+    Returns:
+        JSON-like dict; the serialized form of `datastore`.
+    """
+
+    return {str(i): list(level) for i, level in datastore.items()}
+
+
 def lookup_table_to_json(lookup_table: LookupTable) -> Dict[str, Any]:
     """Utility method to serialize a lookup table.
 
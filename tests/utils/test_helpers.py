@@ -1,6 +1,11 @@
 import json
 import os
-from typing import Any
+from typing import Any, Dict, Optional, Set, Tuple
+
+from encrypted_search.index import EncryptedIndex
+from encrypted_search.search import EncryptedSearch
+from encrypted_search.storage import IndexStorage
+from encrypted_search.utils.codecs import Codec
 
 
 def get_test_data(test: str, case: str) -> Any:
@@ -21,3 +26,50 @@ def get_test_data(test: str, case: str) -> Any:
         with open(file_path, encoding="utf-8") as file:
             return json.load(file)
     raise IOError(f"File 'tests/data/{test}/{case}.json' can't be found")
+
+
+def store_index(encrypted_index: EncryptedIndex, cutoff_size: int,
+                **kwargs) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Stores an index in memory, uploading its files serially.
+
+    Args:
+        encrypted_index: Index to be stored
+        cutoff_size: Maximum size of the files
+        **kwargs: Options for `IndexStorage`
+
+    Returns:
+        A tuple of the form (LT, F) where LT is the updated lookup table and F maps the URI of each file to its data.
+    """
+
+    storage = IndexStorage(encrypted_index, cutoff_size, **kwargs)
+    files = {}
+    for file_data, callback in storage:
+        uri = f"file_uri/{len(files) + 1}"
+        files[uri] = file_data
+        callback(uri)
+    storage.update_lookup_table()
+    return storage.lookup_table, files
+
+
+def search_all(
+        lookup_table: Dict[str, Any],
+        files: Dict[str, Any],
+        codec: Optional[Codec] = None) -> Tuple[Dict[str, Set[str]], int]:
+    """Searches every keyword of a lookup table in the stored files.
+
+    Args:
+        lookup_table: Lookup table of the stored index
+        files: Map from the URI of each file to its data
+        codec: Codec of the files
+
+    Returns:
+        A tuple of the form (R, N) where R maps each keyword to its results and N is the number of files fetched.
+    """
+
+    search = EncryptedSearch((lookup_table, ), codec=codec)
+    results, fetched = {}, 0
+    for keyword in lookup_table:
+        uris = search.lookup(keyword)
+        fetched += len(uris)
+        results[keyword] = search.locate({uri: files[uri] for uri in uris})
+    return results, fetched